@@ -26,9 +26,15 @@ from .default_agent import (
 )
 from .document_agent import (
     embed_and_store_document,
+    embed_and_store_pages,
     chat_with_document
 )
-from .sql_agent import generate_response_from_sql
+from .sql_agent import (
+    generate_response_from_sql,
+    generate_response_from_sources,
+    generate_response_from_table,
+    stream_response_from_sql
+)
 from .utils import format_chat_history
 
 # Re-export all necessary components to maintain the same API
@@ -40,7 +46,11 @@ __all__ = [
     'create_custom_agent',
     'generate_response_with_custom_agent',
     'embed_and_store_document',
+    'embed_and_store_pages',
     'chat_with_document',
     'generate_response_from_sql',
+    'generate_response_from_sources',
+    'generate_response_from_table',
+    'stream_response_from_sql',
     'format_chat_history'
 ]
@@ -0,0 +1,51 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Cache LRU trong bộ nhớ với thời gian sống cho mỗi mục.
+    Chỉ dùng từ event loop (không an toàn khi dùng từ nhiều thread).
+
+    Tham số:
+        maxsize: Số mục tối đa, mục ít dùng nhất bị loại khi đầy.
+        ttl: Thời gian sống (giây) của mỗi mục, None = không hết hạn.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._items.get(key)
+        if item is None or (item[1] is not None and item[1] < time.monotonic()):
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return default
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def set(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._items[key] = (value, expires_at)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._items.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -1,8 +1,9 @@
 import os
 import json
 import uuid
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Callable, Awaitable
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -23,6 +24,30 @@ from .config import ChatAgentConfig as config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _split_next_batch(
+    pages: Iterator[Tuple[int, str]],
+    text_splitter: RecursiveCharacterTextSplitter,
+    doc_metadata: Dict[str, Any],
+    batch_size: int
+) -> Tuple[List[Any], int]:
+    """
+    Đọc và chia nhỏ các trang tiếp theo cho đến khi đủ batch_size đoạn hoặc hết trang.
+
+    Trả về:
+        (các đoạn văn bản, số trang đã đọc); số trang bằng 0 khi đã hết trang.
+    """
+    batch = []
+    pages_read = 0
+    for page, text in pages:
+        batch.extend(text_splitter.create_documents(
+            [text],
+            metadatas=[{**doc_metadata, "page": page}]
+        ))
+        pages_read += 1
+        if len(batch) >= batch_size:
+            break
+    return batch, pages_read
+
 class ChatAgent:
     """
     Agent chat sử dụng mô hình Google Generative AI.
@@ -204,6 +229,30 @@ class ChatAgent:
             source_file_id: ID của file nguồn.
             metadata: Metadata bổ sung cho tài liệu.
             
+        Trả về:
+            ID của collection đã tạo trong ChromaDB.
+        """
+        return await self.embed_and_store_pages([(1, text)], source_file_id, metadata)
+    
+    async def embed_and_store_pages(
+        self,
+        pages: Iterable[Tuple[int, str]],
+        source_file_id: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        on_progress: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> str:
+        """Nhúng tài liệu theo từng trang và lưu trữ trong ChromaDB.
+        
+        Các trang được chia nhỏ và nhúng theo lô (EMBEDDING_BATCH_SIZE đoạn) ngay khi được đọc,
+        nên bộ nhớ sử dụng không phụ thuộc vào kích thước tài liệu. Số trang được lưu
+        trong metadata "page" của mỗi đoạn.
+        
+        Tham số:
+            pages: Các cặp (số trang, nội dung), có thể là generator.
+            source_file_id: ID của file nguồn.
+            metadata: Metadata bổ sung cho tài liệu.
+            on_progress: Hàm async tùy chọn, được gọi với số trang đã xử lý sau mỗi lô.
+            
         Trả về:
             ID của collection đã tạo trong ChromaDB.
         """
@@ -231,25 +280,36 @@ class ChatAgent:
                 length_function=len,
             )
             
-            # Tạo documents từ văn bản
-            docs = text_splitter.create_documents(
-                [text], 
-                metadatas=[doc_metadata]
-            )
-            
             # Tạo thư mục persist nếu chưa tồn tại
             persist_directory = os.path.join(config.CHROMA_PERSIST_DIRECTORY, collection_id)
             os.makedirs(persist_directory, exist_ok=True)
             
-            # Tạo và lưu trữ vector store
-            Chroma.from_documents(
-                documents=docs,
-                embedding=self.embeddings,
-                persist_directory=persist_directory,
-                collection_name=collection_id
+            # Tạo vector store rỗng, các lô đoạn văn bản sẽ được thêm dần
+            vectorstore = Chroma(
+                collection_name=collection_id,
+                embedding_function=self.embeddings,
+                persist_directory=persist_directory
             )
             
-            logger.info(f"Successfully embedded and stored document with collection ID: {collection_id}")
+            # Đọc trang (thường là read_pages, giải nén từ đĩa) và chia đoạn trong thread riêng
+            # để tài liệu lớn không chặn event loop
+            page_iter = iter(pages)
+            pages_done = 0
+            chunk_count = 0
+            while True:
+                batch, pages_read = await asyncio.to_thread(
+                    _split_next_batch, page_iter, text_splitter, doc_metadata, config.EMBEDDING_BATCH_SIZE
+                )
+                if not pages_read:
+                    break
+                pages_done += pages_read
+                if batch:
+                    await vectorstore.aadd_documents(batch)
+                    chunk_count += len(batch)
+                if on_progress:
+                    await on_progress(pages_done)
+            
+            logger.info(f"Successfully embedded and stored {chunk_count} chunks from {pages_done} pages with collection ID: {collection_id}")
             return collection_id
             
         except Exception as e:
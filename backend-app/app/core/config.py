@@ -17,11 +17,16 @@ class ChatAgentConfig:
 
     # Cấu hình embedding
     EMBEDDING_MODEL = "models/embedding-001"
+    EMBEDDING_BATCH_SIZE = 64  # Số đoạn văn bản nhúng mỗi lần
 
     # Cấu hình text splitter
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
 
+    # Cấu hình loader dạng bảng (Excel/CSV)
+    TABULAR_READ_BATCH_ROWS = 10000  # Số dòng CSV đọc mỗi lần
+    TABULAR_MIN_GROUP_CHARS = 200  # Số ký tự tối thiểu cho phần dữ liệu của mỗi nhóm dòng
+
     # Cấu hình retriever
     RETRIEVER_SEARCH_TYPE = "similarity"
     RETRIEVER_K = 5
@@ -31,6 +36,72 @@ class ChatAgentConfig:
     DEFAULT_CHAT_TITLE = "Cuộc trò chuyện mới"
 
     UPLOAD_DIR = "public/uploads"
+    MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "100"))
+    UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))  # Số file được lưu/đăng ký đồng thời trong một request
+    ZIP_MAX_MEMBERS = int(os.getenv("ZIP_MAX_MEMBERS", "1000"))  # Số mục tối đa trong một file .zip
+    # Tổng dung lượng giải nén tối đa của một file .zip (mặc định bằng giới hạn tải lên)
+    ZIP_MAX_TOTAL_MB = int(os.getenv("ZIP_MAX_TOTAL_MB", str(MAX_UPLOAD_SIZE_MB)))
+
+    # Cấu hình pool tiến trình trích xuất văn bản
+    PARSER_PROCESSES = int(os.getenv("PARSER_PROCESSES", str(os.cpu_count() or 2)))
+    PARSER_TASK_TIMEOUT = float(os.getenv("PARSER_TASK_TIMEOUT", "300"))  # giây
+    PARSER_MEMORY_LIMIT_MB = int(os.getenv("PARSER_MEMORY_LIMIT_MB", "2048"))  # 0 = không giới hạn
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "50"))  # Số trang PDF mỗi tác vụ song song
+
+    # Thư mục lưu văn bản đã trích xuất (nén gzip, theo hash nội dung + phiên bản extractor)
+    EXTRACTED_TEXT_DIR = os.getenv("EXTRACTED_TEXT_DIR", "public/uploads/extracted")
+
+    # File CSV/Excel được nạp thành bảng SQLite (truy vấn bằng SQL) thay vì nhúng từng dòng
+    TABULAR_AS_TABLES = os.getenv("TABULAR_AS_TABLES", "true").lower() == "true"
+    TABULAR_DB_DIR = os.getenv("TABULAR_DB_DIR", "public/uploads/tables")
+
+    # Cấu hình hàng đợi xử lý tài liệu (trích xuất + nhúng chạy nền)
+    INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", str(PARSER_PROCESSES)))
+    INGESTION_QUEUE_SIZE = int(os.getenv("INGESTION_QUEUE_SIZE", "100"))
+    # Thời hạn (giây) script nhập hàng loạt giữ các file đang xử lý, được gia hạn liên tục;
+    # server không nhận lại các file này khi khởi động cho đến khi hết hạn
+    INGESTION_LEASE_SECONDS = int(os.getenv("INGESTION_LEASE_SECONDS", "300"))
+
+    # Pool kết nối tới các nguồn dữ liệu SQL (dataApiFetching)
+    SQL_POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "5"))
+    SQL_MAX_OVERFLOW = int(os.getenv("SQL_MAX_OVERFLOW", "10"))
+    SQL_POOL_TIMEOUT = int(os.getenv("SQL_POOL_TIMEOUT", "30"))  # giây chờ lấy kết nối
+    SQL_POOL_RECYCLE = int(os.getenv("SQL_POOL_RECYCLE", "1800"))  # giây, nhỏ hơn wait_timeout của MySQL
+    SQL_CONNECT_TIMEOUT = int(os.getenv("SQL_CONNECT_TIMEOUT", "5"))  # giây chờ mở kết nối mới tới MySQL/PostgreSQL
+    SQL_HEALTH_CHECK_INTERVAL = float(os.getenv("SQL_HEALTH_CHECK_INTERVAL", "15"))  # giây giữa hai lần kiểm tra primary/replica
+    SQL_BREAKER_FAILURES = int(os.getenv("SQL_BREAKER_FAILURES", "3"))  # Số lỗi kết nối liên tiếp trước khi ngắt một kết nối
+    SQL_BREAKER_RESET_TIMEOUT = float(os.getenv("SQL_BREAKER_RESET_TIMEOUT", "30"))  # giây trước khi thử lại kết nối bị ngắt
+    SQL_SCHEMA_CACHE_TTL = float(os.getenv("SQL_SCHEMA_CACHE_TTL", "3600"))  # giây giữ schema + dòng mẫu đã đọc
+    SQL_SCHEMA_REFRESH_INTERVAL = float(os.getenv("SQL_SCHEMA_REFRESH_INTERVAL", "1800"))  # giây giữa hai lần làm mới nền
+    SQL_SCHEMA_TOP_K = int(os.getenv("SQL_SCHEMA_TOP_K", "5"))  # Số bảng liên quan nhất đưa vào prompt sinh SQL
+    SQL_SCHEMA_PRUNE_MIN_TABLES = int(os.getenv("SQL_SCHEMA_PRUNE_MIN_TABLES", "8"))  # Chỉ lọc bảng khi nguồn có nhiều hơn số bảng này
+    SQL_SCHEMA_TIMEOUT = float(os.getenv("SQL_SCHEMA_TIMEOUT", "30"))  # giây chờ đọc schema
+    SQL_LLM_TIMEOUT = float(os.getenv("SQL_LLM_TIMEOUT", "60"))  # giây chờ mỗi lần gọi LLM (sinh SQL, tạo câu trả lời)
+    SQL_QUERY_TIMEOUT = float(os.getenv("SQL_QUERY_TIMEOUT", "30"))  # giây chờ thực thi truy vấn
+    SQL_QUERY_CACHE_SIZE = int(os.getenv("SQL_QUERY_CACHE_SIZE", "1000"))  # Số câu hỏi -> SQL giữ cho mỗi nguồn
+    SQL_QUERY_CACHE_TTL = float(os.getenv("SQL_QUERY_CACHE_TTL", "86400"))  # giây
+    SQL_RESULT_CACHE_SIZE = int(os.getenv("SQL_RESULT_CACHE_SIZE", "200"))  # Số kết quả SQL giữ cho mỗi nguồn
+    SQL_RESULT_CACHE_TTL = float(os.getenv("SQL_RESULT_CACHE_TTL", "300"))  # giây, nguồn có thể ghi đè bằng "result_cache_ttl"
+    SQL_STATEMENT_TIMEOUT = float(os.getenv("SQL_STATEMENT_TIMEOUT", "25"))  # Thời gian chạy tối đa (giây) của truy vấn phía cơ sở dữ liệu
+    SQL_GUARD_MAX_EXAMINED_ROWS = int(os.getenv("SQL_GUARD_MAX_EXAMINED_ROWS", "10000000"))  # Từ chối truy vấn có số dòng phải duyệt ước tính (EXPLAIN) lớn hơn
+    SQL_FETCH_BATCH_ROWS = int(os.getenv("SQL_FETCH_BATCH_ROWS", "500"))  # Số dòng đọc mỗi lần từ cursor
+    SQL_RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", "5000"))  # Số dòng kết quả tối đa được đọc
+    SQL_RESULT_MAX_BYTES = int(os.getenv("SQL_RESULT_MAX_BYTES", str(5 * 1024 * 1024)))  # Dung lượng kết quả tối đa được đọc
+    SQL_ANSWER_MAX_CHARS = int(os.getenv("SQL_ANSWER_MAX_CHARS", "8000"))  # Độ dài kết quả tối đa đưa nguyên vào prompt
+    SQL_ANSWER_SAMPLE_ROWS = int(os.getenv("SQL_ANSWER_SAMPLE_ROWS", "20"))  # Số dòng mẫu khi thay kết quả bằng thống kê
+    SQL_RESULT_FRAME_MAX_BYTES = int(os.getenv("SQL_RESULT_FRAME_MAX_BYTES", str(256 * 1024 * 1024)))  # Bộ nhớ tối đa cho kết quả gần nhất của các cuộc trò chuyện
+    SQL_RESULT_FRAME_TTL = float(os.getenv("SQL_RESULT_FRAME_TTL", "3600"))  # Thời gian (giây) dùng lại kết quả gần nhất cho câu hỏi nối tiếp
+    SQL_RESULT_FRAME_DIR = os.getenv("SQL_RESULT_FRAME_DIR", "public/uploads/result_frames")  # Thư mục ghi kết quả bị loại khỏi bộ nhớ
+    SQL_RESULT_FRAME_MAX_DISK_FILES = int(os.getenv("SQL_RESULT_FRAME_MAX_DISK_FILES", "1000"))  # Số kết quả tối đa trên đĩa
+    SQL_FOLLOWUP_HISTORY_MESSAGES = 4  # Số tin nhắn gần nhất đưa vào prompt câu hỏi nối tiếp
+    SQL_TABLE_ASSISTANT_CACHE_SIZE = int(os.getenv("SQL_TABLE_ASSISTANT_CACHE_SIZE", "32"))  # Số file dạng bảng giữ kết nối
+
+    # Prompt mặc định trong kho prompt cục bộ (app/prompts/<tên>/v<số>.txt), dạng "tên" (bản mới nhất)
+    # hoặc "tên:v2". Mỗi nguồn trong dataApiFetching có thể ghi đè bằng mục "prompts".
+    PROMPTS = {
+        "sql_query": os.getenv("SQL_QUERY_PROMPT", "sql-query-system:v1"),
+        "sql_followup": os.getenv("SQL_FOLLOWUP_PROMPT", "sql-followup:v1"),
+    }
 
     # Prompt mặc định cho hệ thống
     DEFAULT_SYSTEM_PROMPT = """Bạn là một trợ lý thân thiện! Khi trả lời câu hỏi của người dùng:
@@ -169,6 +240,7 @@ Nếu một câu hỏi không rõ ràng hoặc không thực sự mạch lạc,
         "no_relevant_info": "Tôi không tìm thấy thông tin liên quan đến câu hỏi của bạn trong tài liệu. Vui lòng thử đặt câu hỏi khác.",
         "processing_error": "Tôi gặp lỗi khi xử lý yêu cầu của bạn. Vui lòng thử lại sau. Lỗi: {error}",
         "api_key_missing": "Google API key is required. Set it in the .env file or pass it to the constructor.",
+        "document_not_ready": "Tài liệu {source_file_id} đang được xử lý (trạng thái: {status}). Vui lòng thử lại khi tài liệu đã sẵn sàng.",
     }
 
     dataApiFetching = [
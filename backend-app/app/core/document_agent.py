@@ -1,5 +1,5 @@
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Tuple, Callable, Awaitable
 
 from .default_agent import get_default_agent
 from .config import ChatAgentConfig as config
@@ -25,6 +25,30 @@ async def embed_and_store_document(text: str, source_file_id: str, metadata: Opt
         logger.error(f"Error in embed_and_store_document: {str(e)}")
         raise
 
+async def embed_and_store_pages(
+    pages: Iterable[Tuple[int, str]],
+    source_file_id: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    on_progress: Optional[Callable[[int], Awaitable[None]]] = None
+) -> str:
+    """Nhúng tài liệu theo từng trang và lưu trữ trong ChromaDB sử dụng agent mặc định.
+    
+    Tham số:
+        pages: Các cặp (số trang, nội dung), có thể là generator.
+        source_file_id: ID của file nguồn.
+        metadata: Metadata bổ sung cho tài liệu.
+        on_progress: Hàm async tùy chọn, được gọi với số trang đã xử lý sau mỗi lô.
+        
+    Trả về:
+        ID của collection đã tạo trong ChromaDB.
+    """
+    try:
+        agent = await get_default_agent()
+        return await agent.embed_and_store_pages(pages, source_file_id, metadata, on_progress)
+    except Exception as e:
+        logger.error(f"Error in embed_and_store_pages: {str(e)}")
+        raise
+
 async def chat_with_document(message: str, source_file_id: str, metadata: Optional[Dict[str, Any]] = None, chat_history: Optional[List[Dict[str, str]]] = None) -> str:
     """Trò chuyện với tài liệu đã được nhúng sử dụng agent mặc định.
     
@@ -1,13 +1,66 @@
+import gzip
+import json
 import logging
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.document_loaders.csv_loader import CSVLoader
 from langchain_community.document_loaders import Docx2txtLoader
 from langchain_community.document_loaders import JSONLoader
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+
+from .config import ChatAgentConfig as config
 
 # Use logging instead of fastapi.logger
 logger = logging.getLogger(__name__)
 
+# (page number starting at 1, page text)
+Page = Tuple[int, str]
+
+# Bump whenever a loader changes its output so cached extracted text is regenerated
+# (3: caches written before partial extractions were excluded may hold truncated text)
+EXTRACTOR_VERSION = "3"
+
+class DocumentLoadError(RuntimeError):
+    """A loader failed part-way through a document (only raised when raise_errors=True)."""
+
+def count_pdf_pages(file_path: str) -> int:
+    """
+    Count the pages of a PDF file without extracting any text.
+
+    Parameters:
+        file_path: The path to the PDF file.
+
+    Returns:
+        The number of pages.
+    """
+    from pypdf import PdfReader
+
+    return len(PdfReader(file_path).pages)
+
+def iter_pdf_pages(file_path: str, start: int = 0, end: Optional[int] = None, raise_errors: bool = False) -> Iterator[str]:
+    """
+    Lazily extract the text of a PDF file, one page at a time.
+
+    Parameters:
+        file_path: The path to the PDF file.
+        start: Index of the first page to extract (0-based).
+        end: Index after the last page to extract. Defaults to the end of the document.
+        raise_errors: Raise DocumentLoadError instead of logging and stopping early, so a
+                      partial extraction can be told apart from a complete one.
+
+    Yields:
+        The text of each page.
+    """
+    try:
+        # Use pypdf directly (same extraction as PyPDFLoader) so a page range can be extracted on its own
+        from pypdf import PdfReader
+
+        reader = PdfReader(file_path)
+        end = len(reader.pages) if end is None else min(end, len(reader.pages))
+        for index in range(start, end):
+            yield reader.pages[index].extract_text(extraction_mode="plain").strip()
+    except Exception as e:
+        if raise_errors:
+            raise DocumentLoadError(f"Error loading PDF file: {str(e)}") from e
+        logger.error(f"Error loading PDF file: {str(e)}")
+
 def load_pdf_to_text(file_path: str) -> List[str]:
     """
     Load a PDF file and extract its text content.
@@ -18,20 +71,87 @@ def load_pdf_to_text(file_path: str) -> List[str]:
     Returns:
         A list of strings, where each string is a page of text from the PDF.
     """
+    return list(iter_pdf_pages(file_path))
+
+def _rows_to_groups(rows, header: str, title: Optional[str] = None) -> Iterator[str]:
+    """
+    Group row strings into chunks that fit within the text splitter's chunk size.
+    Every chunk repeats the column header (and sheet title) so it is self-describing.
+
+    Parameters:
+        rows: A pandas Series of row strings.
+        header: The comma-joined column header.
+        title: Optional title line, e.g. the sheet name.
+
+    Yields:
+        One string per row group.
+    """
+    prefix = f"{title}\n{header}\n" if title else f"{header}\n"
+    budget = max(config.CHUNK_SIZE - len(prefix), config.TABULAR_MIN_GROUP_CHARS)
+
+    # Cumulative row length (plus newline) decides which group each row falls into.
+    # Leaving room for the longest row keeps every group within the budget.
+    lengths = rows.str.len() + 1
+    step = max(budget - int(lengths.max()), config.TABULAR_MIN_GROUP_CHARS)
+    group_ids = (lengths.cumsum() - 1) // step
+
+    for _, group in rows.groupby(group_ids, sort=False):
+        yield prefix + "\n".join(group)
+
+def _frame_to_groups(df, title: Optional[str] = None) -> Iterator[str]:
+    """
+    Convert a DataFrame into header-prefixed row groups using vectorized string operations.
+
+    Parameters:
+        df: The DataFrame to convert.
+        title: Optional title line, e.g. the sheet name.
+
+    Yields:
+        One string per row group.
+    """
+    if df.empty:
+        return
+
+    header = ", ".join(str(column) for column in df.columns)
+    columns = [df[column].astype(str) for column in df.columns]
+    rows = columns[0].str.cat(columns[1:], sep=", ") if len(columns) > 1 else columns[0]
+    yield from _rows_to_groups(rows.reset_index(drop=True), header, title)
+
+def iter_csv_groups(file_path: str, csv_args: Optional[Dict[str, Any]] = None, raise_errors: bool = False) -> Iterator[str]:
+    """
+    Lazily read a CSV file in row batches and yield header-prefixed row groups.
+
+    Parameters:
+        file_path: The path to the CSV file.
+        csv_args: Optional arguments for CSV parsing (delimiter, quotechar, etc.)
+        raise_errors: Raise DocumentLoadError instead of logging and stopping early, so a
+                      partial extraction can be told apart from a complete one.
+
+    Yields:
+        A group of rows preceded by the column header.
+    """
+    csv_args = {"delimiter": ",", "quotechar": '"', **(csv_args or {})}
+    
     try:
-        # Initialize the PDF loader
-        loader = PyPDFLoader(file_path)
-        
-        # Load and extract text from the PDF
-        documents = loader.load()
-        
-        # Extract text from each page
-        text_pages = [doc.page_content for doc in documents]
-        
-        return text_pages
+        import pandas as pd
+
+        # Read in fixed-size row batches so very large files are never fully materialized as objects
+        reader = pd.read_csv(
+            file_path,
+            sep=csv_args["delimiter"],
+            quotechar=csv_args["quotechar"],
+            dtype=str,
+            keep_default_na=False,
+            encoding_errors="replace",
+            chunksize=config.TABULAR_READ_BATCH_ROWS,
+        )
+
+        for batch in reader:
+            yield from _frame_to_groups(batch)
     except Exception as e:
-        logger.error(f"Error loading PDF file: {str(e)}")
-        return []
+        if raise_errors:
+            raise DocumentLoadError(f"Error loading CSV file: {str(e)}") from e
+        logger.error(f"Error loading CSV file: {str(e)}")
 
 def load_csv_to_text(file_path: str, csv_args: Optional[Dict[str, Any]] = None) -> List[str]:
     """
@@ -42,82 +162,130 @@ def load_csv_to_text(file_path: str, csv_args: Optional[Dict[str, Any]] = None)
         csv_args: Optional arguments for CSV parsing (delimiter, quotechar, etc.)
 
     Returns:
-        A list of strings, where each string represents a row from the CSV.
+        A list of strings, where each string is a group of rows preceded by the column header.
     """
-    if csv_args is None:
-        csv_args = {"delimiter": ",", "quotechar": '"'}
-    
+    return list(iter_csv_groups(file_path, csv_args))
+
+def _iter_excel_streaming(file_path: str) -> Iterator[str]:
+    """
+    Load an .xlsx workbook in openpyxl read-only mode, row by row, without loading it into memory.
+
+    Parameters:
+        file_path: The path to the Excel file.
+
+    Yields:
+        One header-prefixed row group at a time, across all sheets.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
     try:
-        # Initialize the CSV loader with optional arguments
-        loader = CSVLoader(
-            file_path=file_path,
-            csv_args=csv_args
-        )
-        
-        # Load and extract text from the CSV
-        documents = loader.load()
-        
-        # Extract text from each row
-        text_rows = [doc.page_content for doc in documents]
-        
-        return text_rows
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header_row = next(rows, None)
+            if header_row is None:
+                continue
+
+            prefix = f"Sheet: {sheet.title}\n" + ", ".join("" if cell is None else str(cell) for cell in header_row) + "\n"
+            budget = max(config.CHUNK_SIZE - len(prefix), config.TABULAR_MIN_GROUP_CHARS)
+
+            group, group_len = [], 0
+            for row in rows:
+                row_text = ", ".join("" if cell is None else str(cell) for cell in row)
+                if group and group_len + len(row_text) + 1 > budget:
+                    yield prefix + "\n".join(group)
+                    group, group_len = [], 0
+                group.append(row_text)
+                group_len += len(row_text) + 1
+            if group:
+                yield prefix + "\n".join(group)
+    finally:
+        workbook.close()
+
+def iter_excel_groups(file_path: str, raise_errors: bool = False) -> Iterator[str]:
+    """
+    Lazily extract header-prefixed row groups from every sheet of an Excel file.
+
+    .xlsx workbooks are always streamed with openpyxl in read-only mode: in benchmark_ingestion
+    it was as fast as pandas from a few thousand rows on (1.7s vs 3.0s at 20,000 rows, 11s vs
+    15s at 100,000) with 6-10x less peak memory. Legacy .xls files, which openpyxl cannot read,
+    still go through pandas.
+
+    Parameters:
+        file_path: The path to the Excel file.
+        raise_errors: Raise DocumentLoadError instead of logging and stopping early, so a
+                      partial extraction can be told apart from a complete one.
+
+    Yields:
+        A group of rows preceded by the sheet name and column header.
+    """
+    try:
+        if file_path.lower().endswith('.xlsx'):
+            yield from _iter_excel_streaming(file_path)
+            return
+
+        import pandas as pd
+
+        # Read all sheets at once (sheet_name=None returns a dict of DataFrames)
+        sheets = pd.read_excel(file_path, sheet_name=None, dtype=str, keep_default_na=False)
+
+        for sheet_name, df in sheets.items():
+            yield from _frame_to_groups(df, title=f"Sheet: {sheet_name}")
+            
     except Exception as e:
-        logger.error(f"Error loading CSV file: {str(e)}")
-        return []
+        if raise_errors:
+            raise DocumentLoadError(f"Error loading Excel file: {str(e)}") from e
+        logger.error(f"Error loading Excel file: {str(e)}")
 
 def load_excel_to_text(file_path: str) -> List[str]:
     """
-    Load an Excel file and extract its text content.
+    Load an Excel file and extract its text content from every sheet.
 
     Parameters:
         file_path: The path to the Excel file.
 
     Returns:
-        A list of strings, where each string represents content from the Excel file.
+        A list of strings, where each string is a group of rows preceded by the sheet name and column header.
+    """
+    return list(iter_excel_groups(file_path))
+
+def iter_ppt_slides(file_path: str, raise_errors: bool = False) -> Iterator[str]:
+    """
+    Lazily extract the text of a PowerPoint file, one slide at a time.
+
+    Parameters:
+        file_path: The path to the PowerPoint file.
+        raise_errors: Raise DocumentLoadError instead of logging and stopping early, so a
+                      partial extraction can be told apart from a complete one.
+
+    Yields:
+        The text of each slide.
     """
     try:
-        # Try to import pandas first
+        # Use python-pptx directly instead of UnstructuredPowerPointLoader
         try:
-            import pandas as pd
-            
-            # Read Excel file using pandas
-            df = pd.read_excel(file_path)
-            
-            # Convert DataFrame to text
-            text_content = []
-            
-            # Add column headers
-            headers = df.columns.tolist()
-            text_content.append(", ".join(str(header) for header in headers))
-            
-            # Add each row
-            for _, row in df.iterrows():
-                row_text = ", ".join(str(value) for value in row.values)
-                text_content.append(row_text)
-            
-            return text_content
-            
+            from pptx import Presentation
         except ImportError:
-            # If pandas is not available, try using openpyxl directly
-            import openpyxl
-            
-            workbook = openpyxl.load_workbook(file_path)
-            text_content = []
-            
-            for sheet in workbook.worksheets:
-                sheet_text = f"Sheet: {sheet.title}\n"
-                
-                for row in sheet.iter_rows(values_only=True):
-                    row_text = ", ".join(str(cell) if cell is not None else "" for cell in row)
-                    sheet_text += row_text + "\n"
-                
-                text_content.append(sheet_text)
+            if raise_errors:
+                raise
+            logger.warning("python-pptx not installed. Falling back to alternative method.")
+            # You could implement a fallback method here if needed
+            yield "PowerPoint extraction requires python-pptx library"
+            return
+
+        prs = Presentation(file_path)
+        for i, slide in enumerate(prs.slides):
+            slide_text = f"Slide {i+1}:\n"
             
-            return text_content
+            for shape in slide.shapes:
+                if hasattr(shape, "text") and shape.text:
+                    slide_text += shape.text + "\n"
             
+            yield slide_text
     except Exception as e:
-        logger.error(f"Error loading Excel file: {str(e)}")
-        return []
+        if raise_errors:
+            raise DocumentLoadError(f"Error loading PowerPoint file: {str(e)}") from e
+        logger.error(f"Error loading PowerPoint file: {str(e)}")
 
 def load_ppt_to_text(file_path: str) -> List[str]:
     """
@@ -129,31 +297,30 @@ def load_ppt_to_text(file_path: str) -> List[str]:
     Returns:
         A list of strings, where each string represents content from a slide.
     """
+    return list(iter_ppt_slides(file_path))
+
+def iter_docx_pages(file_path: str, raise_errors: bool = False) -> Iterator[str]:
+    """
+    Extract the text of a Word document. docx2txt reads the whole document at once,
+    so this yields a single page.
+
+    Parameters:
+        file_path: The path to the Word document.
+        raise_errors: Raise DocumentLoadError instead of logging and stopping early, so a
+                      partial extraction can be told apart from a complete one.
+
+    Yields:
+        The text content of the Word document.
+    """
     try:
-        # Use python-pptx directly instead of UnstructuredPowerPointLoader
-        try:
-            from pptx import Presentation
-            
-            prs = Presentation(file_path)
-            text_content = []
-            
-            for i, slide in enumerate(prs.slides):
-                slide_text = f"Slide {i+1}:\n"
-                
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text:
-                        slide_text += shape.text + "\n"
-                
-                text_content.append(slide_text)
-            
-            return text_content
-        except ImportError:
-            logger.warning("python-pptx not installed. Falling back to alternative method.")
-            # You could implement a fallback method here if needed
-            return ["PowerPoint extraction requires python-pptx library"]
+        # Initialize the Word document loader
+        loader = Docx2txtLoader(file_path)
+        for doc in loader.lazy_load():
+            yield doc.page_content
     except Exception as e:
-        logger.error(f"Error loading PowerPoint file: {str(e)}")
-        return []
+        if raise_errors:
+            raise DocumentLoadError(f"Error loading Word document: {str(e)}") from e
+        logger.error(f"Error loading Word document: {str(e)}")
 
 def load_docx_to_text(file_path: str) -> List[str]:
     """
@@ -165,67 +332,123 @@ def load_docx_to_text(file_path: str) -> List[str]:
     Returns:
         A list containing the text content of the Word document.
     """
-    try:
-        # Initialize the Word document loader
-        loader = Docx2txtLoader(file_path)
-        
-        # Load and extract text from the Word document
-        documents = loader.load()
-        
-        # Extract text from the document
-        text_content = [doc.page_content for doc in documents]
-        
-        return text_content
-    except Exception as e:
-        logger.error(f"Error loading Word document: {str(e)}")
-        return []
+    return list(iter_docx_pages(file_path))
 
-def load_document_to_text(file_path: str, file_type: Optional[str] = None, **kwargs) -> List[str]:
+def infer_file_type(file_path: str) -> Optional[str]:
     """
-    Load a document file and extract its text content based on file type.
+    Infer the loader type ('pdf', 'csv', 'excel', 'ppt', 'docx', 'json') from the file extension.
 
     Parameters:
         file_path: The path to the document file.
-        file_type: The type of the file ('pdf', 'csv', 'excel', 'ppt', 'docx', 'json'). 
+
+    Returns:
+        The file type, or None if the extension is not supported.
+    """
+    lower_path = file_path.lower()
+    if lower_path.endswith('.pdf'):
+        return 'pdf'
+    elif lower_path.endswith('.csv'):
+        return 'csv'
+    elif lower_path.endswith(('.xlsx', '.xls')):
+        return 'excel'
+    elif lower_path.endswith(('.pptx', '.ppt')):
+        return 'ppt'
+    elif lower_path.endswith(('.docx', '.doc')):
+        return 'docx'
+    elif lower_path.endswith('.json'):
+        return 'json'
+    return None
+
+def iter_document_pages(file_path: str, file_type: Optional[str] = None, raise_errors: bool = False, **kwargs) -> Iterator[Page]:
+    """
+    Lazily extract a document's text, one page (PDF page, slide, row group) at a time.
+
+    Parameters:
+        file_path: The path to the document file.
+        file_type: The type of the file ('pdf', 'csv', 'excel', 'ppt', 'docx').
                    If None, will be inferred from file extension.
+        raise_errors: Raise DocumentLoadError instead of logging and stopping early, so a
+                      partial extraction can be told apart from a complete one.
         **kwargs: Additional arguments for specific loaders.
 
-    Returns:
-        A list of strings containing the extracted text.
+    Yields:
+        (page number starting at 1, page text) tuples.
     """
     if file_type is None:
-        # Infer file type from extension
-        if file_path.lower().endswith('.pdf'):
-            file_type = 'pdf'
-        elif file_path.lower().endswith('.csv'):
-            file_type = 'csv'
-        elif file_path.lower().endswith(('.xlsx', '.xls')):
-            file_type = 'excel'
-        elif file_path.lower().endswith(('.pptx', '.ppt')):
-            file_type = 'ppt'
-        elif file_path.lower().endswith(('.docx', '.doc')):
-            file_type = 'docx'
-        elif file_path.lower().endswith('.json'):
-            file_type = 'json'
-        else:
+        file_type = infer_file_type(file_path)
+        if file_type is None:
             logger.error(f"Unsupported file type for {file_path}")
-            return []
+            return
     
     if file_type.lower() == 'pdf':
-        return load_pdf_to_text(file_path)
+        pages = iter_pdf_pages(file_path, raise_errors=raise_errors)
     elif file_type.lower() == 'csv':
-        csv_args = kwargs.get('csv_args', {})
-        return load_csv_to_text(file_path, csv_args)
+        pages = iter_csv_groups(file_path, kwargs.get('csv_args'), raise_errors=raise_errors)
     elif file_type.lower() == 'excel':
-        return load_excel_to_text(file_path)
+        pages = iter_excel_groups(file_path, raise_errors=raise_errors)
     elif file_type.lower() == 'ppt':
-        return load_ppt_to_text(file_path)
+        pages = iter_ppt_slides(file_path, raise_errors=raise_errors)
     elif file_type.lower() == 'docx':
-        return load_docx_to_text(file_path)
+        pages = iter_docx_pages(file_path, raise_errors=raise_errors)
     else:
         logger.error(f"Unsupported file type: {file_type}")
-        return []
+        return
+
+    yield from enumerate(pages, start=1)
+
+def load_document_to_text(file_path: str, file_type: Optional[str] = None, **kwargs) -> List[str]:
+    """
+    Load a document file and extract its text content based on file type.
+
+    Parameters:
+        file_path: The path to the document file.
+        file_type: The type of the file ('pdf', 'csv', 'excel', 'ppt', 'docx', 'json'). 
+                   If None, will be inferred from file extension.
+        **kwargs: Additional arguments for specific loaders.
+
+    Returns:
+        A list of strings containing the extracted text.
+    """
+    return [text for _, text in iter_document_pages(file_path, file_type, **kwargs)]
+
+def write_pages(pages: Iterable[Page], out_path: str, compress: Optional[bool] = None) -> int:
+    """
+    Write extracted pages to a JSON Lines file as they are produced.
+
+    Parameters:
+        pages: (page number, text) tuples, e.g. from iter_document_pages.
+        out_path: The path of the JSON Lines file to write.
+        compress: Write gzip-compressed output. Defaults to True when out_path ends with ".gz".
+
+    Returns:
+        The number of pages written.
+    """
+    if compress is None:
+        compress = out_path.endswith(".gz")
+    opener = gzip.open if compress else open
+
+    count = 0
+    with opener(out_path, "wt", encoding="utf-8") as out:
+        for page, text in pages:
+            out.write(json.dumps({"page": page, "text": text}, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def read_pages(path: str) -> Iterator[Page]:
+    """
+    Lazily read pages written by write_pages (plain or gzip-compressed).
+
+    Parameters:
+        path: The path of the JSON Lines file.
+
+    Yields:
+        (page number, text) tuples.
+    """
+    with open(path, "rb") as probe:
+        compressed = probe.read(2) == b"\x1f\x8b"
+    opener = gzip.open if compressed else open
 
-# Example usage
-# pdf_text = load_document_to_text("path/to/your/file.pdf")
-# csv_text = load_document_to_text("path/to/your/file.csv", csv_args={"delimiter": ","})
+    with opener(path, "rt", encoding="utf-8") as source:
+        for line in source:
+            record = json.loads(line)
+            yield record["page"], record["text"]
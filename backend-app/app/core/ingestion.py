@@ -0,0 +1,371 @@
+import os
+import json
+import uuid
+import shutil
+import asyncio
+import logging
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ..database import prisma
+from .config import ChatAgentConfig as config
+from .parser_pool import parser_pool
+from .document_loader import EXTRACTOR_VERSION, DocumentLoadError, read_pages
+from .document_agent import embed_and_store_pages
+from .tabular_store import TABULAR_FILE_TYPES, read_table_counts, table_db_path
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+# Trạng thái xử lý của một file (lưu trong cột File.status)
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+TERMINAL_STATUSES = {STATUS_READY, STATUS_FAILED}
+
+# Tham số đọc file CSV (dấu phân cách, ký tự bao chuỗi)
+CSV_ARGS = {"delimiter": ",", "quotechar": '"'}
+
+
+def loader_kwargs_for(file_type: str) -> Dict[str, Any]:
+    """
+    Tham số loader theo loại file. Chỉ phụ thuộc vào File.filetype nên job được nạp lại từ
+    bản ghi File (khi khởi động lại, khi re-index) đọc file giống hệt lần tải lên.
+    """
+    if file_type == "csv":
+        return {"csv_args": dict(CSV_ARGS)}
+    return {}
+
+
+@dataclass
+class IngestionJob:
+    """Một tác vụ trích xuất + nhúng tài liệu. ID của job chính là ID của bản ghi File."""
+    file_id: str
+    file_path: str
+    file_type: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    loader_kwargs: Dict[str, Any] = field(default_factory=dict)
+    content_hash: Optional[str] = None
+    previous_collection_id: Optional[str] = None
+
+    def __post_init__(self):
+        if not self.loader_kwargs:
+            self.loader_kwargs = loader_kwargs_for(self.file_type)
+
+
+def extracted_text_path(content_hash: str) -> str:
+    """Đường dẫn file văn bản đã trích xuất (gzip JSON Lines) theo hash nội dung và phiên bản extractor."""
+    return os.path.join(
+        config.EXTRACTED_TEXT_DIR,
+        content_hash[:2],
+        f"{content_hash}.v{EXTRACTOR_VERSION}.jsonl.gz"
+    )
+
+
+def page_count_path(pages_path: str) -> str:
+    """File ghi số trang của văn bản đã trích xuất, để lần dùng lại không phải giải nén để đếm."""
+    return f"{pages_path}.count"
+
+
+def _read_page_count(pages_path: str) -> int:
+    try:
+        with open(page_count_path(pages_path), encoding="utf-8") as source:
+            return int(source.read())
+    except (OSError, ValueError):
+        # Bản lưu cũ chưa có file số trang
+        return sum(1 for _ in read_pages(pages_path))
+
+
+def _write_page_count(pages_path: str, page_count: int):
+    with open(page_count_path(pages_path), "w", encoding="utf-8") as target:
+        target.write(str(page_count))
+
+
+def job_status(db_file) -> Dict[str, Any]:
+    """Chuyển bản ghi File thành payload trạng thái job trả về cho client."""
+    return {
+        "job_id": db_file.id,
+        "file_id": db_file.id,
+        "filename": db_file.filename,
+        "status": db_file.status,
+        "progress": db_file.progress,
+        "error": db_file.error,
+    }
+
+
+class IngestionQueue:
+    """
+    Hàng đợi giới hạn kích thước cùng một nhóm worker cố định để xử lý tài liệu nền.
+
+    Mỗi worker lấy job từ hàng đợi, trích xuất văn bản, nhúng vào ChromaDB và ghi
+    tiến độ lên bản ghi File. Các client có thể đăng ký nhận sự kiện tiến độ (SSE).
+    """
+
+    def __init__(self, workers: int = config.INGESTION_WORKERS, maxsize: int = config.INGESTION_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Các lần đưa lại job vào hàng đợi khi khởi động (giữ tham chiếu để task không bị thu hồi)
+        self._resume_tasks: Set[asyncio.Task] = set()
+        self._listeners: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def start(self):
+        """Khởi động các worker và đưa lại vào hàng đợi các file chưa xử lý xong."""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"ingestion-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Started {self.workers} ingestion workers")
+        await self._resume_unfinished()
+
+    async def stop(self):
+        """Dừng các worker. Các job còn dang dở sẽ được xử lý lại ở lần khởi động sau."""
+        tasks = [*self._tasks, *self._resume_tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._resume_tasks.clear()
+        self._queue = None
+
+    async def enqueue(self, job: IngestionJob):
+        """Đưa job vào hàng đợi (chờ nếu hàng đợi đã đầy)."""
+        if self._queue is None:
+            raise RuntimeError("Ingestion queue is not running")
+        await self._queue.put(job)
+        self._publish(job.file_id, {"job_id": job.file_id, "status": STATUS_PENDING, "progress": 0, "error": None})
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Đăng ký nhận sự kiện tiến độ của một job."""
+        listener: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(job_id, set()).add(listener)
+        return listener
+
+    def unsubscribe(self, job_id: str, listener: asyncio.Queue):
+        """Hủy đăng ký nhận sự kiện tiến độ."""
+        listeners = self._listeners.get(job_id)
+        if listeners:
+            listeners.discard(listener)
+            if not listeners:
+                self._listeners.pop(job_id, None)
+
+    def _publish(self, job_id: str, event: Dict[str, Any]):
+        for listener in self._listeners.get(job_id, ()):
+            listener.put_nowait(event)
+
+    async def _update(self, job: IngestionJob, status: str, progress: int, error: Optional[str] = None, **data):
+        """Ghi trạng thái lên bản ghi File và phát sự kiện cho các client đang theo dõi."""
+        await prisma.file.update(
+            where={"id": job.file_id},
+            data={"status": status, "progress": progress, "error": error, **data}
+        )
+        self._publish(job.file_id, {"job_id": job.file_id, "status": status, "progress": progress, "error": error})
+
+    async def _resume_unfinished(self):
+        """
+        Đưa lại vào hàng đợi các file đang pending/processing khi server khởi động lại, trừ các
+        file script nhập hàng loạt đang giữ (leaseUntil chưa hết hạn).
+        """
+        try:
+            unfinished = await prisma.file.find_many(
+                where={
+                    "status": {"in": [STATUS_PENDING, STATUS_PROCESSING]},
+                    "OR": [{"leaseUntil": None}, {"leaseUntil": {"lt": datetime.now(timezone.utc)}}],
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error loading unfinished ingestion jobs: {str(e)}")
+            return
+
+        for db_file in unfinished:
+            metadata = {"filename": db_file.filename, "filetype": db_file.filetype, "size": db_file.size}
+            if db_file.userId:
+                metadata["uploaded_by"] = db_file.userId
+            # Hàng đợi có thể đầy: đưa vào nền để không chặn quá trình khởi động
+            task = asyncio.create_task(self.enqueue(IngestionJob(
+                file_id=db_file.id,
+                file_path=db_file.filepath,
+                file_type=db_file.filetype,
+                metadata=metadata,
+                content_hash=db_file.contentHash,
+            )))
+            self._resume_tasks.add(task)
+            task.add_done_callback(self._resume_tasks.discard)
+        if unfinished:
+            logger.info(f"Re-queued {len(unfinished)} unfinished ingestion jobs")
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self.process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker {index} failed on file {job.file_id}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _extract(self, job: IngestionJob) -> Tuple[str, int, bool]:
+        """
+        Lấy văn bản đã trích xuất của file: dùng lại bản đã lưu theo hash nội dung nếu có,
+        nếu không thì trích xuất trong pool tiến trình.
+
+        Trả về:
+            (đường dẫn file các trang, số trang, file có phải là file tạm hay không)
+        """
+        if job.content_hash:
+            pages_path = extracted_text_path(job.content_hash)
+            if os.path.exists(pages_path):
+                logger.info(f"Using cached extracted text for file {job.file_id}")
+                return pages_path, await asyncio.to_thread(_read_page_count, pages_path), False
+
+            # Ghi ra file tạm rồi đổi tên để không bao giờ để lại bản lưu dở dang. Chỉ lưu khi
+            # trích xuất trọn vẹn (loader không gặp lỗi) và có nội dung, vì mọi lần tải lên
+            # cùng nội dung sau này sẽ dùng lại bản lưu
+            os.makedirs(os.path.dirname(pages_path), exist_ok=True)
+            tmp_path = f"{pages_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                page_count = await parser_pool.extract(
+                    job.file_path, tmp_path, file_type=job.file_type, compress=True, strict=True, **job.loader_kwargs
+                )
+                if not page_count:
+                    raise ValueError("No text could be extracted from the file")
+                # Ghi số trang trước để bản lưu luôn có số trang đi kèm
+                await asyncio.to_thread(_write_page_count, pages_path, page_count)
+                os.replace(tmp_path, pages_path)
+                return pages_path, page_count, False
+            except DocumentLoadError as e:
+                # Trích xuất lại không strict (phần đọc được vẫn được nhúng) nhưng không lưu cache
+                logger.warning(f"Extraction of file {job.file_id} was incomplete, not caching it: {str(e)}")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        fd, pages_path = tempfile.mkstemp(prefix=f"{job.file_id}_", suffix=".jsonl")
+        os.close(fd)
+        try:
+            page_count = await parser_pool.extract(
+                job.file_path, pages_path, file_type=job.file_type, **job.loader_kwargs
+            )
+        except Exception:
+            os.remove(pages_path)
+            raise
+        return pages_path, page_count, True
+
+    async def _remove_unused_collection(self, collection_id: str):
+        """Xóa collection ChromaDB cũ sau khi nhúng lại, nếu không còn file nào dùng."""
+        if await prisma.file.count(where={"metadata": {"contains": collection_id}}):
+            return
+        chroma_dir = os.path.join(config.CHROMA_PERSIST_DIRECTORY, collection_id)
+        if os.path.exists(chroma_dir):
+            shutil.rmtree(chroma_dir)
+            logger.info(f"Deleted ChromaDB collection: {collection_id}")
+
+    async def _load_table(self, job: IngestionJob) -> Dict[str, Any]:
+        """
+        Nạp file CSV/Excel thành bảng SQLite (dùng lại file đã nạp theo hash nội dung nếu có).
+
+        Trả về:
+            Metadata của file: đường dẫn file SQLite và số dòng của từng bảng
+        """
+        db_path = table_db_path(job.content_hash) if job.content_hash else os.path.join(
+            config.TABULAR_DB_DIR, f"{job.file_id}.sqlite"
+        )
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        if os.path.exists(db_path):
+            logger.info(f"Using existing tables for file {job.file_id}")
+            tables = await asyncio.to_thread(read_table_counts, db_path)
+        else:
+            # Ghi ra file tạm rồi đổi tên để không bao giờ để lại bảng nạp dở dang
+            tmp_path = f"{db_path}.{uuid.uuid4().hex}.tmp"
+            try:
+                tables = await parser_pool.load_table(job.file_path, tmp_path, job.file_type, **job.loader_kwargs)
+                os.replace(tmp_path, db_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        if not tables:
+            raise ValueError("No rows could be read from the file")
+        return {"table_db": db_path, "tables": tables}
+
+    async def _embed(self, job: IngestionJob) -> Dict[str, Any]:
+        """
+        Trích xuất văn bản rồi nhúng vào ChromaDB.
+
+        Trả về:
+            Metadata của file chứa collection_id
+        """
+        pages_path, is_temporary = None, False
+        try:
+            # Trích xuất văn bản (hoặc dùng lại bản đã lưu), các trang được ghi dần ra file
+            pages_path, page_count, is_temporary = await self._extract(job)
+            if not page_count:
+                raise ValueError("No text could be extracted from the file")
+            await self._update(job, STATUS_PROCESSING, 30)
+
+            # Đọc lại từng trang, chia nhỏ và nhúng theo lô vào ChromaDB
+            last_progress = 30
+
+            async def on_progress(pages_done: int):
+                nonlocal last_progress
+                progress = 30 + int(69 * pages_done / page_count)
+                if progress != last_progress:
+                    last_progress = progress
+                    await self._update(job, STATUS_PROCESSING, progress)
+
+            collection_id = await embed_and_store_pages(
+                read_pages(pages_path),
+                source_file_id=job.file_id,
+                metadata=job.metadata,
+                on_progress=on_progress
+            )
+            logger.info(f"Successfully embedded file {job.file_path} with collection ID: {collection_id}")
+            return {"collection_id": collection_id}
+        finally:
+            if is_temporary and pages_path and os.path.exists(pages_path):
+                os.remove(pages_path)
+
+    async def process(self, job: IngestionJob) -> str:
+        """
+        Xử lý một file và cập nhật trạng thái: file CSV/Excel được nạp thành bảng SQLite
+        (khi bật TABULAR_AS_TABLES), các file khác được trích xuất văn bản và nhúng vào ChromaDB.
+        Được các worker của hàng đợi gọi, cũng có thể gọi trực tiếp (ví dụ script nhập hàng loạt).
+
+        Trả về:
+            Trạng thái cuối cùng của file (ready hoặc failed)
+        """
+        try:
+            await self._update(job, STATUS_PROCESSING, 10)
+
+            if config.TABULAR_AS_TABLES and job.file_type in TABULAR_FILE_TYPES:
+                metadata = await self._load_table(job)
+            else:
+                metadata = await self._embed(job)
+
+            await self._update(job, STATUS_READY, 100, metadata=json.dumps(metadata))
+
+            collection_id = metadata.get("collection_id")
+            if job.previous_collection_id and job.previous_collection_id != collection_id:
+                await self._remove_unused_collection(job.previous_collection_id)
+            return STATUS_READY
+        except Exception as e:
+            logger.error(f"Error ingesting file {job.file_path}: {str(e)}")
+            try:
+                await self._update(job, STATUS_FAILED, 100, error=str(e))
+            except Exception as update_error:
+                logger.error(f"Error recording failure for file {job.file_id}: {str(update_error)}")
+            return STATUS_FAILED
+
+
+# Instance dùng chung cho toàn ứng dụng
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,252 @@
+import os
+import shutil
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Set
+
+from .config import ChatAgentConfig as config
+from .document_loader import count_pdf_pages, infer_file_type, iter_document_pages, iter_pdf_pages, write_pages
+from .tabular_store import load_tabular_to_sqlite
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+
+def _limit_memory(memory_limit_mb: int):
+    """Giới hạn bộ nhớ ảo của tiến trình con (chỉ hỗ trợ trên hệ POSIX)."""
+    if memory_limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        logger.warning(f"Could not apply parser memory limit: {str(e)}")
+
+
+def _extract(
+    file_path: str,
+    out_path: str,
+    file_type: Optional[str],
+    loader_kwargs: Dict[str, Any],
+    compress: bool,
+    strict: bool
+) -> int:
+    """Chạy trong tiến trình con: trích xuất lần lượt từng trang và ghi ra file JSON Lines."""
+    pages = iter_document_pages(file_path, file_type=file_type, raise_errors=strict, **loader_kwargs)
+    return write_pages(pages, out_path, compress)
+
+
+def _extract_pdf_range(file_path: str, out_path: str, start: int, end: int, compress: bool, strict: bool) -> int:
+    """Chạy trong tiến trình con: trích xuất các trang [start, end) của một file PDF."""
+    pages = iter_pdf_pages(file_path, start, end, raise_errors=strict)
+    return write_pages(enumerate(pages, start=start + 1), out_path, compress)
+
+
+def _concat_files(part_paths: List[str], out_path: str):
+    """Nối các file theo thứ tự vào out_path (JSON Lines và các member gzip nối trực tiếp được)."""
+    with open(out_path, "wb") as out:
+        for part_path in part_paths:
+            with open(part_path, "rb") as part:
+                shutil.copyfileobj(part, out)
+
+
+class ParserPool:
+    """
+    Pool tiến trình dùng để trích xuất văn bản (PyPDF, pandas, python-pptx, docx2txt)
+    ngoài event loop.
+
+    Mỗi tác vụ có thời gian chờ tối đa và mỗi tiến trình con bị giới hạn bộ nhớ. Khi một
+    file làm treo tiến trình con, các tác vụ mới được chuyển sang pool mới; pool cũ chỉ bị hủy
+    (kể cả tiến trình đang treo) sau khi các tác vụ khác đang chạy trên nó hoàn tất. Khi một
+    file làm sập tiến trình con, pool đã hỏng được khởi tạo lại ngay.
+    """
+
+    def __init__(
+        self,
+        processes: int = config.PARSER_PROCESSES,
+        task_timeout: float = config.PARSER_TASK_TIMEOUT,
+        memory_limit_mb: int = config.PARSER_MEMORY_LIMIT_MB
+    ):
+        self.processes = max(1, processes)
+        self.task_timeout = task_timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Số tác vụ chưa kết thúc trên từng pool và các pool đang chờ hủy
+        self._in_flight: Dict[ProcessPoolExecutor, int] = {}
+        self._retiring: Set[ProcessPoolExecutor] = set()
+        # Mỗi tác vụ chỉ được gửi vào pool khi có tiến trình rảnh, để thời gian chờ tính từ lúc
+        # tác vụ bắt đầu chạy chứ không gồm thời gian xếp hàng sau các tác vụ khác
+        self._slots = asyncio.Semaphore(self.processes)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Dùng "spawn" để tiến trình con không kế thừa event loop và kết nối của server
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_limit_memory,
+                initargs=(self.memory_limit_mb,)
+            )
+            logger.info(f"Started parser pool with {self.processes} processes")
+        return self._executor
+
+    @staticmethod
+    def _terminate(executor: ProcessPoolExecutor):
+        """Dừng pool, kể cả các tiến trình con đang treo."""
+        for process in list(getattr(executor, "_processes", {}).values()):
+            if process.is_alive():
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _detach(self, executor: ProcessPoolExecutor) -> bool:
+        """Ngừng giao tác vụ mới cho pool; lần gọi sau sẽ tạo pool mới."""
+        if self._executor is not executor:
+            return False
+        self._executor = None
+        return True
+
+    def _retire(self, executor: ProcessPoolExecutor):
+        """
+        Dùng khi một tác vụ bị treo: các tác vụ khác đang chạy hoặc đang chờ trên pool cũ vẫn
+        tiếp tục, pool cũ bị hủy khi tác vụ cuối cùng của nó kết thúc (xem _run).
+        """
+        if self._detach(executor):
+            self._retiring.add(executor)
+            logger.warning("Parser pool retired after a timeout, new tasks go to a new pool")
+
+    def _restart(self, executor: ProcessPoolExecutor):
+        """Hủy ngay pool đã hỏng (một tiến trình con bị sập) để lần gọi sau tạo pool mới."""
+        self._retiring.discard(executor)
+        if self._detach(executor):
+            self._terminate(executor)
+            logger.warning("Parser pool restarted")
+
+    def _release(self, executor: ProcessPoolExecutor):
+        """Ghi nhận một tác vụ đã kết thúc; hủy pool đang chờ hủy khi không còn tác vụ nào."""
+        remaining = self._in_flight.get(executor, 1) - 1
+        if remaining > 0:
+            self._in_flight[executor] = remaining
+            return
+        self._in_flight.pop(executor, None)
+        if executor in self._retiring:
+            self._retiring.discard(executor)
+            self._terminate(executor)
+            logger.info("Retired parser pool terminated")
+
+    async def _run(self, fn, file_path: str, *args):
+        """
+        Chạy một hàm trong pool với thời gian chờ, tự chuyển sang pool mới khi bị treo hoặc bị sập.
+
+        Thời gian chờ task_timeout chỉ bắt đầu khi có tiến trình rảnh nhận tác vụ (xem _slots),
+        nên nhiều tác vụ cùng lúc hơn số tiến trình chỉ phải xếp hàng, không bị coi là treo.
+        """
+        async with self._slots:
+            return await self._run_in_slot(fn, file_path, *args)
+
+    async def _run_in_slot(self, fn, file_path: str, *args):
+        loop = asyncio.get_running_loop()
+        # Thử lại một lần nếu pool bị hỏng do tác vụ khác làm sập tiến trình con
+        for attempt in range(2):
+            executor = self._get_executor()
+            self._in_flight[executor] = self._in_flight.get(executor, 0) + 1
+            try:
+                future = loop.run_in_executor(executor, fn, file_path, *args)
+                return await asyncio.wait_for(future, timeout=self.task_timeout)
+            except asyncio.TimeoutError:
+                self._retire(executor)
+                raise TimeoutError(f"Parsing {file_path} timed out after {self.task_timeout}s")
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt:
+                    raise RuntimeError(f"Parser process crashed while parsing {file_path}")
+                logger.warning(f"Parser pool broken while parsing {file_path}, retrying")
+            finally:
+                self._release(executor)
+
+    async def extract(
+        self,
+        file_path: str,
+        out_path: str,
+        file_type: Optional[str] = None,
+        compress: bool = False,
+        strict: bool = False,
+        **loader_kwargs
+    ) -> int:
+        """Trích xuất văn bản từ file trong tiến trình con.
+
+        Các trang được ghi dần ra file JSON Lines nên bộ nhớ của tiến trình con và của
+        server không phụ thuộc vào kích thước tài liệu. Đọc lại bằng document_loader.read_pages.
+        File PDF lớn được chia thành các khoảng PDF_PAGES_PER_TASK trang và trích xuất
+        song song trên nhiều tiến trình.
+
+        Tham số:
+            file_path: Đường dẫn đến file.
+            out_path: Đường dẫn file JSON Lines chứa các trang đã trích xuất.
+            file_type: Loại file (xem iter_document_pages).
+            compress: Nén gzip file đầu ra.
+            strict: Báo lỗi DocumentLoadError khi loader gặp lỗi giữa chừng thay vì trả về
+                    phần đã trích xuất được (dùng khi kết quả sẽ được lưu cache).
+            **loader_kwargs: Tham số bổ sung cho loader.
+
+        Trả về:
+            Số trang đã trích xuất.
+        """
+        if self.processes > 1 and (file_type or infer_file_type(file_path)) == "pdf":
+            page_count = await self._run(count_pdf_pages, file_path)
+            if page_count > config.PDF_PAGES_PER_TASK:
+                return await self._extract_pdf_ranges(file_path, out_path, page_count, compress, strict)
+
+        return await self._run(_extract, file_path, out_path, file_type, loader_kwargs, compress, strict)
+
+    async def _extract_pdf_ranges(
+        self,
+        file_path: str,
+        out_path: str,
+        page_count: int,
+        compress: bool,
+        strict: bool
+    ) -> int:
+        """
+        Trích xuất song song từng khoảng trang rồi nối các phần theo thứ tự vào out_path. Các
+        khoảng được gửi dần vào pool khi có tiến trình rảnh (xem _run).
+        """
+        step = config.PDF_PAGES_PER_TASK
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        part_paths = [f"{out_path}.part{i}" for i in range(len(ranges))]
+        try:
+            counts = await asyncio.gather(*(
+                self._run(_extract_pdf_range, file_path, part_path, start, end, compress, strict)
+                for part_path, (start, end) in zip(part_paths, ranges)
+            ))
+            await asyncio.to_thread(_concat_files, part_paths, out_path)
+            return sum(counts)
+        finally:
+            for part_path in part_paths:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+
+    async def load_table(self, file_path: str, db_path: str, file_type: str, **loader_kwargs) -> Dict[str, int]:
+        """Nạp file CSV/Excel vào file SQLite trong tiến trình con (xem tabular_store.load_tabular_to_sqlite).
+
+        Trả về:
+            Số dòng của từng bảng theo tên bảng.
+        """
+        return await self._run(load_tabular_to_sqlite, file_path, db_path, file_type, loader_kwargs.get("csv_args"))
+
+    def shutdown(self):
+        """Dừng pool tiến trình."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for executor in list(self._retiring):
+            self._terminate(executor)
+        self._retiring.clear()
+        self._in_flight.clear()
+
+
+# Instance dùng chung cho toàn ứng dụng
+parser_pool = ParserPool()
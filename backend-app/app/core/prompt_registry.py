@@ -0,0 +1,83 @@
+import os
+import re
+import logging
+from typing import Dict, Optional, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .config import ChatAgentConfig as config
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+# Mỗi prompt là một thư mục, mỗi phiên bản là một file: app/prompts/<tên>/v<số>.txt
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+_VERSION_FILE = re.compile(r"^v(\d+)\.txt$")
+
+
+def parse_prompt_ref(ref: str) -> Tuple[str, Optional[int]]:
+    """Tách tham chiếu "tên" hoặc "tên:v2" thành (tên, phiên bản hoặc None = mới nhất)."""
+    name, _, version = ref.partition(":")
+    return name.strip(), int(version.strip().lstrip("v")) if version.strip() else None
+
+
+class PromptRegistry:
+    """
+    Kho prompt cục bộ có phiên bản, thay cho việc tải prompt từ LangChain Hub mỗi lần dùng.
+    Các prompt được đọc từ đĩa một lần (khi khởi động) và giữ trong bộ nhớ.
+    """
+
+    def __init__(self, prompts_dir: str = PROMPTS_DIR):
+        self.prompts_dir = prompts_dir
+        self._prompts: Optional[Dict[str, Dict[int, ChatPromptTemplate]]] = None
+
+    def load(self):
+        """Đọc tất cả prompt trong thư mục prompts."""
+        prompts: Dict[str, Dict[int, ChatPromptTemplate]] = {}
+        for name in sorted(os.listdir(self.prompts_dir)):
+            prompt_dir = os.path.join(self.prompts_dir, name)
+            if not os.path.isdir(prompt_dir):
+                continue
+            for filename in os.listdir(prompt_dir):
+                match = _VERSION_FILE.match(filename)
+                if not match:
+                    continue
+                with open(os.path.join(prompt_dir, filename), "r", encoding="utf-8") as source:
+                    template = source.read().strip()
+                prompts.setdefault(name, {})[int(match.group(1))] = ChatPromptTemplate.from_messages([
+                    ("system", template)
+                ])
+        self._prompts = prompts
+        logger.info(f"Loaded {sum(len(versions) for versions in prompts.values())} prompt versions from {self.prompts_dir}")
+
+    def get(self, ref: str) -> ChatPromptTemplate:
+        """
+        Lấy prompt theo tham chiếu "tên" (phiên bản mới nhất) hoặc "tên:v2".
+
+        Raises:
+            KeyError: Nếu không có prompt hoặc phiên bản này
+        """
+        if self._prompts is None:
+            self.load()
+        name, version = parse_prompt_ref(ref)
+        versions = self._prompts.get(name)
+        if not versions:
+            raise KeyError(f"Prompt {name} not found in {self.prompts_dir}")
+        if version is None:
+            version = max(versions)
+        if version not in versions:
+            raise KeyError(f"Prompt {name} has no version v{version}")
+        return versions[version]
+
+    def for_source(self, prompt_key: str, source: Optional[Dict] = None) -> ChatPromptTemplate:
+        """
+        Lấy prompt cho một nguồn dữ liệu: dùng tham chiếu trong mục "prompts" của nguồn
+        (dataApiFetching) nếu có, nếu không thì dùng prompt mặc định trong config.PROMPTS.
+        """
+        overrides = (source or {}).get("prompts") or {}
+        return self.get(overrides.get(prompt_key) or config.PROMPTS[prompt_key])
+
+
+# Instance dùng chung cho toàn ứng dụng
+prompt_registry = PromptRegistry()
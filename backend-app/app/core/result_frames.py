@@ -0,0 +1,206 @@
+import os
+import time
+import pickle
+import asyncio
+import hashlib
+import logging
+import datetime
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from .config import ChatAgentConfig as config
+from .sql_guard import guard_query
+from .sql_result import QueryResult, fetch_bounded, format_for_prompt
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+# Tên bảng của kết quả trước đó khi truy vấn lại trong SQLite bộ nhớ
+FRAME_TABLE_NAME = "previous_result"
+
+_SQLITE_TYPES = (str, int, float, bytes, bool, datetime.date, datetime.datetime)
+
+
+def _to_sqlite_value(value):
+    """Chuyển giá trị từ driver (Decimal, timedelta, ...) sang kiểu sqlite3 lưu được."""
+    if value is None or isinstance(value, _SQLITE_TYPES):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+@dataclass
+class ResultFrame:
+    """Kết quả truy vấn gần nhất của một cuộc trò chuyện, dùng để trả lời câu hỏi nối tiếp."""
+    source: str
+    question: str
+    query: str
+    frame: pd.DataFrame
+    truncated: bool = False
+    created_at: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_result(cls, source: str, question: str, query: str, result: QueryResult) -> "ResultFrame":
+        frame = result.to_frame()
+        for column in frame.columns[frame.dtypes == object]:
+            frame[column] = frame[column].map(_to_sqlite_value)
+        return cls(source=source, question=question, query=query, frame=frame, truncated=result.truncated)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.frame.memory_usage(deep=True).sum())
+
+    def table_info(self, sample_rows: int = 3) -> str:
+        """Mô tả bảng previous_result (cột, kiểu và vài dòng mẫu) cho prompt."""
+        columns = ",\n".join(f'\t"{column}" {dtype}' for column, dtype in self.frame.dtypes.items())
+        samples = QueryResult(
+            columns=[str(column) for column in self.frame.columns],
+            rows=list(self.frame.head(sample_rows).itertuples(index=False, name=None))
+        )
+        return (
+            f"CREATE TABLE {FRAME_TABLE_NAME} (\n{columns}\n)\n\n"
+            f"/*\n{len(self.frame)} rows, first {sample_rows}:\n{format_for_prompt(samples)}\n*/"
+        )
+
+    def query_frame(self, query: str) -> QueryResult:
+        """
+        Chạy truy vấn (đã qua sql_guard) trên kết quả trước đó bằng SQLite trong bộ nhớ,
+        không truy cập lại nguồn dữ liệu.
+        """
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+        try:
+            self.frame.to_sql(FRAME_TABLE_NAME, engine, index=False)
+            return fetch_bounded(engine, guard_query(engine, query))
+        finally:
+            engine.dispose()
+
+
+class ResultFrameCache:
+    """
+    Cache LRU kết quả truy vấn gần nhất của mỗi cuộc trò chuyện (một kết quả cho mỗi nguồn
+    được hỏi ở lượt gần nhất, nhiều nguồn khi câu hỏi được gửi tới nhiều nguồn). Trong bộ nhớ giữ tối đa
+    max_bytes (theo DataFrame.memory_usage); kết quả bị loại khỏi bộ nhớ được ghi ra đĩa
+    (tối đa max_disk_files file, file cũ nhất bị xóa trước). Chỉ dùng từ event loop.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = config.SQL_RESULT_FRAME_MAX_BYTES,
+        ttl: Optional[float] = config.SQL_RESULT_FRAME_TTL,
+        spill_dir: str = config.SQL_RESULT_FRAME_DIR,
+        max_disk_files: int = config.SQL_RESULT_FRAME_MAX_DISK_FILES
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.max_disk_files = max_disk_files
+        self._frames: "OrderedDict[str, Dict[str, ResultFrame]]" = OrderedDict()
+        self._bytes = 0
+
+    def _spill_path(self, chat_id: str) -> str:
+        return os.path.join(self.spill_dir, hashlib.sha256(chat_id.encode("utf-8")).hexdigest() + ".pkl")
+
+    def _expired(self, entries: Dict[str, ResultFrame]) -> bool:
+        return self.ttl is not None and any(time.time() - entry.created_at > self.ttl for entry in entries.values())
+
+    @staticmethod
+    def _nbytes(entries: Dict[str, ResultFrame]) -> int:
+        return sum(entry.nbytes for entry in entries.values())
+
+    def _spill(self, chat_id: str, entries: Dict[str, ResultFrame]):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self._spill_path(chat_id)
+        with open(path + ".tmp", "wb") as target:
+            pickle.dump(entries, target, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+        files = sorted(
+            (os.path.join(self.spill_dir, name) for name in os.listdir(self.spill_dir) if name.endswith(".pkl")),
+            key=os.path.getmtime
+        )
+        for stale in files[:max(len(files) - self.max_disk_files, 0)]:
+            os.remove(stale)
+
+    def _load(self, chat_id: str) -> Optional[Dict[str, ResultFrame]]:
+        path = self._spill_path(chat_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as source:
+                entries = pickle.load(source)
+        except Exception as e:
+            logger.warning(f"Could not load spilled result frame {path}: {str(e)}")
+            return None
+        # File ghi trước khi lưu theo nguồn chứa một ResultFrame
+        return {entries.source: entries} if isinstance(entries, ResultFrame) else entries
+
+    def _remove_spilled(self, chat_id: str):
+        try:
+            os.remove(self._spill_path(chat_id))
+        except FileNotFoundError:
+            pass
+
+    def _pop_memory(self, chat_id: str) -> Optional[Dict[str, ResultFrame]]:
+        entries = self._frames.pop(chat_id, None)
+        if entries is not None:
+            self._bytes -= self._nbytes(entries)
+        return entries
+
+    async def get(self, chat_id: str, source: str) -> Optional[ResultFrame]:
+        """Lấy kết quả gần nhất của cuộc trò chuyện trên nguồn source, None nếu không có hoặc đã hết hạn."""
+        entries = self._frames.get(chat_id)
+        if entries is not None:
+            self._frames.move_to_end(chat_id)
+        else:
+            entries = await asyncio.to_thread(self._load, chat_id)
+            if entries is not None and not self._expired(entries):
+                # Đưa lại vào bộ nhớ vì cuộc trò chuyện đang được dùng
+                await self.set_many(chat_id, entries.values())
+
+        entry = entries.get(source) if entries else None
+        if entry is None:
+            return None
+        if self._expired(entries):
+            await self.discard(chat_id)
+            return None
+        return entry
+
+    async def set(self, chat_id: str, entry: ResultFrame):
+        """Lưu kết quả gần nhất của cuộc trò chuyện (thay cho kết quả trước đó)."""
+        await self.set_many(chat_id, [entry])
+
+    async def set_many(self, chat_id: str, entries: Iterable[ResultFrame]):
+        """Lưu kết quả của một lượt hỏi nhiều nguồn, mỗi nguồn một kết quả (thay cho lượt trước đó)."""
+        entries = {entry.source: entry for entry in entries}
+        self._pop_memory(chat_id)
+        self._frames[chat_id] = entries
+        self._bytes += self._nbytes(entries)
+
+        evicted = []
+        while self._bytes > self.max_bytes and self._frames:
+            evicted_id = next(iter(self._frames))
+            evicted.append((evicted_id, self._pop_memory(evicted_id)))
+        for evicted_id, evicted_entry in evicted:
+            try:
+                await asyncio.to_thread(self._spill, evicted_id, evicted_entry)
+            except Exception as e:
+                logger.warning(f"Could not spill result frame of chat {evicted_id}: {str(e)}")
+        if chat_id in self._frames:
+            # Bản trên đĩa (nếu có) đã cũ
+            await asyncio.to_thread(self._remove_spilled, chat_id)
+
+    async def discard(self, chat_id: str):
+        """Xóa kết quả đã lưu của cuộc trò chuyện (ví dụ khi cuộc trò chuyện bị xóa)."""
+        self._pop_memory(chat_id)
+        await asyncio.to_thread(self._remove_spilled, chat_id)
+
+
+# Instance dùng chung cho toàn ứng dụng
+result_frames = ResultFrameCache()
@@ -0,0 +1,65 @@
+import re
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+# Các khối dòng mẫu trong get_table_info (/* 3 rows from ... */)
+_SAMPLE_ROWS = re.compile(r"/\*.*?\*/", re.DOTALL)
+_REFERENCES = re.compile(r"REFERENCES\s+[`\"\[]?(\w+)", re.IGNORECASE)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+class SchemaIndex:
+    """
+    Chỉ mục embedding mô tả các bảng của một nguồn dữ liệu, dùng để chỉ đưa DDL của các bảng
+    liên quan tới câu hỏi vào prompt sinh SQL. Mô tả bảng được nhúng một lần khi tạo chỉ mục,
+    mỗi câu hỏi chỉ cần nhúng câu hỏi.
+
+    Tham số:
+        embeddings: Mô hình embedding (ví dụ GoogleGenerativeAIEmbeddings).
+        table_infos: Tên bảng -> DDL + dòng mẫu (SQLDatabase.get_table_info của từng bảng).
+        descriptions: Mô tả tùy chọn cho từng bảng (mục "table_descriptions" của nguồn).
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        table_infos: Dict[str, str],
+        descriptions: Optional[Dict[str, str]] = None
+    ):
+        self.embeddings = embeddings
+        self.tables = list(table_infos)
+        descriptions = descriptions or {}
+        self._references = {
+            name: [ref for ref in _REFERENCES.findall(info) if ref in table_infos and ref != name]
+            for name, info in table_infos.items()
+        }
+        texts = [
+            f"Table {name}: {descriptions.get(name, '')}\n{_SAMPLE_ROWS.sub('', table_infos[name]).strip()}"
+            for name in self.tables
+        ]
+        self._vectors = _normalize(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+
+    def top_tables(self, question: str, k: int) -> List[str]:
+        """
+        Các bảng liên quan nhất tới câu hỏi: k bảng gần nhất theo cosine, cộng các bảng được
+        nhắc tên trong câu hỏi và các bảng được tham chiếu qua khóa ngoại (để vẫn JOIN được).
+        """
+        query = _normalize(np.asarray(self.embeddings.embed_query(question), dtype=np.float32))
+        scores = self._vectors @ query
+        selected = [self.tables[i] for i in np.argsort(-scores)[:k]]
+
+        lowered = question.lower()
+        selected += [name for name in self.tables if name.lower() in lowered and name not in selected]
+        for name in list(selected):
+            selected += [ref for ref in self._references[name] if ref not in selected]
+        return selected
@@ -2,36 +2,113 @@ import asyncio
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 from langchain_community.utilities import SQLDatabase
-from langchain_google_genai import ChatGoogleGenerativeAI
+from sqlalchemy import create_engine
+from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
-from langchain import hub
+from langchain_core.prompts import BasePromptTemplate
 from .config import ChatAgentConfig as config
+from .prompt_registry import prompt_registry
+from .cache import TTLCache
+from .schema_index import SchemaIndex
+from .sql_guard import guard_query
+from .sql_routing import CircuitOpenError, EndpointRouter
+from .result_frames import ResultFrame, result_frames
+from .sql_result import QueryResult, fetch_bounded, format_for_prompt
+from .tabular_store import table_db_uri
 
 logger = logging.getLogger(__name__)
 
+# Các khối dòng mẫu trong get_table_info (/* 3 rows from ... */), bỏ đi khi so sánh schema
+_SAMPLE_ROWS = re.compile(r"/\*.*?\*/", re.DOTALL)
+
+
+def normalize_question(question: str) -> str:
+    """Chuẩn hóa câu hỏi làm khóa cache: Unicode NFC, chữ thường, gộp khoảng trắng, bỏ dấu câu cuối."""
+    question = unicodedata.normalize("NFC", question).lower()
+    return " ".join(question.split()).rstrip(" ?.!")
+
+
+def engine_args_for(db_uri: str) -> Dict[str, Any]:
+    """
+    Tham số pool kết nối SQLAlchemy cho một nguồn dữ liệu. SQLite (file dữ liệu dạng bảng)
+    dùng pool mặc định vì không có kết nối mạng để giữ lại.
+    """
+    if db_uri.startswith("sqlite"):
+        return {}
+    args = {}
+    if db_uri.startswith(("mysql", "postgresql")):
+        # Không chờ hết thời gian kết nối mặc định của driver khi server không phản hồi
+        args["connect_args"] = {"connect_timeout": config.SQL_CONNECT_TIMEOUT}
+    return {
+        **args,
+        "pool_size": config.SQL_POOL_SIZE,
+        "max_overflow": config.SQL_MAX_OVERFLOW,
+        "pool_timeout": config.SQL_POOL_TIMEOUT,
+        "pool_recycle": config.SQL_POOL_RECYCLE,  # MySQL đóng kết nối nhàn rỗi sau wait_timeout
+        "pool_pre_ping": True,  # Kiểm tra kết nối trước khi dùng lại, tránh lỗi "server has gone away"
+    }
+
 
 class SQLAssistant:
     def __init__(
         self, 
         db_uri: str, 
         api_key: Optional[str] = config.GOOGLE_API_KEY,  
-        model: str = config.DEFAULT_MODEL_NAME
+        model: str = config.DEFAULT_MODEL_NAME,
+        schema_ttl: Optional[float] = config.SQL_SCHEMA_CACHE_TTL,
+        query_prompt: Optional[BasePromptTemplate] = None,
+        result_ttl: Optional[float] = config.SQL_RESULT_CACHE_TTL,
+        followup_prompt: Optional[BasePromptTemplate] = None,
+        schema_top_k: int = config.SQL_SCHEMA_TOP_K,
+        table_descriptions: Optional[Dict[str, str]] = None,
+        replicas: Optional[List[str]] = None,
+        label: str = "data source"
     ):
-        # Khởi tạo như phiên bản trước
-        if api_key:
-            os.environ['GOOGLE_API_KEY'] = api_key
+        # Prompt sinh SQL lấy từ kho prompt cục bộ (app/prompts), không tải từ LangChain Hub
+        self.query_prompt = query_prompt or prompt_registry.get(config.PROMPTS["sql_query"])
+        self.followup_prompt = followup_prompt or prompt_registry.get(config.PROMPTS["sql_followup"])
+
+        # Cache mô tả schema + dòng mẫu (get_table_info), None = không bao giờ hết hạn
+        self.schema_ttl = schema_ttl
+        self._table_info: Optional[str] = None
+        self._table_info_at = 0.0
+        self._schema_lock = threading.Lock()
+        # Tăng mỗi khi cấu trúc bảng thay đổi, làm vô hiệu các truy vấn đã cache
+        self._schema_version = 0
+        self._schema_ddl: Optional[str] = None
+        # Schema theo từng bảng và chỉ mục embedding để chỉ đưa các bảng liên quan vào prompt
+        self.schema_top_k = schema_top_k
+        self.table_descriptions = table_descriptions or {}
+        self._table_infos: Dict[str, str] = {}
+        self._schema_index: Optional[SchemaIndex] = None
         
-        os.environ['LANGCHAIN_TRACING'] = 'false'
+        # Cache hai tầng: câu hỏi chuẩn hóa -> SQL; SQL -> kết quả (và câu trả lời) theo result_ttl
+        self.query_cache = TTLCache(config.SQL_QUERY_CACHE_SIZE, config.SQL_QUERY_CACHE_TTL)
+        self.result_cache = TTLCache(config.SQL_RESULT_CACHE_SIZE, result_ttl)
+        self.answer_cache = TTLCache(config.SQL_RESULT_CACHE_SIZE, result_ttl)
         
         try:
-            self.db = SQLDatabase.from_uri(db_uri)
-            logger.info(f"Đã kết nối đến cơ sở dữ liệu: {db_uri}")
+            # Engine tạo kết nối khi cần; SQLDatabase (kết nối ngay khi tạo) chỉ được tạo khi đọc
+            # schema lần đầu, qua circuit breaker của primary
+            self.engine = create_engine(db_uri, **engine_args_for(db_uri))
+            self._db: Optional[SQLDatabase] = None
+            logger.info(f"Đã tạo engine cho cơ sở dữ liệu: {self.dialect}")
+            
+            # Truy vấn sinh ra (chỉ đọc) được xoay vòng giữa các replica, kèm circuit breaker
+            self.router = EndpointRouter(self.engine, replicas, engine_args_for(db_uri), label)
             
-            self.llm = ChatGoogleGenerativeAI(model=model)
+            # Truyền API key trực tiếp thay vì ghi vào os.environ
+            llm_kwargs = {"google_api_key": api_key} if api_key else {}
+            self.llm = ChatGoogleGenerativeAI(model=model, **llm_kwargs)
+            self.embeddings = GoogleGenerativeAIEmbeddings(model=config.EMBEDDING_MODEL, **llm_kwargs)
             logger.info(f"Đã khởi tạo LLM: {model}")
             
             # Mẫu prompt với DEFAULT_SYSTEM_PROMPT từ config - đã sửa đổi
@@ -54,26 +131,140 @@ class SQLAssistant:
             logger.error(f"Lỗi khởi tạo: {e}")
             raise
     
+    def get_table_info(self, refresh: bool = False) -> str:
+        """
+        Mô tả schema (DDL + dòng mẫu) dùng trong prompt sinh SQL, được cache theo schema_ttl
+        để không phải phản chiếu bảng và chạy SELECT dòng mẫu cho mỗi câu hỏi. Schema được đọc
+        từ primary qua circuit breaker của router; khi primary đang bị ngắt, schema đã hết hạn
+        vẫn được dùng tiếp, nếu chưa có schema thì báo lỗi ngay.
+
+        Tham số:
+            refresh: Bỏ qua cache và đọc lại schema từ cơ sở dữ liệu.
+
+        Raises:
+            CircuitOpenError: Nếu không đọc được schema vì primary không kết nối được
+        """
+        with self._schema_lock:
+            expired = self.schema_ttl is not None and time.monotonic() - self._table_info_at > self.schema_ttl
+            if refresh or self._table_info is None or expired:
+                started = time.perf_counter()
+                try:
+                    # SQLDatabase dùng chính engine của primary
+                    table_infos = self.router.run(lambda engine: self._read_table_infos(), primary_only=True)
+                except CircuitOpenError as e:
+                    if self._table_info is None or refresh:
+                        raise
+                    logger.warning(f"Không đọc lại được schema, dùng schema đã cache: {e}")
+                    return self._table_info
+                self._table_info = "\n\n".join(table_infos.values())
+                self._table_infos = table_infos
+                self._table_info_at = time.monotonic()
+                ddl = _SAMPLE_ROWS.sub("", self._table_info)
+                if ddl != self._schema_ddl:
+                    self._schema_ddl = ddl
+                    self._schema_version += 1
+                    self._schema_index = self._build_schema_index(table_infos)
+                logger.info(f"Đã đọc schema ({self.dialect}) trong {time.perf_counter() - started:.2f}s")
+            return self._table_info
+    
+    @property
+    def dialect(self) -> str:
+        return self.engine.dialect.name
+    
+    def _read_table_infos(self) -> Dict[str, str]:
+        if self._db is None:
+            # Không phản chiếu toàn bộ schema khi tạo, bảng được đọc khi cần
+            self._db = SQLDatabase(self.engine, lazy_table_reflection=True)
+        return {name: self._db.get_table_info([name]) for name in sorted(self._db.get_usable_table_names())}
+    
+    def _build_schema_index(self, table_infos: Dict[str, str]) -> Optional[SchemaIndex]:
+        # Ít bảng thì đưa toàn bộ schema vào prompt, không cần chỉ mục
+        if len(table_infos) <= config.SQL_SCHEMA_PRUNE_MIN_TABLES:
+            return None
+        try:
+            started = time.perf_counter()
+            index = SchemaIndex(self.embeddings, table_infos, self.table_descriptions)
+            logger.info(f"Đã tạo chỉ mục schema cho {len(table_infos)} bảng trong {time.perf_counter() - started:.2f}s")
+            return index
+        except Exception as e:
+            logger.warning(f"Không tạo được chỉ mục schema, dùng toàn bộ schema: {e}")
+            return None
+    
+    def table_info_for(self, question: str) -> str:
+        """
+        Mô tả schema cho một câu hỏi: chỉ gồm schema_top_k bảng liên quan nhất (theo chỉ mục
+        embedding) khi nguồn có nhiều bảng, ngược lại là toàn bộ schema.
+        """
+        table_info = self.get_table_info()
+        index, table_infos = self._schema_index, self._table_infos
+        if index is None:
+            return table_info
+        try:
+            tables = index.top_tables(question, self.schema_top_k)
+        except Exception as e:
+            logger.warning(f"Không chọn được bảng liên quan, dùng toàn bộ schema: {e}")
+            return table_info
+        logger.info(f"Bảng liên quan tới câu hỏi: {', '.join(tables)}")
+        return "\n\n".join(table_infos[name] for name in tables if name in table_infos)
+    
+    def invalidate_schema(self):
+        """Xóa schema đã cache, lần sinh SQL tiếp theo sẽ đọc lại."""
+        with self._schema_lock:
+            self._table_info = None
+    
+    @property
+    def schema_refreshed_at(self) -> Optional[float]:
+        """Thời điểm (time.time) schema được đọc lần cuối, None nếu chưa có trong cache."""
+        if self._table_info is None:
+            return None
+        return time.time() - (time.monotonic() - self._table_info_at)
+    
+    def _query_messages(self, question: str, table_info: str):
+        prompt_value = self.query_prompt.invoke({
+            "dialect": self.dialect,
+            "top_k": 10,
+            "table_info": table_info,
+            "input": question,
+        })
+        return prompt_value.messages[0].content
+    
+    def _followup_messages(self, question: str, previous: ResultFrame, chat_history: Optional[List[Dict[str, str]]]):
+        history = "\n".join(
+            f"{message['role']}: {message['content'][:500]}"
+            for message in (chat_history or [])[-config.SQL_FOLLOWUP_HISTORY_MESSAGES:]
+        )
+        prompt_value = self.followup_prompt.invoke({
+            "previous_question": previous.question,
+            "previous_query": previous.query,
+            "table_info": previous.table_info(),
+            "history": history or "(none)",
+            "input": question,
+        })
+        return prompt_value.messages[0].content
+    
+    @staticmethod
+    def _extract_query(content: str) -> str:
+        query = content.strip()
+        # Trích xuất SQL từ khối mã nếu có
+        if "```sql" in query:
+            query = query.split("```sql")[1].split("```")[0].strip()
+        return query
+    
+    def _answer_messages(self, question: str, query: str, result: Union[QueryResult, str]):
+        return self.answer_prompt_template.invoke({
+            "question": question,
+            "query": query,
+            # Kết quả lớn được thay bằng thống kê cột + dòng mẫu để không vượt ngữ cảnh của LLM
+            "result": result if isinstance(result, str) else format_for_prompt(result)
+        }).messages
+    
     def write_query(self, question: str) -> str:
         """
         Tạo truy vấn SQL cho một câu hỏi đã cho.
         """
         try:
-            prompt_value = hub.pull("langchain-ai/sql-query-system-prompt").invoke({
-                "dialect": self.db.dialect,
-                "top_k": 10,
-                "table_info": self.db.get_table_info(),
-                "input": question,
-            })
-            
-            message_content = prompt_value.messages[0].content
-            response = self.llm.invoke(message_content)
-            query = response.content.strip()
-            
-            # Trích xuất SQL từ khối mã nếu có
-            if "```sql" in query:
-                query = query.split("```sql")[1].split("```")[0].strip()
-            
+            response = self.llm.invoke(self._query_messages(question, self.table_info_for(question)))
+            query = self._extract_query(response.content)
             logger.info(f"Đã tạo truy vấn cho câu hỏi: {question}")
             return query
         
@@ -81,32 +272,34 @@ class SQLAssistant:
             logger.error(f"Lỗi tạo truy vấn: {e}")
             raise
     
-    def execute_query(self, query: str) -> List[Dict[str, Any]]:
+    def guard_query(self, query: str) -> str:
         """
-        Thực thi truy vấn SQL và trả về kết quả.
+        Kiểm tra truy vấn trước khi thực thi (chỉ SELECT, thêm LIMIT, chi phí ước tính qua EXPLAIN)
+        và trả về câu truy vấn sẽ được chạy.
+        """
+        return self.router.run(lambda engine: guard_query(engine, query))
+    
+    def execute_query(self, query: str) -> QueryResult:
+        """
+        Thực thi truy vấn SQL và trả về kết quả (giới hạn số dòng và dung lượng, xem sql_result),
+        trên replica hoặc primary do router chọn.
         """
         try:
-            execute_query_tool = QuerySQLDatabaseTool(db=self.db)
-            result = execute_query_tool.invoke(query)
-            logger.info(f"Đã thực thi truy vấn thành công: {query}")
+            result = self.router.run(lambda engine: fetch_bounded(engine, query))
+            logger.info(f"Đã thực thi truy vấn thành công ({len(result.rows)} dòng"
+                        f"{', đã cắt bớt' if result.truncated else ''}): {query}")
             return result
         
         except Exception as e:
             logger.error(f"Lỗi thực thi truy vấn: {e}")
             raise
     
-    def generate_answer(self, question: str, query: str, result: List[Dict[str, Any]]) -> str:
+    def generate_answer(self, question: str, query: str, result: QueryResult) -> str:
         """
         Tạo câu trả lời ngôn ngữ tự nhiên từ kết quả truy vấn.
         """
         try:
-            prompt_value = self.answer_prompt_template.invoke({
-                "question": question,
-                "query": query,
-                "result": result
-            })
-            
-            response = self.llm.invoke(prompt_value.messages)
+            response = self.llm.invoke(self._answer_messages(question, query, result))
             logger.info("Đã tạo câu trả lời ngôn ngữ tự nhiên")
             return response.content
         
@@ -114,13 +307,117 @@ class SQLAssistant:
             logger.error(f"Lỗi tạo câu trả lời: {e}")
             raise
     
+    async def awrite_query(self, question: str, timings: Optional[Dict[str, float]] = None) -> str:
+        """
+        Tạo truy vấn SQL (bất đồng bộ): schema được đọc trong thread, LLM được gọi bằng ainvoke.
+        Nếu có timings, thời gian lấy schema được ghi vào timings["schema"].
+        """
+        started = time.perf_counter()
+        table_info = await asyncio.wait_for(
+            asyncio.to_thread(self.table_info_for, question), timeout=config.SQL_SCHEMA_TIMEOUT
+        )
+        if timings is not None:
+            timings["schema"] = time.perf_counter() - started
+        response = await asyncio.wait_for(
+            self.llm.ainvoke(self._query_messages(question, table_info)), timeout=config.SQL_LLM_TIMEOUT
+        )
+        query = self._extract_query(response.content)
+        logger.info(f"Đã tạo truy vấn cho câu hỏi: {question}")
+        return query
+    
+    async def aguard_query(self, query: str) -> str:
+        """Kiểm tra truy vấn trong thread (EXPLAIN cần một lượt truy cập cơ sở dữ liệu)."""
+        return await asyncio.wait_for(
+            asyncio.to_thread(self.guard_query, query), timeout=config.SQL_QUERY_TIMEOUT
+        )
+    
+    async def aexecute_query(self, query: str) -> QueryResult:
+        """
+        Thực thi truy vấn SQL trong thread để không chặn event loop.
+        Lưu ý: khi hết thời gian chờ, thread vẫn chạy cho đến khi truy vấn kết thúc.
+        """
+        result = await asyncio.wait_for(
+            asyncio.to_thread(self.execute_query, query), timeout=config.SQL_QUERY_TIMEOUT
+        )
+        return result
+    
+    async def agenerate_answer(self, question: str, query: str, result: Union[QueryResult, str]) -> str:
+        """
+        Tạo câu trả lời ngôn ngữ tự nhiên từ kết quả truy vấn (bất đồng bộ). result có thể là
+        văn bản đã định dạng sẵn (ví dụ kết quả gộp từ nhiều nguồn).
+        """
+        response = await asyncio.wait_for(
+            self.llm.ainvoke(self._answer_messages(question, query, result)), timeout=config.SQL_LLM_TIMEOUT
+        )
+        logger.info("Đã tạo câu trả lời ngôn ngữ tự nhiên")
+        return response.content
+    
+    async def arun_followup(
+        self,
+        question: str,
+        previous: ResultFrame,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        timings: Optional[Dict[str, float]] = None
+    ) -> Optional[Tuple[str, QueryResult]]:
+        """
+        Trả lời câu hỏi nối tiếp (lọc, sắp xếp, tổng hợp lại) bằng kết quả trước đó của cuộc
+        trò chuyện, chạy trên SQLite trong bộ nhớ thay vì truy vấn lại nguồn dữ liệu.
+        Trả về (truy vấn, kết quả), hoặc None nếu câu hỏi cần truy vấn mới hoặc không trả lời
+        được từ kết quả trước đó.
+        """
+        timings = timings if timings is not None else {}
+        stage, started = "write_followup", time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                self.llm.ainvoke(self._followup_messages(question, previous, chat_history)),
+                timeout=config.SQL_LLM_TIMEOUT
+            )
+            query = self._extract_query(response.content)
+            timings[stage] = time.perf_counter() - started
+            if "NEW_QUERY" in query.upper():
+                return None
+            
+            stage, started = "execute_followup", time.perf_counter()
+            result = await asyncio.wait_for(
+                asyncio.to_thread(previous.query_frame, query), timeout=config.SQL_QUERY_TIMEOUT
+            )
+            timings[stage] = time.perf_counter() - started
+            return query, result
+        except Exception as e:
+            # Không trả lời được từ kết quả trước đó: chạy lại toàn bộ quy trình
+            logger.warning(f"Không trả lời được câu hỏi nối tiếp ở bước {stage}, tạo truy vấn mới: {e!r}")
+            return None
+    
+    async def _astream_answer(self, question: str, query: str, result: QueryResult) -> AsyncIterator[str]:
+        """Sinh câu trả lời dạng stream, mỗi phần phải đến trong SQL_LLM_TIMEOUT giây."""
+        stream = self.llm.astream(self._answer_messages(question, query, result))
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=config.SQL_LLM_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                content = chunk.content
+                if not isinstance(content, str):
+                    content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+                if content:
+                    yield content
+        finally:
+            await stream.aclose()
+        logger.info("Đã tạo câu trả lời ngôn ngữ tự nhiên")
+    
+    def dispose(self):
+        """Đóng toàn bộ kết nối trong pool của nguồn dữ liệu (cả các replica)."""
+        self.router.dispose()
+        self.engine.dispose()
+    
     def process_question(self, question: str) -> Dict[str, Any]:
         """
         Phương thức toàn diện để xử lý câu hỏi ngôn ngữ tự nhiên.
         """
         try:
-            # Tạo truy vấn SQL
-            query = self.write_query(question)
+            # Tạo truy vấn SQL và kiểm tra trước khi chạy
+            query = self.guard_query(self.write_query(question))
             
             # Thực thi truy vấn
             result = self.execute_query(query)
@@ -141,27 +438,372 @@ class SQLAssistant:
                 "question": question,
                 "error": str(e)
             }
+    
+    async def astream_question(
+        self,
+        question: str,
+        previous: Optional[ResultFrame] = None,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        stream_answer: bool = True,
+        with_answer: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Xử lý câu hỏi mà không chặn event loop, mỗi bước có thời gian chờ riêng, và phát các
+        sự kiện theo tiến trình (trường "event"):
+            stage: bắt đầu một bước ("followup", "write_query", "execute_query", "generate_answer")
+            query: câu SQL sẽ chạy (kèm "cached")
+            result: số dòng, có bị cắt bớt không và thời gian thực thi (ms)
+            token: một phần câu trả lời (cả câu trả lời nếu stream_answer=False hoặc lấy từ cache)
+            done: kết quả cuối cùng (question, query, result, answer, timings, cached, followup)
+            error: lỗi hoặc hết thời gian chờ ở bước "stage", kết thúc luồng
+        Nếu có previous (kết quả gần nhất của cuộc trò chuyện), câu hỏi được thử trả lời từ đó trước.
+        Với with_answer=False, quy trình dừng sau khi có kết quả truy vấn ("done" không có "answer").
+        Thời gian (giây) của từng bước nằm trong "timings" (write_query gồm cả "schema").
+        """
+        timings: Dict[str, float] = {}
+        cached = {"query": False, "result": False, "answer": False}
+        stage = "followup"
+        try:
+            followup = None
+            if previous is not None:
+                yield {"event": "stage", "stage": stage}
+                followup = await self.arun_followup(question, previous, chat_history, timings)
+            
+            if followup is not None:
+                query, result = followup
+                answer_key = None
+                yield {"event": "query", "query": query, "cached": False}
+                execute_ms = timings["execute_followup"] * 1000
+            else:
+                stage = "write_query"
+                # Nguồn đang bị ngắt (circuit breaker mở) thì báo lỗi ngay, không gọi LLM
+                self.router.ensure_available()
+                yield {"event": "stage", "stage": stage}
+                # Tầng 1: câu hỏi đã gặp (cùng schema) thì dùng lại SQL, bỏ qua lần gọi LLM sinh SQL
+                question_key = (self._schema_version, normalize_question(question))
+                started = time.perf_counter()
+                query = self.query_cache.get(question_key)
+                if query is None:
+                    query = await self.awrite_query(question, timings)
+                    # Schema có thể vừa được đọc lại trong awrite_query
+                    question_key = (self._schema_version, question_key[1])
+                    timings[stage] = time.perf_counter() - started
+                    
+                    # Chỉ câu SQL đã qua kiểm tra mới được chạy và đưa vào cache
+                    stage, started = "guard_query", time.perf_counter()
+                    query = await self.aguard_query(query)
+                    self.query_cache.set(question_key, query)
+                else:
+                    cached["query"] = True
+                timings[stage] = time.perf_counter() - started
+                yield {"event": "query", "query": query, "cached": cached["query"]}
+                
+                # Tầng 2: kết quả của cùng câu SQL còn hạn thì không truy vấn lại cơ sở dữ liệu
+                stage, started = "execute_query", time.perf_counter()
+                yield {"event": "stage", "stage": stage}
+                result = self.result_cache.get(query)
+                if result is None:
+                    result = await self.aexecute_query(query)
+                    self.result_cache.set(query, result)
+                else:
+                    cached["result"] = True
+                timings[stage] = time.perf_counter() - started
+                answer_key = (question_key[1], query)
+                execute_ms = timings[stage] * 1000
+            
+            yield {
+                "event": "result",
+                "rows": len(result.rows),
+                "truncated": result.truncated,
+                "ms": round(execute_ms, 1),
+                "cached": cached["result"]
+            }
+            
+            if not with_answer:
+                yield {
+                    "event": "done",
+                    "question": question,
+                    "query": query,
+                    "result": result,
+                    "timings": timings,
+                    "cached": cached,
+                    "followup": followup is not None
+                }
+                return
+            
+            # Cùng câu hỏi trên cùng kết quả còn hạn thì dùng lại câu trả lời
+            stage, started = "generate_answer", time.perf_counter()
+            yield {"event": "stage", "stage": stage}
+            answer = self.answer_cache.get(answer_key) if answer_key and cached["result"] else None
+            if answer is not None:
+                cached["answer"] = True
+                yield {"event": "token", "text": answer}
+            elif stream_answer:
+                parts = []
+                async for text in self._astream_answer(question, query, result):
+                    parts.append(text)
+                    yield {"event": "token", "text": text}
+                answer = "".join(parts)
+            else:
+                answer = await self.agenerate_answer(question, query, result)
+                yield {"event": "token", "text": answer}
+            if answer_key and not cached["answer"]:
+                self.answer_cache.set(answer_key, answer)
+            timings[stage] = time.perf_counter() - started
+            
+            yield {
+                "event": "done",
+                "question": question,
+                "query": query,
+                "result": result,
+                "answer": answer,
+                "timings": timings,
+                "cached": cached,
+                "followup": followup is not None
+            }
+        
+        except asyncio.TimeoutError:
+            logger.error(f"Hết thời gian chờ ở bước {stage} cho câu hỏi: {question}")
+            yield {"event": "error", "stage": stage, "error": f"{stage} timed out", "timings": timings}
+        except Exception as e:
+            logger.error(f"Lỗi xử lý câu hỏi ở bước {stage}: {e}")
+            yield {"event": "error", "stage": stage, "error": str(e), "timings": timings}
+    
+    async def aprocess_question(
+        self,
+        question: str,
+        previous: Optional[ResultFrame] = None,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        with_answer: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Xử lý câu hỏi và trả về kết quả cuối cùng của astream_question (câu trả lời không stream).
+        Khi lỗi, kết quả có "error" thay cho "query"/"result"/"answer".
+        """
+        async for event in self.astream_question(
+            question, previous, chat_history, stream_answer=False, with_answer=with_answer
+        ):
+            if event["event"] == "done":
+                return {key: value for key, value in event.items() if key != "event"}
+            if event["event"] == "error":
+                return {"question": question, "error": event["error"], "timings": event["timings"]}
+        return {"question": question, "error": "no result", "timings": {}}
+
+class SQLAssistantRegistry:
+    """
+    Giữ một SQLAssistant dùng lâu dài (engine + pool kết nối + LLM) cho mỗi nguồn dữ liệu
+    trong dataApiFetching, tạo khi được dùng lần đầu. Các file dữ liệu dạng bảng (SQLite)
+    được giữ trong một cache LRU giới hạn kích thước.
+    """
+
+    def __init__(self, max_table_assistants: int = config.SQL_TABLE_ASSISTANT_CACHE_SIZE):
+        self.max_table_assistants = max_table_assistants
+        self._sources: Dict[str, SQLAssistant] = {}
+        self._tables: "OrderedDict[str, SQLAssistant]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._health_task: Optional[asyncio.Task] = None
+
+    async def _create(self, key: str, db_uri: str, **kwargs) -> SQLAssistant:
+        # Một lock cho mỗi nguồn để các request đồng thời không tạo trùng engine
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            assistant = self._sources.get(key) or self._tables.get(key)
+            if assistant is None:
+                assistant = await asyncio.to_thread(SQLAssistant, db_uri=db_uri, **kwargs)
+            return assistant
+
+    async def start(self):
+        """Đọc trước schema của các nguồn đang hoạt động và chạy tác vụ làm mới schema định kỳ."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop(), name="sql-schema-refresh")
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop(), name="sql-health-check")
+
+    async def stop(self):
+        """Dừng tác vụ làm mới schema, kiểm tra sức khỏe và đóng các pool kết nối."""
+        tasks = [task for task in (self._refresh_task, self._health_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refresh_task = self._health_task = None
+        self.dispose()
+
+    async def _health_loop(self):
+        # Kiểm tra định kỳ primary và các replica của những nguồn đã được dùng
+        while True:
+            await asyncio.sleep(config.SQL_HEALTH_CHECK_INTERVAL)
+            await asyncio.gather(
+                *(asyncio.to_thread(assistant.router.health_check) for assistant in list(self._sources.values())),
+                return_exceptions=True
+            )
+
+    def health(self, value_db_connect: str) -> Optional[Dict[str, Any]]:
+        """Trạng thái các kết nối của một nguồn, None nếu nguồn chưa được dùng lần nào."""
+        assistant = self._sources.get(value_db_connect)
+        return assistant.router.health() if assistant is not None else None
+
+    async def refresh_schema(self, value_db_connect: str) -> Optional[SQLAssistant]:
+        """Đọc lại schema của một nguồn ngay lập tức (ví dụ sau khi thay đổi bảng)."""
+        assistant = await self.get(value_db_connect)
+        if assistant is not None:
+            await asyncio.to_thread(assistant.get_table_info, True)
+        return assistant
+
+    async def _refresh_loop(self):
+        # Lần đầu: tạo assistant và đọc schema của mọi nguồn đang hoạt động (chạy nền để
+        # server vẫn khởi động được khi một nguồn không truy cập được)
+        while True:
+            for item in config.dataApiFetching:
+                if not item.get("active") or "://" not in item.get("sql_connect", ""):
+                    continue
+                try:
+                    await self.refresh_schema(item["value"])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error refreshing schema for {item['value']}: {str(e)}")
+            await asyncio.sleep(config.SQL_SCHEMA_REFRESH_INTERVAL)
+
+    async def get(self, value_db_connect: str) -> Optional[SQLAssistant]:
+        """Lấy assistant của một nguồn trong dataApiFetching (theo "value"), None nếu không có nguồn này."""
+        assistant = self._sources.get(value_db_connect)
+        if assistant is not None:
+            return assistant
+
+        db_info = next((item for item in config.dataApiFetching if item.get("value") == value_db_connect), None)
+        if not db_info:
+            return None
+        assistant = await self._create(
+            value_db_connect,
+            db_info["sql_connect"],
+            query_prompt=prompt_registry.for_source("sql_query", db_info),
+            followup_prompt=prompt_registry.for_source("sql_followup", db_info),
+            schema_top_k=db_info.get("schema_top_k", config.SQL_SCHEMA_TOP_K),
+            table_descriptions=db_info.get("table_descriptions"),
+            replicas=db_info.get("replicas"),
+            label=db_info.get("label") or value_db_connect,
+            result_ttl=db_info.get("result_cache_ttl", config.SQL_RESULT_CACHE_TTL)
+        )
+        self._sources[value_db_connect] = assistant
+        return assistant
+
+    async def get_for_table(self, table_db: str) -> SQLAssistant:
+        """Lấy assistant cho file SQLite của một tài liệu dạng bảng (mở ở chế độ chỉ đọc)."""
+        assistant = self._tables.get(table_db)
+        if assistant is not None:
+            self._tables.move_to_end(table_db)
+            return assistant
+
+        # Dữ liệu của file không thay đổi nên schema được cache vĩnh viễn
+        assistant = await self._create(table_db, table_db_uri(table_db), schema_ttl=None, result_ttl=None)
+        self._tables[table_db] = assistant
+        self._tables.move_to_end(table_db)
+        while len(self._tables) > self.max_table_assistants:
+            key, evicted = self._tables.popitem(last=False)
+            self._locks.pop(key, None)
+            evicted.dispose()
+        return assistant
+
+    def dispose(self):
+        """Đóng các pool kết nối khi ứng dụng dừng."""
+        for assistant in [*self._sources.values(), *self._tables.values()]:
+            try:
+                assistant.dispose()
+            except Exception as e:
+                logger.error(f"Error disposing SQL connection pool: {str(e)}")
+        self._sources.clear()
+        self._tables.clear()
+        self._locks.clear()
+
+
+# Instance dùng chung cho toàn ứng dụng
+sql_assistants = SQLAssistantRegistry()
+
+async def previous_frame(chat_id: Optional[str], source: str) -> Optional[ResultFrame]:
+    """Kết quả gần nhất của cuộc trò chuyện trên nguồn source dùng được cho câu hỏi nối tiếp."""
+    previous = await result_frames.get(chat_id, source) if chat_id else None
+    # Kết quả đã bị cắt bớt không đủ để lọc/tổng hợp lại chính xác
+    if previous is not None and previous.truncated:
+        return None
+    return previous
+
+
+async def stream_in_chat(
+    sql_assistant: SQLAssistant,
+    source: str,
+    question: str,
+    chat_id: Optional[str] = None,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    stream_answer: bool = True) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Xử lý câu hỏi trong ngữ cảnh một cuộc trò chuyện, phát các sự kiện của astream_question:
+    thử trả lời từ kết quả gần nhất của cuộc trò chuyện trên cùng nguồn (result_frames), nếu
+    không được thì chạy toàn bộ quy trình. Kết quả mới được lưu lại cho câu hỏi nối tiếp.
+    """
+    previous = await previous_frame(chat_id, source)
+    async for event in sql_assistant.astream_question(question, previous, chat_history, stream_answer):
+        if event["event"] == "done" and chat_id:
+            await result_frames.set(
+                chat_id, ResultFrame.from_result(source, question, event["query"], event["result"])
+            )
+        yield event
+
+
+async def process_in_chat(
+    sql_assistant: SQLAssistant,
+    source: str,
+    question: str,
+    chat_id: Optional[str] = None,
+    chat_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+    """Như stream_in_chat nhưng chỉ trả về kết quả cuối cùng (xem SQLAssistant.aprocess_question)."""
+    async for event in stream_in_chat(sql_assistant, source, question, chat_id, chat_history, stream_answer=False):
+        if event["event"] == "done":
+            return {key: value for key, value in event.items() if key != "event"}
+        if event["event"] == "error":
+            return {"question": question, "error": event["error"], "timings": event["timings"]}
+    return {"question": question, "error": "no result", "timings": {}}
+
+
+async def stream_response_from_sql(
+    question: str,
+    value_db_connect: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    chat_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Phiên bản stream của generate_response_from_sql: phát sự kiện theo từng bước (xem
+    SQLAssistant.astream_question) và các phần của câu trả lời ngay khi LLM sinh ra.
+    """
+    try:
+        sql_assistant = await sql_assistants.get(value_db_connect)
+    except Exception as e:
+        logger.error(f"Error connecting to data source {value_db_connect}: {str(e)}")
+        yield {"event": "error", "stage": "connect", "error": str(e), "timings": {}}
+        return
+
+    if not sql_assistant:
+        logger.error(f"Database connection not found for value: {value_db_connect}")
+        yield {"event": "error", "stage": "connect", "error": f"data source '{value_db_connect}' not found", "timings": {}}
+        return
+
+    async for event in stream_in_chat(sql_assistant, value_db_connect, question, chat_id, chat_history):
+        yield event
+
 
 async def generate_response_from_sql(
     answer: str, 
     value_db_connect: str, 
-    chat_history: Optional[List[Dict[str, str]]] = None) -> str:
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    chat_id: Optional[str] = None) -> str:
     try:
-        # Find the database connection info from the config
-        db_info = next((item for item in config.dataApiFetching if item["value"] == value_db_connect), None)
+        # Reuse the long-lived assistant (engine pool + LLM) of this data source
+        sql_assistant = await sql_assistants.get(value_db_connect)
         
-        if not db_info:
+        if not sql_assistant:
             logger.error(f"Database connection not found for value: {value_db_connect}")
             return f"Xin lỗi, không tìm thấy kết nối cơ sở dữ liệu cho '{value_db_connect}'"
         
-        # Get the SQL connection string
-        db_uri = db_info['sql_connect']
-        
-        # Create SQLAssistant instance with the provided database URI
-        sql_assistant = SQLAssistant(db_uri=db_uri)
-        
-        # Process the question using SQLAssistant
-        result = sql_assistant.process_question(answer)
+        # Process the question without blocking the event loop, reusing the chat's last result for follow-ups
+        result = await process_in_chat(sql_assistant, value_db_connect, answer, chat_id, chat_history)
         
         # If there was an error in processing
         if "error" in result:
@@ -175,3 +817,125 @@ async def generate_response_from_sql(
         logger.error(f"Error generating response from SQL: {str(e)}")
         return config.ERROR_MESSAGES.get("processing_error", "Processing error: {error}").format(error=str(e))
 
+
+def _source_label(value_db_connect: str) -> str:
+    db_info = next((item for item in config.dataApiFetching if item.get("value") == value_db_connect), None)
+    return (db_info or {}).get("label") or value_db_connect
+
+
+async def _query_source(
+    question: str,
+    value_db_connect: str,
+    chat_id: Optional[str] = None,
+    chat_history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+    """
+    Sinh và chạy truy vấn trên một nguồn (không tạo câu trả lời), thử trả lời từ kết quả gần
+    nhất của cuộc trò chuyện trên nguồn đó trước như stream_in_chat. Lỗi được trả về trong "error".
+    """
+    try:
+        sql_assistant = await sql_assistants.get(value_db_connect)
+    except Exception as e:
+        return {"source": value_db_connect, "error": str(e)}
+    if not sql_assistant:
+        return {"source": value_db_connect, "error": "data source not found"}
+    previous = await previous_frame(chat_id, value_db_connect)
+    result = await sql_assistant.aprocess_question(question, previous, chat_history, with_answer=False)
+    return {"source": value_db_connect, "assistant": sql_assistant, **result}
+
+
+async def generate_response_from_sources(
+    question: str,
+    value_db_connects: List[str],
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    chat_id: Optional[str] = None) -> str:
+    """
+    Trả lời một câu hỏi trên nhiều nguồn dữ liệu: mỗi nguồn sinh và chạy truy vấn riêng,
+    đồng thời (tổng thời gian xấp xỉ nguồn chậm nhất), sau đó kết quả của các nguồn được gộp
+    thành một câu trả lời duy nhất bằng một lần gọi LLM. Như khi hỏi một nguồn, câu hỏi nối
+    tiếp được thử trả lời từ kết quả gần nhất của từng nguồn trong cuộc trò chuyện.
+
+    Tham số:
+        question: Câu hỏi của người dùng.
+        value_db_connects: Các nguồn trong dataApiFetching (theo "value").
+        chat_history: Danh sách tùy chọn các tin nhắn trước đó.
+        chat_id: ID cuộc trò chuyện, dùng để lưu và dùng lại kết quả cho câu hỏi nối tiếp.
+
+    Trả về:
+        Câu trả lời ngôn ngữ tự nhiên.
+    """
+    try:
+        sources = list(dict.fromkeys(value_db_connects))
+        results = await asyncio.gather(*(
+            _query_source(question, value, chat_id, chat_history) for value in sources
+        ))
+
+        succeeded = [result for result in results if "error" not in result]
+        for result in results:
+            if "error" in result:
+                logger.error(f"Error in SQL processing for {result['source']}: {result['error']}")
+        if not succeeded:
+            errors = "; ".join(f"{_source_label(result['source'])}: {result['error']}" for result in results)
+            return f"Xin lỗi, tôi gặp sự cố khi truy vấn cơ sở dữ liệu: {errors}"
+        if chat_id:
+            await result_frames.set_many(chat_id, [
+                ResultFrame.from_result(result["source"], question, result["query"], result["result"])
+                for result in succeeded
+            ])
+
+        # Chia đều độ dài kết quả cho phép trong prompt giữa các nguồn
+        budget = max(config.SQL_ANSWER_MAX_CHARS // len(results), 500)
+        sections = []
+        for result in results:
+            label = _source_label(result["source"])
+            if "error" in result:
+                sections.append(f"Nguồn {label}: không truy vấn được ({result['error']})")
+            else:
+                sections.append(f"Nguồn {label}:\n{format_for_prompt(result['result'], max_chars=budget)}")
+
+        # Dùng LLM và prompt trả lời của nguồn đầu tiên truy vấn thành công
+        return await succeeded[0]["assistant"].agenerate_answer(
+            question,
+            "\n\n".join(result["query"] for result in succeeded),
+            "\n\n".join(sections)
+        )
+
+    except Exception as e:
+        logger.error(f"Error generating response from SQL sources: {str(e)}")
+        return config.ERROR_MESSAGES.get("processing_error", "Processing error: {error}").format(error=str(e))
+
+
+async def generate_response_from_table(
+    question: str,
+    table_db: str,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    chat_id: Optional[str] = None) -> str:
+    """
+    Trả lời câu hỏi về một file CSV/Excel đã được nạp thành bảng SQLite khi tải lên
+    (xem tabular_store), bằng cách sinh và chạy truy vấn SQL thay vì tìm kiếm vector.
+
+    Tham số:
+        question: Câu hỏi của người dùng.
+        table_db: Đường dẫn file SQLite của tài liệu (metadata "table_db" của File).
+        chat_history: Danh sách tùy chọn các tin nhắn trước đó.
+        chat_id: ID cuộc trò chuyện, dùng để trả lời câu hỏi nối tiếp từ kết quả trước đó.
+
+    Trả về:
+        Câu trả lời ngôn ngữ tự nhiên.
+    """
+    try:
+        if not os.path.exists(table_db):
+            logger.error(f"Table database not found: {table_db}")
+            return config.ERROR_MESSAGES["processing_error"].format(error="table data not found")
+
+        sql_assistant = await sql_assistants.get_for_table(table_db)
+        result = await process_in_chat(sql_assistant, table_db, question, chat_id, chat_history)
+
+        if "error" in result:
+            logger.error(f"Error in SQL processing: {result['error']}")
+            return f"Xin lỗi, tôi gặp sự cố khi truy vấn dữ liệu của tài liệu: {result['error']}"
+
+        return result["answer"]
+
+    except Exception as e:
+        logger.error(f"Error generating response from table: {str(e)}")
+        return config.ERROR_MESSAGES.get("processing_error", "Processing error: {error}").format(error=str(e))
@@ -0,0 +1,153 @@
+import re
+import time
+import logging
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy.engine import Connection, Engine
+
+from .config import ChatAgentConfig as config
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+# Chuỗi, định danh trong dấu `...` và chú thích: được che đi trước khi phân tích từ khóa
+_LITERALS_AND_COMMENTS = re.compile(
+    r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`|--[^\n]*|#[^\n]*|/\*.*?\*/",
+    re.DOTALL
+)
+_FIRST_KEYWORD = re.compile(r"^[\s(]*(\w+)")
+# REPLACE và INSERT cũng là hàm chuỗi của MySQL (REPLACE(str, from, to), INSERT(str, pos, len, new)):
+# chỉ từ chối khi không phải lời gọi hàm
+_FORBIDDEN_KEYWORDS = re.compile(
+    r"\b(UPDATE|DELETE|MERGE|UPSERT|DROP|ALTER|CREATE|TRUNCATE|RENAME|GRANT|REVOKE"
+    r"|CALL|EXEC|EXECUTE|LOCK|UNLOCK|SET|HANDLER|LOAD|ATTACH|DETACH|PRAGMA|VACUUM|OUTFILE|DUMPFILE)\b"
+    r"|\b(INSERT|REPLACE)\b(?!\s*\()",
+    re.IGNORECASE
+)
+_TRAILING_LIMIT = re.compile(r"\blimit\s+\d+(\s*,\s*\d+)?(\s+offset\s+\d+)?\s*$", re.IGNORECASE)
+
+
+class QueryRejectedError(ValueError):
+    """Truy vấn sinh ra không được phép chạy (không phải SELECT hoặc chi phí ước tính quá lớn)."""
+
+
+def _mask(query: str) -> str:
+    def replace(match: re.Match) -> str:
+        token = match.group(0)
+        return " " if token.startswith(("--", "#", "/*")) else "''"
+    return _LITERALS_AND_COMMENTS.sub(replace, query)
+
+
+def check_read_only(query: str) -> str:
+    """
+    Kiểm tra truy vấn là đúng một câu lệnh SELECT (hoặc WITH ... SELECT) và trả về câu lệnh
+    đã bỏ dấu ";" ở cuối.
+
+    Raises:
+        QueryRejectedError: Nếu có nhiều câu lệnh hoặc câu lệnh có thể thay đổi dữ liệu
+    """
+    query = query.strip().rstrip(";").strip()
+    masked = _mask(query).strip().rstrip(";")
+    if ";" in masked:
+        raise QueryRejectedError("Only a single SQL statement is allowed")
+
+    first = _FIRST_KEYWORD.match(masked)
+    if not first or first.group(1).upper() not in ("SELECT", "WITH"):
+        raise QueryRejectedError("Only SELECT queries are allowed")
+
+    forbidden = _FORBIDDEN_KEYWORDS.search(masked)
+    if forbidden:
+        keyword = forbidden.group(1) or forbidden.group(2)
+        raise QueryRejectedError(f"Keyword {keyword.upper()} is not allowed in generated queries")
+    return query
+
+
+def ensure_limit(query: str, limit: int) -> str:
+    """Thêm LIMIT vào truy vấn nếu câu lệnh ngoài cùng chưa có."""
+    if _TRAILING_LIMIT.search(_mask(query).rstrip()):
+        return query
+    # Xuống dòng để không bị nuốt bởi chú thích "--" ở cuối truy vấn
+    return f"{query}\nLIMIT {limit}"
+
+
+def estimate_rows(engine: Engine, query: str) -> Optional[int]:
+    """
+    Ước tính số dòng cơ sở dữ liệu phải duyệt bằng EXPLAIN. Hiện chỉ MySQL/MariaDB có ước
+    tính theo dòng: tích số "rows" của các bảng trong cùng một SELECT (nested loop join),
+    cộng dồn giữa các SELECT. Trả về None nếu dialect không hỗ trợ.
+    """
+    if engine.dialect.name != "mysql":
+        return None
+
+    with engine.connect() as connection:
+        # no_parameters: tránh pymysql định dạng câu lệnh bằng "%" (xem sql_result.fetch_bounded)
+        plan = connection.execution_options(no_parameters=True).exec_driver_sql(f"EXPLAIN {query}").mappings().all()
+
+    per_select = {}
+    for step in plan:
+        rows = step.get("rows")
+        if rows is None:
+            continue
+        per_select[step.get("id")] = per_select.get(step.get("id"), 1) * max(int(rows), 1)
+    return sum(per_select.values())
+
+
+def guard_query(
+    engine: Engine,
+    query: str,
+    limit: int = config.SQL_RESULT_MAX_ROWS + 1,
+    max_examined_rows: int = config.SQL_GUARD_MAX_EXAMINED_ROWS
+) -> str:
+    """
+    Bước kiểm tra trước khi thực thi truy vấn sinh bởi LLM: chỉ cho phép SELECT, thêm LIMIT
+    (một dòng hơn giới hạn đọc để vẫn biết kết quả bị cắt) và từ chối truy vấn có chi phí
+    ước tính vượt max_examined_rows. Trả về câu truy vấn sẽ được thực thi.
+
+    Raises:
+        QueryRejectedError: Nếu truy vấn không được phép chạy
+    """
+    query = ensure_limit(check_read_only(query), limit)
+
+    estimated = estimate_rows(engine, query)
+    if estimated is not None and estimated > max_examined_rows:
+        logger.warning(f"Từ chối truy vấn có chi phí ước tính {estimated} dòng: {query}")
+        raise QueryRejectedError(
+            f"Query would examine about {estimated} rows (limit {max_examined_rows}); "
+            "please ask a narrower question"
+        )
+    return query
+
+
+@contextmanager
+def statement_timeout(connection: Connection, seconds: Optional[float]):
+    """
+    Đặt thời gian chạy tối đa phía cơ sở dữ liệu cho các câu lệnh trên kết nối, để truy vấn
+    bị hủy trên server thay vì tiếp tục chạy sau khi phía ứng dụng đã hết thời gian chờ.
+    """
+    if not seconds:
+        yield
+        return
+
+    dialect = connection.dialect
+    if dialect.name == "sqlite":
+        # SQLite không có timeout câu lệnh: progress handler trả về giá trị khác 0 sẽ ngắt truy vấn
+        driver_connection = connection.connection.driver_connection
+        deadline = time.monotonic() + seconds
+        driver_connection.set_progress_handler(lambda: int(time.monotonic() > deadline), 10000)
+        try:
+            yield
+        finally:
+            driver_connection.set_progress_handler(None, 0)
+        return
+
+    if dialect.name == "mysql":
+        if getattr(dialect, "is_mariadb", False):
+            connection.exec_driver_sql(f"SET SESSION max_statement_time = {float(seconds)}")
+        else:
+            connection.exec_driver_sql(f"SET SESSION MAX_EXECUTION_TIME = {int(seconds * 1000)}")
+    elif dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET statement_timeout = {int(seconds * 1000)}")
+    else:
+        logger.debug(f"Không hỗ trợ timeout câu lệnh cho dialect {dialect.name}")
+    yield
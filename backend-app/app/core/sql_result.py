@@ -0,0 +1,141 @@
+import logging
+import numbers
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+
+from .config import ChatAgentConfig as config
+from .sql_guard import statement_timeout
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueryResult:
+    """Kết quả của một truy vấn, giới hạn theo số dòng và dung lượng."""
+    columns: List[str]
+    rows: List[Tuple[Any, ...]] = field(default_factory=list)
+    truncated: bool = False  # Kết quả thực tế dài hơn phần đã đọc
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.rows, columns=self.columns)
+
+
+def _row_size(row: Tuple[Any, ...]) -> int:
+    return sum(len(str(value)) for value in row) + len(row)
+
+
+def fetch_bounded(
+    engine: Engine,
+    query: str,
+    max_rows: int = config.SQL_RESULT_MAX_ROWS,
+    max_bytes: int = config.SQL_RESULT_MAX_BYTES,
+    batch_rows: int = config.SQL_FETCH_BATCH_ROWS,
+    timeout: Optional[float] = config.SQL_STATEMENT_TIMEOUT
+) -> QueryResult:
+    """
+    Thực thi truy vấn và đọc kết quả theo từng lô, dừng khi vượt quá max_rows dòng hoặc
+    max_bytes (ước lượng theo độ dài văn bản) để một truy vấn rộng không làm đầy bộ nhớ.
+    Truy vấn bị cơ sở dữ liệu hủy nếu chạy quá timeout giây (xem sql_guard.statement_timeout).
+    """
+    with engine.connect() as connection, statement_timeout(connection, timeout):
+        # stream_results: dùng cursor phía server (nếu driver hỗ trợ) thay vì tải toàn bộ kết quả.
+        # no_parameters: gọi cursor.execute(query) không kèm tham số, nếu không pymysql sẽ định dạng
+        # câu lệnh bằng "query % ()" và lỗi với các ký tự "%" của LIKE '%...%' hay DATE_FORMAT
+        cursor = connection.execution_options(stream_results=True, no_parameters=True).exec_driver_sql(query)
+        if not cursor.returns_rows:
+            return QueryResult(columns=[])
+
+        result = QueryResult(columns=list(cursor.keys()))
+        size = 0
+        while batch := cursor.fetchmany(batch_rows):
+            for row in batch:
+                size += _row_size(row)
+                if len(result.rows) >= max_rows or size > max_bytes:
+                    result.truncated = True
+                    break
+                result.rows.append(tuple(row))
+            if result.truncated:
+                break
+        cursor.close()
+    return result
+
+
+def _format_rows(columns: List[str], rows: List[Tuple[Any, ...]]) -> str:
+    lines = [" | ".join(columns)]
+    lines.extend(" | ".join("" if value is None else str(value) for value in row) for row in rows)
+    return "\n".join(lines)
+
+
+def _format_number(value: Any) -> str:
+    """Định dạng số không mất chữ số: số nguyên giữ nguyên, số thực làm tròn 4 chữ số thập phân."""
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{round(value, 4):.15g}"
+
+
+def _summarize(result: QueryResult, sample_rows: int, top_values: int) -> str:
+    """Thống kê từng cột (tính vector hóa bằng pandas) kèm một số dòng mẫu."""
+    import pandas as pd
+
+    df = result.to_frame()
+    lines = [
+        f"Số dòng: {len(df)}{' (đã cắt bớt, kết quả thực tế nhiều hơn)' if result.truncated else ''}",
+        "Thống kê theo cột:",
+    ]
+    for column in df.columns:
+        series = df[column]
+        non_null = int(series.notna().sum())
+        # Cột ngày giờ/khoảng thời gian chỉ báo khoảng giá trị (không đổi sang số nano giây)
+        if non_null and (pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_timedelta64_dtype(series)):
+            lines.append(f"- {column} (thời gian): có giá trị {non_null}, từ {series.min()} đến {series.max()}")
+            continue
+
+        # Kiểu DECIMAL/số lưu dạng object cũng được coi là số
+        numeric = series if pd.api.types.is_numeric_dtype(series) else pd.to_numeric(series, errors="coerce")
+        if non_null and int(numeric.notna().sum()) == non_null and not pd.api.types.is_bool_dtype(series):
+            lines.append(
+                f"- {column} (số): có giá trị {non_null}, min {_format_number(numeric.min())}, "
+                f"max {_format_number(numeric.max())}, trung bình {_format_number(numeric.mean())}, "
+                f"tổng {_format_number(numeric.sum())}"
+            )
+        else:
+            counts = series.astype(str).where(series.notna()).value_counts().head(top_values)
+            top = ", ".join(f"{value} ({count})" for value, count in counts.items())
+            lines.append(f"- {column}: có giá trị {non_null}, {series.nunique()} giá trị khác nhau; phổ biến nhất: {top}")
+
+    lines.append(f"{min(sample_rows, len(df))} dòng đầu tiên:")
+    lines.append(_format_rows(result.columns, result.rows[:sample_rows]))
+    return "\n".join(lines)
+
+
+def format_for_prompt(
+    result: QueryResult,
+    max_chars: int = config.SQL_ANSWER_MAX_CHARS,
+    sample_rows: int = config.SQL_ANSWER_SAMPLE_ROWS,
+    top_values: int = 5
+) -> str:
+    """
+    Chuyển kết quả truy vấn thành văn bản cho prompt tạo câu trả lời. Kết quả nhỏ được đưa
+    nguyên dạng bảng; kết quả vượt max_chars được thay bằng thống kê cột và các dòng mẫu.
+    """
+    if not result.columns:
+        return "Truy vấn không trả về dữ liệu."
+    if not result.rows:
+        return f"Không có dòng nào ({' | '.join(result.columns)})."
+
+    text = _format_rows(result.columns, result.rows)
+    if len(text) <= max_chars and not result.truncated:
+        return text
+
+    summary = _summarize(result, sample_rows, top_values)
+    if len(summary) > max_chars:
+        summary = summary[:max_chars] + "\n..."
+    return summary
@@ -0,0 +1,253 @@
+import time
+import logging
+import threading
+import itertools
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError, TimeoutError as PoolTimeoutError
+
+from .config import ChatAgentConfig as config
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Mã lỗi MySQL/MariaDB cho biết không kết nối được tới server (không phải lỗi của câu truy vấn)
+_MYSQL_CONNECTION_ERRORS = {2002, 2003, 2005, 2006, 2013, 2055}
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Mọi kết nối của nguồn dữ liệu đang bị ngắt (circuit breaker mở), từ chối ngay thay vì chờ."""
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Lỗi do mất kết nối/không kết nối được tới cơ sở dữ liệu, khác với lỗi của câu truy vấn."""
+    if isinstance(error, (DisconnectionError, PoolTimeoutError)):
+        return True
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    if isinstance(error, OperationalError):
+        args = getattr(error.orig, "args", ())
+        return bool(args) and args[0] in _MYSQL_CONNECTION_ERRORS
+    return False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker cho một kết nối: mở sau failure_threshold lỗi kết nối liên tiếp, khi đó
+    mọi yêu cầu bị từ chối ngay; sau reset_timeout giây cho phép một yêu cầu thử (half-open),
+    thành công thì đóng lại, thất bại thì mở tiếp.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = config.SQL_BREAKER_FAILURES,
+        reset_timeout: float = config.SQL_BREAKER_RESET_TIMEOUT
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return STATE_CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return STATE_HALF_OPEN
+        return STATE_OPEN
+
+    @property
+    def retry_after(self) -> float:
+        """Số giây còn lại trước khi cho phép thử lại (0 nếu không mở)."""
+        if self._opened_at is None:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def available(self) -> bool:
+        """Có thể gửi yêu cầu qua kết nối này không (không thay đổi trạng thái)."""
+        state = self.state
+        return state == STATE_CLOSED or (state == STATE_HALF_OPEN and not self._trial_running)
+
+    def acquire(self) -> bool:
+        """Xin phép gửi một yêu cầu; ở trạng thái half-open chỉ một yêu cầu thử được đi qua."""
+        with self._lock:
+            state = self.state
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class Endpoint:
+    """Một kết nối của nguồn dữ liệu (primary hoặc replica) kèm trạng thái sức khỏe."""
+
+    def __init__(self, name: str, engine: Engine, owns_engine: bool = True):
+        self.name = name
+        self.engine = engine
+        self.owns_engine = owns_engine
+        self.breaker = CircuitBreaker()
+        self.healthy: Optional[bool] = None  # None = chưa kiểm tra
+        self.checked_at: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Không trả về chuỗi kết nối vì có thể chứa mật khẩu
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "circuit": self.breaker.state,
+            "latency_ms": self.latency_ms,
+            "checked_at": self.checked_at,
+            "last_error": self.last_error,
+        }
+
+
+class EndpointRouter:
+    """
+    Định tuyến truy vấn chỉ đọc của một nguồn dữ liệu: xoay vòng giữa các replica khỏe mạnh,
+    dùng primary khi không còn replica nào, từ chối ngay (CircuitOpenError) khi mọi kết nối
+    đều đang bị ngắt. Lỗi kết nối làm chuyển sang kết nối tiếp theo.
+
+    Tham số:
+        primary_engine: Engine của chuỗi kết nối chính (sql_connect).
+        replica_uris: Chuỗi kết nối của các replica chỉ đọc (mục "replicas" của nguồn).
+        engine_args: Tham số pool cho engine của replica.
+        label: Tên nguồn, dùng trong thông báo lỗi.
+    """
+
+    def __init__(
+        self,
+        primary_engine: Engine,
+        replica_uris: Optional[List[str]] = None,
+        engine_args: Optional[Dict[str, Any]] = None,
+        label: str = "data source"
+    ):
+        self.label = label
+        self.primary = Endpoint("primary", primary_engine, owns_engine=False)
+        self.replicas = [
+            Endpoint(f"replica-{index + 1}", create_engine(uri, **(engine_args or {})))
+            for index, uri in enumerate(replica_uris or [])
+        ]
+        self._round_robin = itertools.count()
+
+    @staticmethod
+    def _error_message(error: BaseException) -> str:
+        # Lỗi gốc của driver, không kèm câu SQL và đường dẫn tài liệu của SQLAlchemy
+        return str(error.orig if isinstance(error, DBAPIError) else error)
+
+    @property
+    def endpoints(self) -> List[Endpoint]:
+        return [*self.replicas, self.primary]
+
+    def _candidates(self) -> List[Endpoint]:
+        """Thứ tự thử: các replica (xoay vòng, bỏ qua replica không khỏe), sau đó primary."""
+        replicas = [endpoint for endpoint in self.replicas if endpoint.healthy is not False]
+        if replicas:
+            start = next(self._round_robin) % len(replicas)
+            replicas = replicas[start:] + replicas[:start]
+        return [*replicas, self.primary]
+
+    def ensure_available(self, endpoints: Optional[List[Endpoint]] = None):
+        """
+        Raises:
+            CircuitOpenError: Nếu mọi kết nối của nguồn (hoặc mọi kết nối trong endpoints) đang bị ngắt
+        """
+        endpoints = endpoints or self.endpoints
+        if not any(endpoint.breaker.available() for endpoint in endpoints):
+            retry_after = min(endpoint.breaker.retry_after for endpoint in endpoints)
+            raise CircuitOpenError(
+                f"{self.label} is currently unavailable, please try again in {retry_after:.0f} seconds"
+            )
+
+    def run(self, operation: Callable[[Engine], T], primary_only: bool = False) -> T:
+        """
+        Chạy operation(engine) trên kết nối được chọn, chuyển sang kết nối tiếp theo nếu gặp lỗi kết nối.
+        Với primary_only, chỉ chạy trên primary (ví dụ đọc schema) nhưng vẫn qua circuit breaker
+        của primary, nên khi primary đang bị ngắt sẽ báo lỗi ngay thay vì chờ hết thời gian kết nối.
+
+        Raises:
+            CircuitOpenError: Nếu không còn kết nối nào dùng được
+        """
+        candidates = [self.primary] if primary_only else self._candidates()
+        last_error: Optional[BaseException] = None
+        for endpoint in candidates:
+            if not endpoint.breaker.acquire():
+                continue
+            try:
+                result = operation(endpoint.engine)
+            except Exception as e:
+                if not is_connection_error(e):
+                    # Lỗi của câu truy vấn, kết nối vẫn hoạt động bình thường
+                    endpoint.breaker.record_success()
+                    raise
+                endpoint.breaker.record_failure()
+                endpoint.healthy = False
+                endpoint.last_error = self._error_message(e)
+                logger.warning(f"Lỗi kết nối tới {self.label} ({endpoint.name}): {endpoint.last_error}")
+                last_error = e
+                continue
+            endpoint.breaker.record_success()
+            return result
+
+        if last_error is not None:
+            raise CircuitOpenError(
+                f"{self.label} is currently unavailable: {self._error_message(last_error)}"
+            ) from last_error
+        self.ensure_available(candidates)
+        raise CircuitOpenError(f"{self.label} is currently unavailable")
+
+    def health_check(self):
+        """Kiểm tra từng kết nối bằng SELECT 1 và cập nhật trạng thái sức khỏe, circuit breaker."""
+        for endpoint in self.endpoints:
+            started = time.perf_counter()
+            try:
+                with endpoint.engine.connect() as connection:
+                    connection.exec_driver_sql("SELECT 1")
+            except Exception as e:
+                endpoint.healthy = False
+                endpoint.last_error = self._error_message(e)
+                endpoint.breaker.record_failure()
+            else:
+                endpoint.healthy = True
+                endpoint.last_error = None
+                endpoint.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+                endpoint.breaker.record_success()
+            endpoint.checked_at = time.time()
+
+    def health(self) -> Dict[str, Any]:
+        endpoints = [endpoint.to_dict() for endpoint in self.endpoints]
+        return {
+            "available": any(endpoint.breaker.available() for endpoint in self.endpoints),
+            "endpoints": endpoints,
+        }
+
+    def dispose(self):
+        for endpoint in self.replicas:
+            if endpoint.owns_engine:
+                endpoint.engine.dispose()
@@ -0,0 +1,163 @@
+import os
+import re
+import sqlite3
+import logging
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .config import ChatAgentConfig as config
+
+# Cấu hình logging
+logger = logging.getLogger(__name__)
+
+# Loại file được nạp thành bảng SQLite thay vì nhúng từng dòng
+TABULAR_FILE_TYPES = {"csv", "excel"}
+
+# Tăng khi cách nạp bảng thay đổi để các file SQLite đã lưu được tạo lại
+TABLE_STORE_VERSION = "1"
+
+# Tên bảng cho file CSV (chỉ có một bảng)
+CSV_TABLE_NAME = "data"
+
+
+def table_db_path(content_hash: str) -> str:
+    """Đường dẫn file SQLite chứa các bảng của file, theo hash nội dung và phiên bản."""
+    return os.path.join(
+        config.TABULAR_DB_DIR,
+        content_hash[:2],
+        f"{content_hash}.v{TABLE_STORE_VERSION}.sqlite"
+    )
+
+
+def table_db_uri(db_path: str) -> str:
+    """URI SQLAlchemy chỉ đọc cho file SQLite, để truy vấn do LLM sinh ra không thể sửa dữ liệu."""
+    return f"sqlite:///file:{os.path.abspath(db_path)}?mode=ro&uri=true"
+
+
+def _table_name(name: str, used: Set[str]) -> str:
+    """Chuyển tên sheet thành tên bảng ASCII dạng snake_case, không trùng lặp."""
+    name = name.replace("đ", "d").replace("Đ", "D")
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    name = re.sub(r"\W+", "_", name).strip("_").lower() or "sheet"
+    if name[0].isdigit():
+        name = f"t_{name}"
+    candidate, suffix = name, 2
+    while candidate in used:
+        candidate, suffix = f"{name}_{suffix}", suffix + 1
+    used.add(candidate)
+    return candidate
+
+
+def _column_names(header: Tuple[Any, ...]) -> List[str]:
+    """Chuẩn hóa dòng tiêu đề: ô trống thành column_N, tên trùng được thêm hậu tố."""
+    names, seen = [], set()
+    for index, cell in enumerate(header):
+        name = str(cell).strip() if cell is not None and str(cell).strip() else f"column_{index + 1}"
+        candidate, suffix = name, 2
+        while candidate.lower() in seen:
+            candidate, suffix = f"{name}_{suffix}", suffix + 1
+        seen.add(candidate.lower())
+        names.append(candidate)
+    return names
+
+
+def _iter_excel_frames_streaming(file_path: str) -> Iterator[Tuple[str, Any]]:
+    """Đọc file .xlsx bằng openpyxl ở chế độ read-only, trả về từng lô dòng dưới dạng DataFrame."""
+    import openpyxl
+    import pandas as pd
+
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                continue
+            columns = _column_names(header)
+            batch = []
+            for row in rows:
+                # Bỏ qua dòng trống ở cuối sheet
+                if all(cell is None for cell in row):
+                    continue
+                batch.append(row[:len(columns)] + (None,) * (len(columns) - len(row)))
+                if len(batch) >= config.TABULAR_READ_BATCH_ROWS:
+                    yield sheet.title, pd.DataFrame(batch, columns=columns)
+                    batch = []
+            if batch:
+                yield sheet.title, pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def _iter_frames(file_path: str, file_type: str, csv_args: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Any]]:
+    """Trả về lần lượt (tên sheet, DataFrame) theo từng lô dòng để bộ nhớ không phụ thuộc kích thước file."""
+    import pandas as pd
+
+    if file_type == "csv":
+        csv_args = {"delimiter": ",", "quotechar": '"', **(csv_args or {})}
+        reader = pd.read_csv(
+            file_path,
+            sep=csv_args["delimiter"],
+            quotechar=csv_args["quotechar"],
+            encoding_errors="replace",
+            chunksize=config.TABULAR_READ_BATCH_ROWS,
+        )
+        for batch in reader:
+            batch.columns = _column_names(tuple(batch.columns))
+            yield CSV_TABLE_NAME, batch
+        return
+
+    if file_path.lower().endswith(".xlsx"):
+        yield from _iter_excel_frames_streaming(file_path)
+        return
+
+    # File .xls cũ: openpyxl không đọc được, đọc toàn bộ bằng pandas
+    for sheet_name, df in pd.read_excel(file_path, sheet_name=None).items():
+        if not df.empty:
+            df.columns = _column_names(tuple(df.columns))
+            yield sheet_name, df
+
+
+def load_tabular_to_sqlite(
+    file_path: str,
+    db_path: str,
+    file_type: str,
+    csv_args: Optional[Dict[str, Any]] = None
+) -> Dict[str, int]:
+    """
+    Nạp file CSV/Excel vào một file SQLite, mỗi sheet là một bảng.
+    Chạy trong tiến trình con của parser_pool.
+
+    Tham số:
+        file_path: Đường dẫn file CSV/Excel.
+        db_path: Đường dẫn file SQLite cần tạo.
+        file_type: "csv" hoặc "excel".
+        csv_args: Tham số đọc CSV (delimiter, quotechar).
+
+    Trả về:
+        Số dòng của từng bảng theo tên bảng.
+    """
+    tables: Dict[str, int] = {}
+    table_names: Dict[str, str] = {}
+    connection = sqlite3.connect(db_path)
+    try:
+        for sheet_name, df in _iter_frames(file_path, file_type, csv_args):
+            if sheet_name not in table_names:
+                table_names[sheet_name] = _table_name(sheet_name, set(table_names.values()))
+            table = table_names[sheet_name]
+            df.to_sql(table, connection, if_exists="append", index=False)
+            tables[table] = tables.get(table, 0) + len(df)
+        connection.commit()
+    finally:
+        connection.close()
+    return tables
+
+
+def read_table_counts(db_path: str) -> Dict[str, int]:
+    """Đọc số dòng của từng bảng trong một file SQLite đã nạp trước đó."""
+    connection = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        names = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        return {name: connection.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0] for name in names}
+    finally:
+        connection.close()
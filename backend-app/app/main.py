@@ -1,9 +1,16 @@
-from fastapi import FastAPI
+from datetime import datetime
+from fastapi import Depends, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import user, chat, message, auth, file
 from . import database
 from .middleware import AuthMiddleware
 from .core.config import ChatAgentConfig
+from .core.ingestion import ingestion_queue
+from .core.parser_pool import parser_pool
+from .core.sql_agent import sql_assistants
+from .core.prompt_registry import prompt_registry
+from .utils.auth import get_admin_user
+from .models.user import UserResponse as User
 
 app = FastAPI(title="Chat API", description="FastAPI Chat Application with Prisma")
 
@@ -22,9 +29,15 @@ app.add_middleware(AuthMiddleware)
 @app.on_event("startup")
 async def startup():
     await database.connect()
+    prompt_registry.load()
+    await ingestion_queue.start()
+    await sql_assistants.start()
 
 @app.on_event("shutdown")
 async def shutdown():
+    await ingestion_queue.stop()
+    parser_pool.shutdown()
+    await sql_assistants.stop()
     await database.disconnect()
 
 # Include routers
@@ -41,4 +54,31 @@ async def root():
 
 @app.get('/api/options')
 async def get_options():
-    return ChatAgentConfig.dataApiFetching
\ No newline at end of file
+    # Kèm trạng thái kết nối (primary/replica, circuit breaker) của mỗi nguồn; không trả về chuỗi kết nối replica
+    return [
+        {
+            **{key: value for key, value in item.items() if key != "replicas"},
+            "health": sql_assistants.health(item.get("value")),
+        }
+        for item in ChatAgentConfig.dataApiFetching
+    ]
+
+@app.post('/api/options/{value}/schema/refresh')
+async def refresh_options_schema(value: str, current_user: User = Depends(get_admin_user)):
+    """
+    Làm mới schema đã cache của một nguồn dữ liệu SQL (ví dụ sau khi thêm bảng hoặc cột).
+    Chỉ quản trị viên được gọi; nguồn không tồn tại hoặc không hoạt động trả về 404 mà không kết nối.
+    """
+    source = next((item for item in ChatAgentConfig.dataApiFetching if item.get("value") == value), None)
+    if not source or not source.get("active") or "://" not in source.get("sql_connect", ""):
+        raise HTTPException(status_code=404, detail=f"Data source {value} not found")
+    try:
+        assistant = await sql_assistants.refresh_schema(value)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Could not read schema for {value}: {str(e)}")
+    if assistant is None:
+        raise HTTPException(status_code=404, detail=f"Data source {value} not found")
+    return {
+        "value": value,
+        "refreshed_at": datetime.fromtimestamp(assistant.schema_refreshed_at).isoformat(),
+    }
@@ -13,6 +13,9 @@ class FileCreate(FileBase):
 
 class FileResponse(FileBase):
     id: str
+    status: Optional[str] = None
+    progress: Optional[int] = None
+    error: Optional[str] = None
     createdAt: datetime
     updatedAt: datetime
     
@@ -32,3 +35,12 @@ class FileResponse(FileBase):
 
     class Config:
         from_attributes = True
+
+class JobStatusResponse(BaseModel):
+    """Trạng thái xử lý nền của một file đã tải lên."""
+    job_id: str
+    file_id: str
+    filename: str
+    status: str
+    progress: int
+    error: Optional[str] = None
@@ -22,7 +22,13 @@ class MessageResponse(MessageBase):
 
 class SqlChatRequest(BaseModel):
     content: str
-    value_db_connect: str
+    value_db_connect: Optional[str] = None
+    value_db_connects: Optional[List[str]] = None  # Nhiều nguồn: truy vấn song song và gộp thành một câu trả lời
+
+    @property
+    def sources(self) -> List[str]:
+        """Các nguồn được chọn (value_db_connects, hoặc value_db_connect nếu chỉ có một nguồn)."""
+        return list(dict.fromkeys(self.value_db_connects or ([self.value_db_connect] if self.value_db_connect else [])))
 
 class MessageUpdate(BaseModel):
     role: Optional[str] = None
@@ -5,6 +5,7 @@ from prisma.models import Chat, User
 from ..database import prisma
 from ..utils.auth import get_current_user
 from ..core.agents import generate_chat_response, generate_chat_title
+from ..core.result_frames import result_frames
 
 router = APIRouter()
 
@@ -168,6 +169,9 @@ async def delete_chat(chat_id: str, current_user: User = Depends(get_current_use
         
         # Then delete the chat itself
         deleted_chat = await prisma.chat.delete(where={"id": chat_id})
+        
+        # Bỏ kết quả truy vấn gần nhất đã lưu cho câu hỏi nối tiếp của cuộc trò chuyện
+        await result_frames.discard(chat_id)
         return deleted_chat
     except Exception as e:
         # Log the error and return a more helpful error message
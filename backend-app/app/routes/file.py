@@ -1,15 +1,21 @@
 import os
+import uuid
 import shutil
 import json
+import asyncio
+import hashlib
 import logging
+import zipfile
 from datetime import datetime
 from fastapi import APIRouter, File, UploadFile, HTTPException, Depends, Query, Path
-from ..models.file import FileResponse
+from fastapi.responses import StreamingResponse
+from ..models.file import FileResponse, JobStatusResponse
 from ..database import prisma
 from ..utils.auth import get_current_user
 from ..models.user import UserResponse as User
-from ..core.document_loader import load_document_to_text
-from typing import List, Optional
+from ..core.config import ChatAgentConfig as config
+from ..core.ingestion import ingestion_queue, IngestionJob, job_status, extracted_text_path, page_count_path, STATUS_PENDING, STATUS_READY, TERMINAL_STATUSES
+from typing import List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +25,16 @@ router = APIRouter()
 UPLOAD_DIR = "public/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Lưu trữ theo nội dung: public/uploads/objects/<2 ký tự đầu của hash>/<hash><ext>
+OBJECT_DIR = os.path.join(UPLOAD_DIR, "objects")
+TMP_UPLOAD_DIR = os.path.join(UPLOAD_DIR, "tmp")
+
+# Kích thước mỗi lần đọc/ghi khi lưu file tải lên
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Khoảng thời gian gửi keep-alive cho luồng SSE
+SSE_KEEPALIVE_SECONDS = 15
+
 # Supported file types
 SUPPORTED_FILE_TYPES = {
     '.pdf': 'pdf',
@@ -31,6 +47,9 @@ SUPPORTED_FILE_TYPES = {
     '.doc': 'docx'
 }
 
+# File nén: các file được hỗ trợ bên trong được giải nén dần và xử lý như file tải lên
+ARCHIVE_EXTENSIONS = {'.zip'}
+
 def validate_file_type(file: UploadFile) -> bool:
     """
     Kiểm tra xem file có phải là loại được hỗ trợ không (PDF hoặc CSV).
@@ -42,7 +61,53 @@ def validate_file_type(file: UploadFile) -> bool:
         True nếu file là PDF hoặc CSV, False nếu không phải
     """
     _, file_extension = os.path.splitext(file.filename.lower())
-    return file_extension in SUPPORTED_FILE_TYPES
+    return file_extension in SUPPORTED_FILE_TYPES or file_extension in ARCHIVE_EXTENSIONS
+
+class UploadTooLargeError(Exception):
+    """File tải lên vượt quá MAX_UPLOAD_SIZE_MB."""
+
+
+async def save_upload(file: UploadFile, file_extension: str) -> Tuple[str, int, str]:
+    """
+    Ghi file tải lên theo từng khối, đồng thời tính SHA-256 và kiểm tra giới hạn kích thước.
+    File được lưu theo địa chỉ nội dung nên các bản tải lên giống nhau dùng chung một file.
+
+    Parameters:
+        file: File tải lên
+        file_extension: Phần mở rộng (giữ lại để loader nhận diện định dạng)
+
+    Returns:
+        (đường dẫn file, kích thước byte, SHA-256 dạng hex)
+
+    Raises:
+        UploadTooLargeError: Nếu file vượt quá giới hạn kích thước
+    """
+    max_size = config.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    os.makedirs(TMP_UPLOAD_DIR, exist_ok=True)
+    tmp_path = os.path.join(TMP_UPLOAD_DIR, uuid.uuid4().hex)
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(
+                        f"{file.filename} exceeds the {config.MAX_UPLOAD_SIZE_MB} MB upload limit"
+                    )
+                sha256.update(chunk)
+                await asyncio.to_thread(buffer.write, chunk)
+
+        content_hash = sha256.hexdigest()
+        object_dir = os.path.join(OBJECT_DIR, content_hash[:2])
+        os.makedirs(object_dir, exist_ok=True)
+        file_path = os.path.join(object_dir, f"{content_hash}{file_extension}")
+        if not os.path.exists(file_path):
+            os.replace(tmp_path, file_path)
+        return file_path, size, content_hash
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 def get_file_size(file_path: str) -> int:
     """
@@ -56,27 +121,206 @@ def get_file_size(file_path: str) -> int:
     """
     return os.path.getsize(file_path)
 
-@router.post("/upload", response_model=List[FileResponse])
+class ArchiveBudget:
+    """
+    Số byte còn được giải nén từ một file nén, dùng chung cho mọi file bên trong. Được tính
+    theo số byte đọc thực tế vì kích thước khai báo trong file nén có thể sai (zip bomb).
+    """
+
+    def __init__(self, archive_name: str, max_bytes: int):
+        self.archive_name = archive_name
+        self.max_bytes = max_bytes
+        self.remaining = max_bytes
+
+    def consume(self, size: int):
+        self.remaining -= size
+        if self.remaining < 0:
+            raise UploadTooLargeError(
+                f"{self.archive_name} expands to more than {self.max_bytes // (1024 * 1024)} MB"
+            )
+
+class ArchiveMember:
+    """
+    Một file bên trong file nén, đọc dần theo từng khối (cùng giao diện filename/read như UploadFile)
+    nên không cần giải nén toàn bộ file nén ra đĩa.
+    """
+
+    def __init__(self, archive: zipfile.ZipFile, info: zipfile.ZipInfo, budget: ArchiveBudget):
+        self.archive = archive
+        self.info = info
+        self.budget = budget
+        self.filename = os.path.basename(info.filename)
+        self._member = None
+
+    async def read(self, size: int = -1) -> bytes:
+        if self._member is None:
+            self._member = await asyncio.to_thread(self.archive.open, self.info)
+        chunk = await asyncio.to_thread(self._member.read, size)
+        self.budget.consume(len(chunk))
+        return chunk
+
+    def close(self):
+        if self._member is not None:
+            self._member.close()
+            self._member = None
+
+def list_archive_members(archive: zipfile.ZipFile, archive_name: str) -> List[zipfile.ZipInfo]:
+    """
+    Chọn các file được hỗ trợ trong file nén, bỏ qua thư mục, file ẩn/hệ thống (__MACOSX, ._*),
+    file được mã hóa và file nén lồng nhau.
+
+    Raises:
+        UploadTooLargeError: Nếu file nén có quá nhiều mục hoặc tổng dung lượng giải nén khai báo
+                             quá lớn (dung lượng thực tế được kiểm tra khi đọc, xem ArchiveBudget)
+    """
+    entries = archive.infolist()
+    # Giới hạn theo mọi mục trong file nén, kể cả các mục bị bỏ qua
+    if len(entries) > config.ZIP_MAX_MEMBERS:
+        raise UploadTooLargeError(
+            f"{archive_name} contains {len(entries)} entries, the limit is {config.ZIP_MAX_MEMBERS}"
+        )
+    members = []
+    for info in entries:
+        name = os.path.basename(info.filename)
+        if info.is_dir() or not name or name.startswith(".") or "__MACOSX/" in info.filename:
+            continue
+        if info.flag_bits & 0x1:
+            logger.warning(f"Skipping encrypted file {info.filename} in {archive_name}")
+            continue
+        _, file_extension = os.path.splitext(name.lower())
+        if file_extension not in SUPPORTED_FILE_TYPES:
+            logger.warning(f"Skipping unsupported file {info.filename} in {archive_name}")
+            continue
+        members.append(info)
+    
+    if sum(info.file_size for info in members) > config.ZIP_MAX_TOTAL_MB * 1024 * 1024:
+        raise UploadTooLargeError(
+            f"{archive_name} expands to more than {config.ZIP_MAX_TOTAL_MB} MB"
+        )
+    return members
+
+def open_archive(file_obj, archive_name: str) -> Tuple[zipfile.ZipFile, List[zipfile.ZipInfo]]:
+    """Mở file nén và chọn các file cần xử lý (đọc danh mục của file nén, chạy trong thread)."""
+    archive = zipfile.ZipFile(file_obj)
+    try:
+        return archive, list_archive_members(archive, archive_name)
+    except Exception:
+        archive.close()
+        raise
+
+async def store_and_enqueue(file: UploadFile, current_user: User, extra_metadata: Optional[dict] = None):
+    """
+    Lưu một file tải lên, tạo bản ghi File và đưa vào hàng đợi xử lý.
+    Lỗi của file nào chỉ ảnh hưởng đến file đó.
+
+    Parameters:
+        file: File tải lên (hoặc ArchiveMember)
+        current_user: Người tải lên
+        extra_metadata: Metadata bổ sung cho job (ví dụ tên file nén chứa file)
+
+    Returns:
+        (bản ghi File hoặc None nếu thất bại, file có vượt quá giới hạn kích thước hay không)
+    """
+    file_path = None
+    try:
+        # Get file extension
+        _, file_extension = os.path.splitext(file.filename.lower())
+        file_type = SUPPORTED_FILE_TYPES[file_extension]
+        
+        # Stream file to content-addressed storage while hashing
+        file_path, file_size, content_hash = await save_upload(file, file_extension)
+        
+        # Nội dung đã được xử lý trước đó: dùng lại collection đã nhúng, không xử lý lại
+        existing = await prisma.file.find_first(
+            where={"contentHash": content_hash, "status": STATUS_READY}
+        )
+        if existing:
+            db_file = await prisma.file.create(
+                data={
+                    "filename": file.filename,
+                    "filepath": file_path,
+                    "filetype": file_type,
+                    "size": file_size,
+                    "metadata": existing.metadata or "{}",
+                    "userId": current_user.id,
+                    "contentHash": content_hash,
+                    "status": STATUS_READY,
+                    "progress": 100,
+                }
+            )
+            logger.info(f"Linked {file.filename} to already ingested file {existing.id}")
+            return db_file, False
+        
+        # Save file metadata to database, the row doubles as the ingestion job
+        db_file = await prisma.file.create(
+            data={
+                "filename": file.filename,
+                "filepath": file_path,
+                "filetype": file_type,  # Store file type
+                "size": file_size,      # Add file size in bytes
+                "metadata": "{}",       # Initialize empty metadata as JSON string
+                "userId": current_user.id,
+                "contentHash": content_hash,
+                "status": STATUS_PENDING,
+                "progress": 0,
+            }
+        )
+        
+        # Đưa vào hàng đợi để trích xuất và nhúng nền
+        await ingestion_queue.enqueue(IngestionJob(
+            file_id=db_file.id,
+            file_path=file_path,
+            file_type=file_type,
+            metadata={
+                "filename": file.filename,
+                "filetype": file_type,
+                "size": file_size,
+                "uploaded_by": current_user.id,
+                "upload_date": datetime.now().isoformat(),
+                **(extra_metadata or {}),
+            },
+            content_hash=content_hash,
+        ))
+        
+        return db_file, False
+        
+    except UploadTooLargeError as e:
+        logger.warning(str(e))
+        return None, True
+    except Exception as e:
+        logger.error(f"Error processing file {file.filename}: {str(e)}")
+        # Xóa file đã lưu nếu xử lý thất bại và không có bản ghi nào khác dùng chung
+        if file_path and os.path.exists(file_path):
+            try:
+                if not await prisma.file.count(where={"filepath": file_path}):
+                    os.remove(file_path)
+            except Exception as cleanup_error:
+                logger.error(f"Error cleaning up file {file_path}: {str(cleanup_error)}")
+        return None, False
+
+@router.post("/upload", response_model=List[FileResponse], status_code=202)
 async def upload_file(
     files: List[UploadFile] = File(...),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Tải lên một hoặc nhiều tệp (PDF, CSV, Excel, PowerPoint, Word), lưu cục bộ, trích xuất văn bản và lưu trữ trong cơ sở dữ liệu.
-    Sau đó nhúng nội dung văn bản vào ChromaDB để hỗ trợ trò chuyện với tài liệu.
+    Tải lên một hoặc nhiều tệp (PDF, CSV, Excel, PowerPoint, Word) và lưu cục bộ.
+    File .zip được giải nén dần, mỗi file được hỗ trợ bên trong trở thành một file riêng.
+    Việc trích xuất văn bản và nhúng vào ChromaDB được thực hiện nền bởi hàng đợi xử lý,
+    API trả về ngay (202) với danh sách file, mỗi file là một job (job id = file id).
+    Theo dõi tiến độ qua GET /api/files/jobs/{id} hoặc luồng SSE /api/files/jobs/{id}/events.
 
     Tham số:
     files: Danh sách các tệp để tải lên (hỗ trợ PDF, CSV, Excel, PowerPoint, Word)
-    messageId: id của tin nhắn tệp này thuộc về (tùy chọn)
     current_user: người dùng được xác thực hiện tại
 
     Trả lại:
-    Danh sách các đối tượng tệp với siêu dữ liệu và văn bản trích xuất
+    Danh sách các đối tượng tệp với trạng thái xử lý (pending)
 
     Tăng:
-    400: Nếu không có tệp hợp lệ nào được tải lên hoặc tệp không phải PDF/CSV
-    404: Nếu không tìm thấy trò chuyện
-    403: Nếu người dùng không sở hữu cuộc trò chuyện
+    400: Nếu không có tệp hợp lệ nào được tải lên
+    413: Nếu mọi tệp đều vượt quá giới hạn kích thước
+    500: Nếu không lưu được tệp nào
     """
     # Validate file types first
     valid_files = []
@@ -90,99 +334,59 @@ async def upload_file(
     if not valid_files:
         raise HTTPException(
             status_code=400, 
-            detail=f"No valid files were uploaded. Only {', '.join(SUPPORTED_FILE_TYPES.keys())} files are supported."
+            detail=f"No valid files were uploaded. Only {', '.join([*SUPPORTED_FILE_TYPES, *ARCHIVE_EXTENSIONS])} files are supported."
         )
     
 
-    # Create user-specific directory
-    user_upload_dir = os.path.join(UPLOAD_DIR, current_user.id)
-    os.makedirs(user_upload_dir, exist_ok=True)
-    
-    uploaded_files = []
-    
-    for file in valid_files:
-        file_path = None
-        try:
-            # Get file extension
-            _, file_extension = os.path.splitext(file.filename.lower())
-            file_type = SUPPORTED_FILE_TYPES[file_extension]
-            
-            # Save file to disk
-            file_path = os.path.join(user_upload_dir, file.filename)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            # Get file size in bytes
-            file_size = get_file_size(file_path)
-            
-            # Extract text from file based on its type
-            text_content = []
-            
-            # Xử lý đặc biệt cho CSV với tham số tùy chỉnh
-            if file_extension == '.csv':
-                # Default CSV arguments - can be customized if needed
-                csv_args = {"delimiter": ",", "quotechar": '"'}
-                text_content = load_document_to_text(file_path, file_type=file_type, csv_args=csv_args)
-            else:
-                # Xử lý các loại file khác
-                text_content = load_document_to_text(file_path, file_type=file_type)
-                
-            # Join all content into a single text
-            full_text = "\n\n".join(text_content) if text_content else ""
-            
-            # Save file metadata and content to database
-            db_file = await prisma.file.create(
-                data={
-                    "filename": file.filename,
-                    "filepath": file_path,
-                    "filetype": file_type,  # Store file type
-                    "size": file_size,      # Add file size in bytes
-                    "metadata": "{}"        # Initialize empty metadata as JSON string
-                }
-            )
-        
-            # Embed and store document in ChromaDB for future conversations
+    # Lưu, băm và đăng ký các file song song (giới hạn số file đồng thời); việc trích xuất
+    # và nhúng do các worker của hàng đợi đảm nhận nên các file được xử lý gối đầu nhau
+    semaphore = asyncio.Semaphore(max(1, config.UPLOAD_CONCURRENCY))
+
+    async def process_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo, budget: ArchiveBudget):
+        async with semaphore:
+            member = ArchiveMember(archive, info, budget)
             try:
-                # Thêm metadata cho tài liệu
-                metadata = {
-                    "filename": file.filename,
-                    "filetype": file_type,
-                    "size": file_size,
-                    "uploaded_by": current_user.id,
-                    "upload_date": datetime.now().isoformat(),
-                }
-                
-                # Gọi hàm embed_and_store_document từ agents.py để nhúng và lưu trữ tài liệu
-                from app.core.agents import embed_and_store_document
-                collection_id = await embed_and_store_document(
-                    text=full_text,
-                    source_file_id=db_file.id,
-                    metadata=metadata
+                db_file, is_too_large = await store_and_enqueue(
+                    member, current_user, {"archive": budget.archive_name, "archive_path": info.filename}
                 )
-                
-                # Cập nhật thông tin file trong database với collection_id
-                metadata_json = json.dumps({"collection_id": collection_id})
-                db_file = await prisma.file.update(
-                    where={"id": db_file.id},
-                    data={"metadata": metadata_json}
-                )
-                
-                logger.info(f"Successfully embedded file {file.filename} with collection ID: {collection_id}")
-            except Exception as e:
-                # Log lỗi nhưng không làm gián đoạn quá trình tải lên
-                logger.error(f"Error embedding file {file.filename}: {str(e)}")
-                # Vẫn trả về file đã tải lên thành công, nhưng không có khả năng trò chuyện
-            
-            uploaded_files.append(db_file)
-            
-        except Exception as e:
-            logger.error(f"Error processing file {file.filename}: {str(e)}")
-            # Xóa file đã lưu nếu xử lý thất bại
-            if file_path and os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except Exception as cleanup_error:
-                    logger.error(f"Error cleaning up file {file_path}: {str(cleanup_error)}")
+            finally:
+                member.close()
+            return member.filename, db_file, is_too_large
+
+    async def process_upload(file: UploadFile):
+        _, file_extension = os.path.splitext(file.filename.lower())
+        if file_extension not in ARCHIVE_EXTENSIONS:
+            async with semaphore:
+                return [(file.filename, *await store_and_enqueue(file, current_user))]
+
+        # File nén: đọc trực tiếp từ file tạm của request, giải nén dần từng file bên trong
+        try:
+            archive, members = await asyncio.to_thread(open_archive, file.file, file.filename)
+        except UploadTooLargeError as e:
+            logger.warning(str(e))
+            return [(file.filename, None, True)]
+        except zipfile.BadZipFile as e:
+            logger.error(f"Error reading archive {file.filename}: {str(e)}")
+            return [(file.filename, None, False)]
+        
+        try:
+            if not members:
+                logger.warning(f"No supported files found in archive {file.filename}")
+                return [(file.filename, None, False)]
+            budget = ArchiveBudget(file.filename, config.ZIP_MAX_TOTAL_MB * 1024 * 1024)
+            return await asyncio.gather(*(process_member(archive, info, budget) for info in members))
+        finally:
+            archive.close()
+
+    results = [result for group in await asyncio.gather(*(process_upload(file) for file in valid_files)) for result in group]
+    uploaded_files = [db_file for _, db_file, _ in results if db_file]
+    too_large = [filename for filename, _, is_too_large in results if is_too_large]
+    
+    if not uploaded_files and too_large:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Files exceed the {config.MAX_UPLOAD_SIZE_MB} MB upload limit: {', '.join(too_large)}"
+        )
     
     if not uploaded_files:
         raise HTTPException(
@@ -192,6 +396,123 @@ async def upload_file(
     
     return uploaded_files
 
+async def get_owned_file(file_id: str, current_user: User):
+    """
+    Lấy bản ghi file và kiểm tra quyền sở hữu.
+
+    Tăng:
+    404: Nếu không tìm thấy file
+    403: Nếu file thuộc về người dùng khác
+    """
+    db_file = await prisma.file.find_unique(where={"id": file_id})
+    if not db_file:
+        raise HTTPException(status_code=404, detail="File not found")
+    if db_file.userId and db_file.userId != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to access this file")
+    return db_file
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(
+    job_id: str = Path(..., description="ID của job (trùng với ID của file)"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Lấy trạng thái xử lý (trích xuất + nhúng) của một file đã tải lên.
+
+    Trả lại:
+    Trạng thái job: pending, processing, ready hoặc failed kèm tiến độ (0-100)
+    """
+    db_file = await get_owned_file(job_id, current_user)
+    return job_status(db_file)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str = Path(..., description="ID của job (trùng với ID của file)"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Luồng Server-Sent Events báo tiến độ xử lý của một file.
+    Gửi trạng thái hiện tại ngay khi kết nối, sau đó gửi mỗi lần tiến độ thay đổi
+    và đóng luồng khi job kết thúc (ready hoặc failed).
+    """
+    await get_owned_file(job_id, current_user)
+
+    async def event_stream():
+        # Đăng ký trước khi đọc trạng thái để không bỏ lỡ sự kiện
+        listener = ingestion_queue.subscribe(job_id)
+        try:
+            db_file = await prisma.file.find_unique(where={"id": job_id})
+            if not db_file:
+                return
+            event = job_status(db_file)
+            yield f"data: {json.dumps(event)}\n\n"
+            while event["status"] not in TERMINAL_STATUSES:
+                try:
+                    event = await asyncio.wait_for(listener.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            ingestion_queue.unsubscribe(job_id, listener)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/{file_id}/reindex", response_model=JobStatusResponse, status_code=202)
+async def reindex_file(
+    file_id: str = Path(..., description="ID của file cần nhúng lại"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Nhúng lại một file (ví dụ sau khi đổi mô hình embedding hoặc kích thước đoạn).
+    Văn bản đã trích xuất được lưu theo hash nội dung nên bước trích xuất được bỏ qua.
+    Collection cũ bị xóa sau khi nhúng lại thành công nếu không còn file nào dùng.
+
+    Trả lại:
+    Trạng thái job (pending)
+
+    Tăng:
+    404: Nếu không tìm thấy file
+    403: Nếu người dùng không có quyền với file
+    409: Nếu file đang được xử lý
+    """
+    db_file = await get_owned_file(file_id, current_user)
+    if db_file.status not in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail="File is already being processed")
+    
+    previous_collection_id = None
+    if db_file.metadata:
+        try:
+            previous_collection_id = json.loads(db_file.metadata).get("collection_id")
+        except json.JSONDecodeError:
+            logger.error(f"Error parsing metadata JSON for file {file_id}")
+    
+    db_file = await prisma.file.update(
+        where={"id": file_id},
+        data={"status": STATUS_PENDING, "progress": 0, "error": None}
+    )
+    
+    await ingestion_queue.enqueue(IngestionJob(
+        file_id=db_file.id,
+        file_path=db_file.filepath,
+        file_type=db_file.filetype,
+        metadata={
+            "filename": db_file.filename,
+            "filetype": db_file.filetype,
+            "size": db_file.size,
+            "uploaded_by": db_file.userId or "",
+            "upload_date": db_file.createdAt.isoformat(),
+        },
+        content_hash=db_file.contentHash,
+        previous_collection_id=previous_collection_id,
+    ))
+    
+    return job_status(db_file)
+
 @router.delete("/{file_id}", response_model=dict)
 async def delete_file(
     file_id: str = Path(..., description="ID của file cần xóa"),
@@ -229,8 +550,24 @@ async def delete_file(
         except json.JSONDecodeError:
             logger.error(f"Error parsing metadata JSON for file {file_id}")
     
+    # File tải lên trùng nội dung dùng chung file local và collection, chỉ xóa khi không còn bản ghi nào khác dùng
+    other_files = {"NOT": {"id": file_id}}
+    collection_shared = bool(collection_id) and await prisma.file.count(
+        where={**other_files, "metadata": {"contains": collection_id}}
+    ) > 0
+    filepath_shared = bool(db_file.filepath) and await prisma.file.count(
+        where={**other_files, "filepath": db_file.filepath}
+    ) > 0
+    # Văn bản đã trích xuất và file SQLite được lưu theo hash nội dung, có thể dùng chung với
+    # bản ghi khác cùng nội dung dù khác đường dẫn
+    content_shared = bool(db_file.contentHash) and await prisma.file.count(
+        where={**other_files, "contentHash": db_file.contentHash}
+    ) > 0
+    
     # Xóa vector trong ChromaDB nếu có collection_id
-    if collection_id:
+    if collection_id and collection_shared:
+        logger.info(f"ChromaDB collection {collection_id} is shared with other files, keeping it")
+    elif collection_id:
         try:
             from app.core.config import ChatAgentConfig as config
             chroma_dir = os.path.join(config.CHROMA_PERSIST_DIRECTORY, collection_id)
@@ -262,7 +599,7 @@ async def delete_file(
             logger.error(f"Error searching and deleting ChromaDB collections: {str(e)}")
     
     # Xóa file local nếu tồn tại
-    if db_file.filepath and os.path.exists(db_file.filepath):
+    if db_file.filepath and os.path.exists(db_file.filepath) and not filepath_shared:
         try:
             os.remove(db_file.filepath)
             logger.info(f"Deleted local file: {db_file.filepath}")
@@ -270,6 +607,25 @@ async def delete_file(
             logger.error(f"Error deleting local file: {str(e)}")
             # Tiếp tục xóa bản ghi trong database ngay cả khi không thể xóa file local
     
+    # Xóa văn bản đã trích xuất được lưu theo hash nội dung
+    if db_file.contentHash and not content_shared:
+        sidecar_path = extracted_text_path(db_file.contentHash)
+        for path in (sidecar_path, page_count_path(sidecar_path)):
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception as e:
+                    logger.error(f"Error deleting extracted text: {str(e)}")
+    
+    # Xóa file SQLite của tài liệu dạng bảng (cũng lưu theo hash nội dung)
+    table_db = metadata.get("table_db")
+    if table_db and not content_shared and not filepath_shared and os.path.exists(table_db):
+        try:
+            os.remove(table_db)
+            logger.info(f"Deleted table database: {table_db}")
+        except Exception as e:
+            logger.error(f"Error deleting table database: {str(e)}")
+    
     # Xóa bản ghi file trong database
     try:
         await prisma.file.delete(where={"id": file_id})
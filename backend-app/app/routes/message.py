@@ -1,12 +1,16 @@
 from fastapi import APIRouter, Body, HTTPException, Depends, BackgroundTasks, logger
+from fastapi.responses import StreamingResponse
 from typing import Optional, Dict, Any
 from pydantic import BaseModel
+import json
 
 from ..models.message import MessageCreate, MessageResponse, MessageUpdate, SqlChatRequest
 from prisma.models import User
 from ..database import prisma
 from ..utils.auth import get_current_user
-from ..core.agents import chat_with_document, generate_chat_response, format_chat_history, generate_chat_title, generate_response_from_sql
+from ..core.agents import chat_with_document, generate_chat_response, format_chat_history, generate_chat_title, generate_response_from_sql, generate_response_from_sources, generate_response_from_table, stream_response_from_sql
+from ..core.ingestion import STATUS_READY
+from ..core.config import ChatAgentConfig as config
 
 router = APIRouter()
 
@@ -102,6 +106,19 @@ async def send_message_and_get_response(
         if chat.userId != current_user.id:
             raise HTTPException(status_code=403, detail="Not authorized to add messages to this chat")
         
+        # Document chat is only allowed once the file has been extracted and embedded
+        if request.source_file_id:
+            source_file = await prisma.file.find_unique(where={"id": request.source_file_id})
+            if not source_file:
+                raise HTTPException(status_code=404, detail="File not found")
+            if source_file.status != STATUS_READY:
+                raise HTTPException(
+                    status_code=409,
+                    detail=config.ERROR_MESSAGES["document_not_ready"].format(
+                        source_file_id=request.source_file_id, status=source_file.status
+                    )
+                )
+        
         # Create the user message
         user_message = await prisma.message.create(
             data={
@@ -120,13 +137,30 @@ async def send_message_and_get_response(
         # Format chat history for the AI
         formatted_history = await format_chat_history(chat_history)
         
+        # File CSV/Excel được nạp thành bảng SQLite: trả lời bằng truy vấn SQL
+        table_db = None
+        if request.source_file_id and source_file.metadata:
+            try:
+                table_db = json.loads(source_file.metadata).get("table_db")
+            except json.JSONDecodeError:
+                # Metadata không hợp lệ: dùng chế độ chat với tài liệu thông thường
+                pass
+        
         # Generate AI response based on request type
-        if request.source_file_id:
+        if table_db:
+            # Tabular document chat mode
+            ai_response = await generate_response_from_table(
+                question=request.content,
+                table_db=table_db,
+                chat_history=formatted_history,
+                chat_id=chat_id
+            )
+        elif request.source_file_id:
             # Document chat mode
             ai_response = await chat_with_document(
                 message=request.content,
                 source_file_id=request.source_file_id,
-                metadata=request.metadata,
+                metadata=request.metadata or source_file.metadata,
                 chat_history=formatted_history
             )
         else:
@@ -155,6 +189,8 @@ async def send_message_and_get_response(
         
         return ai_message
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in unified chat endpoint: {str(e)}")
         raise HTTPException(
@@ -484,6 +520,9 @@ async def chat_with_sql(
     request: SqlChatRequest = Body(...),
     current_user: User = Depends(get_current_user)
 ):
+    if not request.sources:
+        raise HTTPException(status_code=400, detail="value_db_connect or value_db_connects is required")
+    
     try:
         chat = await prisma.chat.find_unique(where={"id": chat_id})
         if not chat:
@@ -511,11 +550,21 @@ async def chat_with_sql(
          # Format lịch sử trò chuyện
         formatted_history = await format_chat_history(chat_history)
          # Tạo phản hồi AI dựa trên dữ liệu API
-        ai_response = await generate_response_from_sql(
-            answer=request.content,
-            value_db_connect=request.value_db_connect,  # This parameter should be named db_name
-            chat_history=formatted_history
-        )
+        if len(request.sources) > 1:
+            # Nhiều nguồn: truy vấn đồng thời rồi gộp kết quả thành một câu trả lời
+            ai_response = await generate_response_from_sources(
+                question=request.content,
+                value_db_connects=request.sources,
+                chat_history=formatted_history,
+                chat_id=chat_id
+            )
+        else:
+            ai_response = await generate_response_from_sql(
+                answer=request.content,
+                value_db_connect=request.sources[0],  # This parameter should be named db_name
+                chat_history=formatted_history,
+                chat_id=chat_id
+            )
         
         # Tạo tin nhắn AI
         ai_message = await prisma.message.create(
@@ -542,3 +591,142 @@ async def chat_with_sql(
             status_code=500,
             detail=f"Failed to process SQL chat: {str(e)}"
         )
+
+
+# Thông báo hiển thị cho từng bước của SQL chat dạng stream
+SQL_STAGE_MESSAGES = {
+    "followup": "Đang kiểm tra kết quả trước đó...",
+    "fan_out": "Đang truy vấn các nguồn dữ liệu...",
+    "write_query": "Đang tạo truy vấn...",
+    "execute_query": "Đang thực thi truy vấn...",
+    "generate_answer": "Đang tạo câu trả lời...",
+}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Định dạng một sự kiện Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/{chat_id}/sql-chat/stream")
+async def chat_with_sql_stream(
+    chat_id: str,
+    request: SqlChatRequest = Body(...),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Phiên bản stream (Server-Sent Events) của sql-chat.
+    
+    Các sự kiện được gửi ngay khi từng bước diễn ra:
+        stage: bắt đầu một bước (stage, message)
+        result: truy vấn đã chạy xong (rows, truncated, ms, cached, message)
+        token: một phần câu trả lời (text)
+        error: lỗi khi xử lý câu hỏi (stage, message), nội dung này cũng được lưu làm câu trả lời
+        message: tin nhắn AI đã được lưu (như phản hồi của sql-chat), luôn là sự kiện cuối cùng
+    
+    Khi chọn nhiều nguồn (value_db_connects), các nguồn được truy vấn đồng thời và câu trả lời
+    gộp được gửi trong một sự kiện token.
+    
+    Raises:
+        400: Nếu không chọn nguồn dữ liệu nào
+        404: Nếu không tìm thấy cuộc trò chuyện
+        403: Nếu người dùng không có quyền thêm tin nhắn vào cuộc trò chuyện này
+    """
+    if not request.sources:
+        raise HTTPException(status_code=400, detail="value_db_connect or value_db_connects is required")
+    
+    chat = await prisma.chat.find_unique(where={"id": chat_id})
+    if not chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    
+    # Kiểm tra quyền truy cập
+    if chat.userId != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to add messages to this chat")
+    
+    # Tạo tin nhắn của người dùng
+    await prisma.message.create(
+        data={
+            "role": "user",
+            "content": request.content,
+            "chatId": chat_id,
+        }
+    )
+    
+    # Lấy và format lịch sử trò chuyện
+    chat_history = await prisma.message.find_many(
+        where={"chatId": chat_id},
+        order={"createdAt": "asc"}
+    )
+    formatted_history = await format_chat_history(chat_history)
+    
+    async def source_events():
+        if len(request.sources) == 1:
+            async for event in stream_response_from_sql(
+                question=request.content,
+                value_db_connect=request.sources[0],
+                chat_history=formatted_history,
+                chat_id=chat_id
+            ):
+                yield event
+            return
+        
+        yield {"event": "stage", "stage": "fan_out"}
+        answer = await generate_response_from_sources(
+            question=request.content,
+            value_db_connects=request.sources,
+            chat_history=formatted_history,
+            chat_id=chat_id
+        )
+        yield {"event": "token", "text": answer}
+        yield {"event": "done", "answer": answer}
+    
+    async def events():
+        ai_response = None
+        try:
+            async for event in source_events():
+                kind = event["event"]
+                if kind == "stage":
+                    yield _sse("stage", {"stage": event["stage"], "message": SQL_STAGE_MESSAGES.get(event["stage"], "")})
+                elif kind == "result":
+                    yield _sse("result", {
+                        "rows": event["rows"],
+                        "truncated": event["truncated"],
+                        "ms": event["ms"],
+                        "cached": event["cached"],
+                        "message": f"Đã thực thi truy vấn: {event['rows']} dòng trong {event['ms']:.0f} ms",
+                    })
+                elif kind == "token":
+                    yield _sse("token", {"text": event["text"]})
+                elif kind == "done":
+                    ai_response = event["answer"]
+                elif kind == "error":
+                    ai_response = f"Xin lỗi, tôi gặp sự cố khi truy vấn cơ sở dữ liệu: {event['error']}"
+                    yield _sse("error", {"stage": event["stage"], "message": ai_response})
+            
+            # Tạo tin nhắn AI
+            ai_message = await prisma.message.create(
+                data={
+                    "role": "assistant",
+                    "content": ai_response or "",
+                    "chatId": chat_id,
+                }
+            )
+            
+            # Nếu đây là tin nhắn đầu tiên và tiêu đề là mặc định, tạo tiêu đề mới
+            if len(chat_history) <= 2 and (chat.title == "Cuộc trò chuyện mới" or chat.title == "New chat"):
+                new_title = await generate_chat_title(request.content)
+                await prisma.chat.update(
+                    where={"id": chat_id},
+                    data={"title": new_title}
+                )
+            
+            yield _sse("message", MessageResponse.model_validate(ai_message).model_dump(mode="json"))
+        except Exception as e:
+            yield _sse("error", {"stage": "internal", "message": f"Failed to process SQL chat: {str(e)}"})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Không cache và không để proxy (nginx) gom dữ liệu trước khi gửi
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
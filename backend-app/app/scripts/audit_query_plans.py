@@ -0,0 +1,330 @@
+"""
+Kiểm tra các truy vấn Prisma thường xuyên của các route đều dùng index. Script dựng một
+cơ sở dữ liệu SQLite tạm theo prisma/schema.prisma (bảng và index giống prisma db push),
+sinh dữ liệu ở quy mô lớn rồi chạy EXPLAIN QUERY PLAN cho từng truy vấn, trước và sau ANALYZE.
+Truy vấn nào không dùng đúng index mong đợi, quét toàn bảng hoặc phải sắp xếp bằng B-tree tạm
+sẽ bị báo lỗi (mã thoát 1).
+
+Chạy:
+    python -m app.scripts.audit_query_plans
+    python -m app.scripts.audit_query_plans --users 500 --chats-per-user 40 --messages-per-chat 100
+    python -m app.scripts.audit_query_plans --database dev.db   # kiểm tra cơ sở dữ liệu thật, không sinh dữ liệu
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_SCHEMA = os.path.join(os.path.dirname(__file__), "..", "..", "prisma", "schema.prisma")
+
+# Kiểu vô hướng của Prisma -> kiểu cột Prisma tạo trên SQLite
+_SCALAR_TYPES = {
+    "String": "TEXT",
+    "Int": "INTEGER",
+    "BigInt": "BIGINT",
+    "Float": "REAL",
+    "Decimal": "DECIMAL",
+    "Boolean": "BOOLEAN",
+    "DateTime": "DATETIME",
+    "Json": "TEXT",
+    "Bytes": "BLOB",
+}
+
+_MODEL = re.compile(r"^model\s+(\w+)\s*\{(.*?)^\}", re.MULTILINE | re.DOTALL)
+_MODEL_NAME = re.compile(r"^model\s+(\w+)", re.MULTILINE)
+_FIELD = re.compile(r"^\s*(\w+)\s+(\w+)(\[\])?(\?)?(.*)$")
+_BLOCK_ATTRIBUTE = re.compile(r"^\s*@@(index|unique)\(\[([^\]]*)\]")
+
+
+@dataclass
+class HotQuery:
+    """Một truy vấn thường xuyên của route, viết lại dạng SQL mà Prisma sinh ra trên SQLite."""
+    name: str
+    route: str
+    sql: str
+    params: Tuple
+    index: Optional[str]  # Index planner phải dùng; None nếu chấp nhận quét bảng
+
+
+# Các truy vấn chạy ở mỗi request (gửi tin nhắn, sidebar, tải lên/xóa file, khởi động).
+# Không gồm prisma.user.find_many() (cố ý lấy hết) và file.count(metadata contains) (LIKE '%...%').
+# Truy vấn file dở dang chỉ chạy một lần khi khởi động nên được phép quét bảng File: index trên
+# status sẽ bị planner chọn nhầm cho truy vấn khử trùng lặp (contentHash, status) lúc tải lên.
+HOT_QUERIES = [
+    HotQuery(
+        name="message history",
+        route="POST /api/messages/chat/{chat_id}/send, GET /api/messages/chat/{chat_id}, sql-chat",
+        sql='SELECT * FROM "Message" WHERE "chatId" = ? ORDER BY "createdAt" ASC',
+        params=("chat-0",),
+        index="Message_chatId_createdAt_idx",
+    ),
+    HotQuery(
+        name="message history before a message",
+        route="POST /api/messages/chat/{chat_id}/regenerate/{message_id}",
+        sql='SELECT * FROM "Message" WHERE "chatId" = ? AND "createdAt" < ? ORDER BY "createdAt" ASC',
+        params=("chat-0", "2100-01-01 00:00:00"),
+        index="Message_chatId_createdAt_idx",
+    ),
+    HotQuery(
+        name="first user message",
+        route="POST /api/messages/chat/{chat_id}/generate-title",
+        sql='SELECT * FROM "Message" WHERE "chatId" = ? AND "role" = ? ORDER BY "createdAt" ASC LIMIT 1',
+        params=("chat-0", "user"),
+        index="Message_chatId_createdAt_idx",
+    ),
+    HotQuery(
+        name="delete chat messages",
+        route="DELETE /api/chats/{chat_id}",
+        sql='DELETE FROM "Message" WHERE "chatId" = ?',
+        params=("chat-0",),
+        index="Message_chatId_createdAt_idx",
+    ),
+    HotQuery(
+        name="chats of user",
+        route="GET /api/chats",
+        sql='SELECT * FROM "Chat" WHERE "userId" = ? ORDER BY "createdAt" DESC',
+        params=("user-0",),
+        index="Chat_userId_createdAt_idx",
+    ),
+    HotQuery(
+        name="ready file by content hash",
+        route="POST /api/files/upload",
+        sql='SELECT * FROM "File" WHERE "contentHash" = ? AND "status" = ? LIMIT 1',
+        params=("hash-0", "ready"),
+        index="File_contentHash_status_idx",
+    ),
+    HotQuery(
+        name="files sharing a path",
+        route="POST /api/files/upload, DELETE /api/files/{file_id}",
+        sql='SELECT COUNT(*) FROM "File" WHERE "filepath" = ? AND NOT "id" = ?',
+        params=("public/uploads/objects/0", "file-0"),
+        index="File_filepath_idx",
+    ),
+    HotQuery(
+        name="unfinished ingestion jobs",
+        route="startup (IngestionQueue._resume_unfinished)",
+        sql='SELECT * FROM "File" WHERE "status" IN (?, ?) AND ("leaseUntil" IS NULL OR "leaseUntil" < ?)',
+        params=("pending", "processing", "2024-01-01 00:00:00"),
+        index=None,
+    ),
+]
+
+
+def parse_schema(text: str) -> Dict[str, Dict]:
+    """
+    Đọc các model của schema.prisma: cột vô hướng (bỏ qua trường quan hệ), khóa chính,
+    trường @unique và các @@index/@@unique.
+    """
+    models = {}
+    model_names = set(_MODEL_NAME.findall(text))
+    for name, body in _MODEL.findall(text):
+        columns, indexes = [], []
+        for line in body.splitlines():
+            line = line.split("//", 1)[0].rstrip()
+            attribute = _BLOCK_ATTRIBUTE.match(line)
+            if attribute:
+                fields = [field.strip() for field in attribute.group(2).split(",") if field.strip()]
+                indexes.append((attribute.group(1) == "unique", fields))
+                continue
+            field = _FIELD.match(line)
+            if not field or field.group(2) in model_names or field.group(3):
+                continue
+            field_name, field_type, _, optional, attributes = field.groups()
+            columns.append({
+                "name": field_name,
+                "type": _SCALAR_TYPES.get(field_type, "TEXT"),
+                "nullable": bool(optional),
+                "primary": "@id" in attributes,
+            })
+            if "@unique" in attributes:
+                indexes.append((True, [field_name]))
+        models[name] = {"columns": columns, "indexes": indexes}
+    return models
+
+
+def schema_ddl(models: Dict[str, Dict]) -> List[str]:
+    """Câu lệnh CREATE TABLE/INDEX giống prisma db push (tên index dạng Model_a_b_idx / Model_a_key)."""
+    statements = []
+    for name, model in models.items():
+        columns = ",\n".join(
+            f'    "{column["name"]}" {column["type"]}'
+            f'{" NOT NULL" if not column["nullable"] else ""}'
+            f'{" PRIMARY KEY" if column["primary"] else ""}'
+            for column in model["columns"]
+        )
+        statements.append(f'CREATE TABLE "{name}" (\n{columns}\n)')
+        for unique, fields in model["indexes"]:
+            index_name = f'{name}_{"_".join(fields)}_{"key" if unique else "idx"}'
+            quoted = ", ".join(f'"{field}"' for field in fields)
+            statements.append(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX "{index_name}" ON "{name}"({quoted})'
+            )
+    return statements
+
+
+def seed(connection: sqlite3.Connection, users: int, chats_per_user: int, messages_per_chat: int, files: int):
+    """Sinh dữ liệu: users người dùng, mỗi người chats_per_user cuộc trò chuyện, mỗi cuộc messages_per_chat tin nhắn."""
+    started = datetime(2024, 1, 1)
+
+    def timestamp(offset: int) -> str:
+        return (started + timedelta(seconds=offset)).strftime("%Y-%m-%d %H:%M:%S")
+
+    connection.executemany(
+        'INSERT INTO "User" ("id", "username", "email", "password", "createdAt", "updatedAt") '
+        "VALUES (?, ?, ?, '', ?, ?)",
+        ((f"user-{u}", f"user{u}", f"user{u}@example.com", timestamp(u), timestamp(u)) for u in range(users))
+    )
+    # Cuộc trò chuyện và tin nhắn xen kẽ giữa các người dùng, giống thứ tự ghi thật
+    total_chats = users * chats_per_user
+    connection.executemany(
+        'INSERT INTO "Chat" ("id", "userId", "title", "createdAt", "updatedAt") VALUES (?, ?, ?, ?, ?)',
+        ((f"chat-{c}", f"user-{c % users}", f"Chat {c}", timestamp(c), timestamp(c)) for c in range(total_chats))
+    )
+    connection.executemany(
+        'INSERT INTO "Message" ("id", "chatId", "role", "content", "createdAt", "updatedAt") VALUES (?, ?, ?, ?, ?, ?)',
+        (
+            (
+                f"message-{m}", f"chat-{m % total_chats}", "user" if (m // total_chats) % 2 == 0 else "assistant",
+                f"Message {m}", timestamp(m), timestamp(m)
+            )
+            for m in range(total_chats * messages_per_chat)
+        )
+    )
+    statuses = ("ready", "ready", "ready", "failed", "pending", "processing")
+    connection.executemany(
+        'INSERT INTO "File" ("id", "filename", "filepath", "filetype", "size", "contentHash", "status", '
+        '"progress", "createdAt", "updatedAt") VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)',
+        (
+            (
+                f"file-{f}", f"file{f}.pdf", f"public/uploads/objects/{f}", ".pdf", 1024, f"hash-{f}",
+                # Đa số file đã xử lý xong, chỉ vài file còn dở
+                statuses[f % len(statuses)] if f % 500 == 0 else "ready",
+                timestamp(f), timestamp(f)
+            )
+            for f in range(files)
+        )
+    )
+    connection.commit()
+
+
+def plan_problems(query: HotQuery, plan: List[str]) -> List[str]:
+    """Các vấn đề của kết quả EXPLAIN QUERY PLAN: không dùng index mong đợi, quét toàn bảng, sắp xếp tạm."""
+    problems = []
+    if query.index is not None and not any(
+        re.search(rf"USING (COVERING )?INDEX {re.escape(query.index)}\b", detail) for detail in plan
+    ):
+        problems.append(f"expected index {query.index}")
+    for detail in plan:
+        if query.index is not None and detail.startswith("SCAN") and "INDEX" not in detail:
+            problems.append(detail)
+        elif "USE TEMP B-TREE" in detail:
+            problems.append(detail)
+    return problems
+
+
+def explain(connection: sqlite3.Connection, query: HotQuery) -> List[str]:
+    return [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {query.sql}", query.params)]
+
+
+def audit(connection: sqlite3.Connection, queries: List[HotQuery], repeat: int = 5) -> List[Dict]:
+    """
+    Đọc kế hoạch của từng truy vấn hai lần: trước ANALYZE (như dev.db thật, Prisma không chạy
+    ANALYZE) và sau ANALYZE (planner biết phân bố dữ liệu). Cả hai phải dùng index mong đợi.
+    """
+    plans = {query.name: explain(connection, query) for query in queries}
+    connection.execute("ANALYZE")
+
+    reports = []
+    for query in queries:
+        analyzed_plan = explain(connection, query)
+        timing_ms: Optional[float] = None
+        if query.sql.lstrip().upper().startswith("SELECT"):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                connection.execute(query.sql, query.params).fetchall()
+            timing_ms = round((time.perf_counter() - started) / repeat * 1000, 3)
+        problems = plan_problems(query, plans[query.name])
+        problems += [f"after ANALYZE: {problem}" for problem in plan_problems(query, analyzed_plan)]
+        reports.append({
+            "name": query.name,
+            "route": query.route,
+            "index": query.index,
+            "plan": plans[query.name],
+            "analyzed_plan": analyzed_plan,
+            "problems": problems,
+            "ms": timing_ms,
+        })
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra các truy vấn thường xuyên của route đều dùng index")
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA, help="Đường dẫn schema.prisma")
+    parser.add_argument(
+        "--database",
+        help="Kiểm tra cơ sở dữ liệu SQLite có sẵn (ví dụ dev.db) thay vì dựng từ schema; lưu ý script chạy ANALYZE trên đó"
+    )
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--chats-per-user", type=int, default=25)
+    parser.add_argument("--messages-per-chat", type=int, default=40)
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    temp_dir = None
+    if args.database:
+        connection = sqlite3.connect(args.database)
+    else:
+        with open(args.schema, encoding="utf-8") as source:
+            models = parse_schema(source.read())
+        temp_dir = tempfile.TemporaryDirectory(prefix="audit_query_plans_")
+        connection = sqlite3.connect(os.path.join(temp_dir.name, "audit.db"))
+        for statement in schema_ddl(models):
+            connection.execute(statement)
+        started = time.perf_counter()
+        seed(connection, args.users, args.chats_per_user, args.messages_per_chat, args.files)
+        print(
+            f"Seeded {args.users} users, {args.users * args.chats_per_user} chats, "
+            f"{args.users * args.chats_per_user * args.messages_per_chat} messages, {args.files} files "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+    try:
+        # DELETE chỉ được EXPLAIN, không thực thi
+        reports = audit(connection, HOT_QUERIES)
+    finally:
+        connection.close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    for report in reports:
+        status = "FAIL" if report["problems"] else "ok"
+        timing = f" ({report['ms']} ms)" if report["ms"] is not None else ""
+        print(f"[{status}] {report['name']}{timing} - {report['route']}")
+        for detail in report["plan"]:
+            print(f"         {detail}")
+        if report["analyzed_plan"] != report["plan"]:
+            for detail in report["analyzed_plan"]:
+                print(f"         (after ANALYZE) {detail}")
+        for problem in report["problems"]:
+            print(f"         ! {problem}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as target:
+            json.dump(reports, target, ensure_ascii=False, indent=2)
+
+    failed = [report["name"] for report in reports if report["problems"]]
+    if failed:
+        print(f"\n{len(failed)} queries do not use their expected index: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"\nAll {len(reports)} hot queries use their expected index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Bộ benchmark thông lượng và bộ nhớ cho các loader trong document_loader và bước chia đoạn + nhúng.
+
+Sinh file PDF/XLSX/CSV/PPTX/DOCX giả lập với kích thước tăng dần (không cần mạng), đo
+số trang/dòng mỗi giây, số đoạn mỗi giây (splitter + embedder giả) và bộ nhớ đỉnh của
+từng loader, rồi ghi kết quả ra file JSON để so sánh giữa các lần chạy.
+
+Bộ nhớ được đo cho cả hai cách xử lý:
+    load_peak_mb: loader trả về danh sách (load_*_to_text), toàn bộ văn bản nằm trong bộ nhớ.
+    extract_peak_mb: bước trích xuất của hàng đợi xử lý (iter_document_pages -> write_pages,
+        chạy trong tiến trình con của parser_pool).
+    pipeline_peak_mb: bước nhúng của hàng đợi xử lý (read_pages -> chia đoạn -> nhúng theo lô,
+        như ChatAgent.embed_and_store_pages).
+
+Chạy:
+    python -m app.scripts.benchmark_ingestion --output benchmark_ingestion.json
+    python -m app.scripts.benchmark_ingestion --quick --compare benchmark_ingestion.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from xml.sax.saxutils import escape
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.config import ChatAgentConfig as config
+from app.core.document_loader import (
+    EXTRACTOR_VERSION,
+    Page,
+    infer_file_type,
+    iter_document_pages,
+    load_csv_to_text,
+    load_docx_to_text,
+    load_excel_to_text,
+    load_pdf_to_text,
+    load_ppt_to_text,
+    read_pages,
+    write_pages,
+)
+from app.scripts.shipping_data import SHIPPING_HEADER, sentence, shipping_row
+
+# Kích thước mặc định cho từng định dạng (số trang, slide, đoạn văn hoặc dòng)
+DEFAULT_SIZES = {
+    "pdf": [10, 100, 500],
+    "pptx": [10, 100, 500],
+    "docx": [100, 1000, 10000],
+    "csv": [1000, 10000, 100000],
+    "xlsx": [1000, 10000, 50000],
+}
+QUICK_SIZES = {
+    "pdf": [10, 50],
+    "pptx": [10, 50],
+    "docx": [100, 1000],
+    "csv": [1000, 10000],
+    "xlsx": [1000, 5000],
+}
+UNIT_NAMES = {"pdf": "pages", "pptx": "slides", "docx": "paragraphs", "csv": "rows", "xlsx": "rows"}
+
+# Tỷ lệ chậm đi (so với lần chạy trước) được coi là suy giảm hiệu năng
+REGRESSION_THRESHOLD = 0.2
+
+def make_pdf(path: str, pages: int, lines_per_page: int = 40):
+    """Viết một file PDF tối giản có văn bản (font Helvetica chuẩn) mà không cần thư viện ngoài."""
+    rng = random.Random(pages)
+    objects: List[bytes] = []
+    font_id = 3
+    first_page_id = 4
+    page_ids = [first_page_id + 2 * i for i in range(pages)]
+
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i, page_id in enumerate(page_ids):
+        lines = [f"BT /F1 10 Tf 50 {800 - j * 18} Td (Page {i + 1}: {sentence(rng, j)}) Tj ET"
+                 for j in range(lines_per_page)]
+        stream = "\n".join(lines).encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    with open(path, "wb") as out:
+        out.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref_offset = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            out.write(b"%010d 00000 n \n" % offset)
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset))
+
+
+def make_docx(path: str, paragraphs: int):
+    """Viết một file DOCX tối giản (zip chứa word/document.xml)."""
+    rng = random.Random(paragraphs)
+    body = "".join(f"<w:p><w:r><w:t>{escape(sentence(rng, i))}</w:t></w:r></w:p>" for i in range(paragraphs))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        docx.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>'
+        ))
+        docx.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ))
+
+
+def make_pptx(path: str, slides: int):
+    from pptx import Presentation
+
+    rng = random.Random(slides)
+    prs = Presentation()
+    layout = prs.slide_layouts[1]
+    for i in range(slides):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = f"Báo cáo tuần {i + 1}"
+        slide.placeholders[1].text = "\n".join(sentence(rng, j) for j in range(8))
+    prs.save(path)
+
+
+def make_csv(path: str, rows: int):
+    rng = random.Random(rows)
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(SHIPPING_HEADER)
+        for i in range(rows):
+            writer.writerow(shipping_row(rng, i))
+
+
+def make_xlsx(path: str, rows: int):
+    import openpyxl
+
+    rng = random.Random(rows)
+    workbook = openpyxl.Workbook(write_only=True)
+    # Hai sheet để loader phải đọc tất cả các sheet
+    for sheet_name, sheet_rows in (("Containers", rows - rows // 4), ("Returns", rows // 4)):
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append(SHIPPING_HEADER)
+        for i in range(sheet_rows):
+            sheet.append(shipping_row(rng, i))
+    workbook.save(path)
+
+
+FORMATS: Dict[str, Dict[str, Callable]] = {
+    "pdf": {"make": make_pdf, "load": load_pdf_to_text},
+    "pptx": {"make": make_pptx, "load": load_ppt_to_text},
+    "docx": {"make": make_docx, "load": load_docx_to_text},
+    "csv": {"make": make_csv, "load": load_csv_to_text},
+    "xlsx": {"make": make_xlsx, "load": load_excel_to_text},
+}
+
+
+def split_and_embed(pages: Iterable[Page], embedder: DeterministicFakeEmbedding) -> int:
+    """Chia đoạn và nhúng theo lô như ChatAgent.embed_and_store_pages, dùng embedder giả."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=config.CHUNK_SIZE,
+        chunk_overlap=config.CHUNK_OVERLAP,
+        length_function=len,
+    )
+    chunk_count = 0
+    batch = []
+    for page, text in pages:
+        batch.extend(splitter.create_documents([text], metadatas=[{"page": page}]))
+        if len(batch) >= config.EMBEDDING_BATCH_SIZE:
+            embedder.embed_documents([doc.page_content for doc in batch])
+            chunk_count += len(batch)
+            batch = []
+    if batch:
+        embedder.embed_documents([doc.page_content for doc in batch])
+        chunk_count += len(batch)
+    return chunk_count
+
+
+def extract_to_file(path: str, pages_path: str) -> int:
+    """Trích xuất như hàng đợi xử lý: ghi dần từng trang ra file JSON Lines nén gzip."""
+    return write_pages(iter_document_pages(path, infer_file_type(path)), pages_path, compress=True)
+
+
+def peak_memory_mb(fn: Callable[[], Any]) -> float:
+    """Chạy hàm dưới tracemalloc và trả về lượng bộ nhớ Python cấp phát đỉnh (MB)."""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / (1024 * 1024)
+
+
+def bench_case(
+    file_format: str,
+    size: int,
+    tmp_dir: str,
+    embedder: DeterministicFakeEmbedding,
+    warm_up: bool = False
+) -> Dict[str, Any]:
+    spec = FORMATS[file_format]
+    path = os.path.join(tmp_dir, f"bench_{size}.{file_format}")
+    pages_path = f"{path}.pages.jsonl.gz"
+    spec["make"](path, size)
+
+    if warm_up:
+        # Lần chạy đầu tiên của mỗi định dạng còn bao gồm chi phí import thư viện
+        spec["load"](path)
+        extract_to_file(path, pages_path)
+        split_and_embed(read_pages(pages_path), embedder)
+
+    started = time.perf_counter()
+    pages = spec["load"](path)
+    load_seconds = time.perf_counter() - started
+
+    extract_to_file(path, pages_path)
+    started = time.perf_counter()
+    chunks = split_and_embed(read_pages(pages_path), embedder)
+    chunk_seconds = time.perf_counter() - started
+
+    # Đo bộ nhớ ở một lần chạy riêng vì tracemalloc làm chậm đáng kể
+    load_peak_mb = peak_memory_mb(lambda: spec["load"](path))
+    extract_peak_mb = peak_memory_mb(lambda: extract_to_file(path, pages_path))
+    pipeline_peak_mb = peak_memory_mb(lambda: split_and_embed(read_pages(pages_path), embedder))
+
+    return {
+        "format": file_format,
+        "size": size,
+        "unit": UNIT_NAMES[file_format],
+        "file_bytes": os.path.getsize(path),
+        "pages_out": len(pages),
+        "chunks": chunks,
+        "load_seconds": round(load_seconds, 4),
+        "units_per_sec": round(size / load_seconds, 1) if load_seconds else None,
+        "chunk_seconds": round(chunk_seconds, 4),
+        "chunks_per_sec": round(chunks / chunk_seconds, 1) if chunk_seconds else None,
+        "load_peak_mb": round(load_peak_mb, 2),
+        "extract_peak_mb": round(extract_peak_mb, 2),
+        "pipeline_peak_mb": round(pipeline_peak_mb, 2),
+    }
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> List[str]:
+    """So sánh với báo cáo trước, trả về danh sách các trường hợp chậm đi quá REGRESSION_THRESHOLD."""
+    with open(baseline_path, "r", encoding="utf-8") as source:
+        baseline = {(r["format"], r["size"]): r for r in json.load(source)["results"]}
+
+    regressions = []
+    print(f"\nComparison with {baseline_path}:")
+    for result in results:
+        previous = baseline.get((result["format"], result["size"]))
+        if not previous:
+            continue
+        for metric in ("units_per_sec", "chunks_per_sec"):
+            old, new = previous.get(metric), result.get(metric)
+            if not old or not new:
+                continue
+            change = (new - old) / old
+            marker = ""
+            if change < -REGRESSION_THRESHOLD:
+                marker = "  <-- regression"
+                regressions.append(f"{result['format']} {result['size']} {metric} {change:+.0%}")
+            print(f"  {result['format']:<5} {result['size']:>7} {metric:<15} {old:>12,.1f} -> {new:>12,.1f} ({change:+.0%}){marker}")
+    return regressions
+
+
+def run(sizes: Dict[str, List[int]], formats: List[str]) -> List[Dict[str, Any]]:
+    embedder = DeterministicFakeEmbedding(size=768)
+    results = []
+    print(f"{'format':<6} {'size':>7} {'unit':<10} {'load s':>8} {'units/s':>10} {'chunks':>7} "
+          f"{'chunks/s':>10} {'load MB':>8} {'extr MB':>8} {'pipe MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for file_format in formats:
+            for index, size in enumerate(sizes[file_format]):
+                result = bench_case(file_format, size, tmp_dir, embedder, warm_up=index == 0)
+                results.append(result)
+                print(f"{file_format:<6} {size:>7} {result['unit']:<10} {result['load_seconds']:>8.3f} "
+                      f"{result['units_per_sec'] or 0:>10,.0f} {result['chunks']:>7} "
+                      f"{result['chunks_per_sec'] or 0:>10,.0f} {result['load_peak_mb']:>8.1f} "
+                      f"{result['extract_peak_mb']:>8.1f} {result['pipeline_peak_mb']:>8.1f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark document loaders, splitter and (fake) embedder")
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    parser.add_argument("--quick", action="store_true", help="Use small sizes for a fast smoke run")
+    parser.add_argument("--output", default="benchmark_ingestion.json", help="Where to write the JSON report")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    results = run(QUICK_SIZES if args.quick else DEFAULT_SIZES, args.formats)
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "extractor_version": EXTRACTOR_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            "chunk_size": config.CHUNK_SIZE,
+            "chunk_overlap": config.CHUNK_OVERLAP,
+            "embedding_batch_size": config.EMBEDDING_BATCH_SIZE,
+        },
+        "results": results,
+    }
+
+    regressions = compare(results, args.compare) if args.compare else []
+
+    with open(args.output, "w", encoding="utf-8") as out:
+        json.dump(report, out, ensure_ascii=False, indent=2)
+    print(f"\nReport written to {args.output}")
+
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Benchmark độ trễ của quy trình SQL chat (/sql-chat) mà không cần MySQL nội bộ và Gemini.
+
+Sinh một cơ sở dữ liệu vận tải biển giả lập (cảng, tàu, chuyến, container) trong SQLite
+với quy mô tùy chọn, đăng ký nó như một nguồn trong dataApiFetching và thay LLM bằng một
+mô hình giả trả về SQL theo kịch bản (có thể giả lập độ trễ của LLM). Đo thời gian từng
+bước (đọc schema, sinh SQL, kiểm tra, thực thi, tạo câu trả lời) ở nhiều mức đồng thời.
+
+Chạy:
+    python -m app.scripts.benchmark_sql_chat --scale 100000 --concurrency 1 4 16
+    python -m app.scripts.benchmark_sql_chat --quick --llm-latency 0.5 --output benchmark_sql_chat.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.core.cache import TTLCache
+from app.core.config import ChatAgentConfig as config
+from app.core.prompt_registry import prompt_registry
+from app.core.sql_agent import sql_assistants
+from app.scripts.shipping_data import (
+    CUSTOMERS,
+    OPERATORS,
+    PORTS,
+    STATUSES,
+    container_no,
+    gross_weight_kg,
+    random_date,
+)
+
+SOURCE_VALUE = "benchmark-shipping"
+
+# Câu hỏi của người dùng và câu SQL mà LLM giả sẽ "sinh" ra cho từng câu hỏi
+SCRIPTED_QUESTIONS = {
+    "Có bao nhiêu container đang vận chuyển?":
+        "SELECT COUNT(*) AS containers FROM containers WHERE status = 'in_transit'",
+    "Tổng trọng lượng hàng theo cảng đến":
+        "SELECT p.name, SUM(c.gross_weight_kg) AS total_kg FROM containers c "
+        "JOIN voyages v ON v.id = c.voyage_id JOIN ports p ON p.id = v.arrival_port_id "
+        "GROUP BY p.name ORDER BY total_kg DESC",
+    "Top 10 khách hàng theo số TEU":
+        "SELECT customer, SUM(teu) AS teu FROM containers GROUP BY customer ORDER BY teu DESC LIMIT 10",
+    "Các chuyến tàu đến Hải Phòng trong tháng 3":
+        "SELECT s.name, v.etd, v.eta FROM voyages v JOIN vessels s ON s.id = v.vessel_id "
+        "JOIN ports p ON p.id = v.arrival_port_id "
+        "WHERE p.name = 'Hải Phòng' AND v.eta BETWEEN '2024-03-01' AND '2024-03-31' ORDER BY v.eta",
+    "Tàu nào chở nhiều container nhất?":
+        "SELECT s.name, COUNT(*) AS containers FROM containers c JOIN voyages v ON v.id = c.voyage_id "
+        "JOIN vessels s ON s.id = v.vessel_id GROUP BY s.name ORDER BY containers DESC LIMIT 5",
+    "Liệt kê các container của khách hàng 007":
+        "SELECT container_no, status, gross_weight_kg FROM containers WHERE customer = 'Khách hàng 007'",
+}
+
+STAGES = ["schema", "write_query", "guard_query", "execute_query", "generate_answer", "total"]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    LLM giả cho benchmark: prompt sinh SQL (kết thúc bằng "Question: ...") nhận câu SQL trong
+    SCRIPTED_QUESTIONS, prompt câu hỏi nối tiếp nhận NEW_QUERY, các prompt khác nhận một câu
+    trả lời cố định. latency giả lập thời gian phản hồi của LLM thật.
+    """
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _respond(self, messages: List[BaseMessage]) -> ChatResult:
+        text = str(messages[-1].content)
+        if "previous_result" in text:
+            content = "NEW_QUERY"
+        else:
+            match = re.search(r"Question:\s*(.+?)\s*$", text, re.DOTALL)
+            if match and match.group(1) in SCRIPTED_QUESTIONS:
+                content = f"```sql\n{SCRIPTED_QUESTIONS[match.group(1)]}\n```"
+            else:
+                content = "Đây là câu trả lời mẫu dựa trên dữ liệu vận tải."
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._respond(messages)
+
+
+def build_shipping_db(path: str, containers: int, seed: int = 42):
+    """Tạo cơ sở dữ liệu vận tải giả lập với số container cho trước (số chuyến = containers / 50)."""
+    rng = random.Random(seed)
+    voyages = max(containers // 50, 10)
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript("""
+            CREATE TABLE ports (id INTEGER PRIMARY KEY, name TEXT NOT NULL, country TEXT NOT NULL);
+            CREATE TABLE vessels (id INTEGER PRIMARY KEY, name TEXT NOT NULL, operator TEXT NOT NULL,
+                                  capacity_teu INTEGER NOT NULL);
+            CREATE TABLE voyages (id INTEGER PRIMARY KEY, vessel_id INTEGER NOT NULL REFERENCES vessels(id),
+                                  departure_port_id INTEGER NOT NULL REFERENCES ports(id),
+                                  arrival_port_id INTEGER NOT NULL REFERENCES ports(id),
+                                  etd TEXT NOT NULL, eta TEXT NOT NULL);
+            CREATE TABLE containers (id INTEGER PRIMARY KEY, container_no TEXT NOT NULL,
+                                     voyage_id INTEGER NOT NULL REFERENCES voyages(id), customer TEXT NOT NULL,
+                                     teu INTEGER NOT NULL, gross_weight_kg REAL NOT NULL, status TEXT NOT NULL);
+            CREATE INDEX ix_voyages_arrival ON voyages(arrival_port_id, eta);
+            CREATE INDEX ix_containers_voyage ON containers(voyage_id);
+            CREATE INDEX ix_containers_customer ON containers(customer);
+        """)
+        connection.executemany("INSERT INTO ports VALUES (?, ?, ?)",
+                               [(i + 1, name, country) for i, (name, country) in enumerate(PORTS)])
+        connection.executemany("INSERT INTO vessels VALUES (?, ?, ?, ?)", [
+            (i + 1, f"{rng.choice(OPERATORS)} {i:03d}", rng.choice(OPERATORS), rng.choice([800, 1200, 1800, 3500]))
+            for i in range(60)
+        ])
+        voyage_rows = []
+        for i in range(voyages):
+            etd = random_date(rng)
+            departure, arrival = rng.sample(range(1, len(PORTS) + 1), 2)
+            voyage_rows.append((i + 1, rng.randint(1, 60), departure, arrival,
+                                etd.isoformat(), (etd + timedelta(days=rng.randint(1, 14))).isoformat()))
+        connection.executemany("INSERT INTO voyages VALUES (?, ?, ?, ?, ?, ?)", voyage_rows)
+
+        batch = []
+        for i in range(containers):
+            batch.append((i + 1, container_no(rng), rng.randint(1, voyages),
+                          rng.choice(CUSTOMERS), rng.choice([1, 2]), gross_weight_kg(rng),
+                          rng.choice(STATUSES)))
+            if len(batch) >= 10000:
+                connection.executemany("INSERT INTO containers VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+                batch = []
+        connection.executemany("INSERT INTO containers VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"mean_ms": None, "p50_ms": None, "p95_ms": None}
+    ordered = sorted(values)
+    return {
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 2),
+    }
+
+
+async def run_level(assistant, concurrency: int, requests: int) -> Dict[str, Any]:
+    """Gửi requests câu hỏi với tối đa concurrency câu hỏi chạy cùng lúc."""
+    questions = list(SCRIPTED_QUESTIONS)
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    errors = []
+
+    async def one(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await assistant.aprocess_question(questions[index % len(questions)])
+            samples["total"].append(time.perf_counter() - started)
+        if "error" in result:
+            errors.append(result["error"])
+        for stage, seconds in result.get("timings", {}).items():
+            samples.setdefault(stage, []).append(seconds)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "wall_seconds": round(wall, 3),
+        "questions_per_sec": round(requests / wall, 2) if wall else None,
+        "stages": {stage: summarize(values) for stage, values in samples.items()},
+    }
+
+
+async def run(args) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "shipping_benchmark.db")
+        started = time.perf_counter()
+        build_shipping_db(db_path, args.scale)
+        print(f"Built shipping database with {args.scale:,} containers in {time.perf_counter() - started:.1f}s")
+
+        # Đăng ký như một nguồn dataApiFetching bình thường để đi qua đúng SQLAssistantRegistry
+        config.dataApiFetching.append({
+            "value": SOURCE_VALUE,
+            "label": "Benchmark shipping (SQLite)",
+            "sql_connect": f"sqlite:///{db_path}",
+            "active": True,
+        })
+        prompt_registry.load()
+        # LLM thật không được gọi, chỉ cần có key để khởi tạo ChatGoogleGenerativeAI
+        os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+        try:
+            assistant = await sql_assistants.get(SOURCE_VALUE)
+            assistant.llm = ScriptedChatModel(latency=args.llm_latency)
+            assistant.embeddings = DeterministicFakeEmbedding(size=768)
+            if not args.cache:
+                # Tắt cache câu hỏi/kết quả để mỗi câu hỏi đi qua toàn bộ quy trình
+                assistant.query_cache = TTLCache(0)
+                assistant.result_cache = TTLCache(0)
+                assistant.answer_cache = TTLCache(0)
+
+            started = time.perf_counter()
+            await asyncio.to_thread(assistant.get_table_info, True)
+            schema_cold = time.perf_counter() - started
+
+            levels = []
+            print(f"\nCold schema fetch: {schema_cold * 1000:.1f} ms")
+            print(f"{'conc':>5} {'reqs':>5} {'q/s':>8} {'err':>4}  " +
+                  " ".join(f"{stage + ' p50/p95 ms':>28}" for stage in STAGES))
+            for concurrency in args.concurrency:
+                level = await run_level(assistant, concurrency, args.requests or concurrency * 10)
+                levels.append(level)
+                print(f"{level['concurrency']:>5} {level['requests']:>5} {level['questions_per_sec'] or 0:>8.1f} "
+                      f"{level['errors']:>4}  " + " ".join(
+                          f"{(level['stages'][stage]['p50_ms'] or 0):>13.1f}/{(level['stages'][stage]['p95_ms'] or 0):<14.1f}"
+                          for stage in STAGES))
+        finally:
+            await sql_assistants.stop()
+            config.dataApiFetching[:] = [item for item in config.dataApiFetching if item.get("value") != SOURCE_VALUE]
+
+    return {"schema_cold_ms": round(schema_cold * 1000, 2), "levels": levels}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQL chat pipeline against a SQLite shipping stand-in")
+    parser.add_argument("--scale", type=int, default=100000, help="Number of containers to generate")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Concurrency levels to run")
+    parser.add_argument("--requests", type=int, help="Questions per level (default: 10 x concurrency)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM call")
+    parser.add_argument("--cache", action="store_true", help="Keep the query/result caches enabled")
+    parser.add_argument("--quick", action="store_true", help="Small database and few requests for a smoke run")
+    parser.add_argument("--output", default="benchmark_sql_chat.json", help="Where to write the JSON report")
+    args = parser.parse_args()
+    if args.quick:
+        args.scale = min(args.scale, 10000)
+        args.concurrency = args.concurrency[:2]
+        args.requests = args.requests or 12
+
+    results = asyncio.run(run(args))
+
+    report = {
+        "generated_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scale": args.scale,
+        "llm_latency": args.llm_latency,
+        "cache": args.cache,
+        "config": {
+            "sql_result_max_rows": config.SQL_RESULT_MAX_ROWS,
+            "sql_answer_max_chars": config.SQL_ANSWER_MAX_CHARS,
+            "sql_statement_timeout": config.SQL_STATEMENT_TIMEOUT,
+        },
+        **results,
+    }
+    with open(args.output, "w", encoding="utf-8") as out:
+        json.dump(report, out, ensure_ascii=False, indent=2)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+So sánh thông lượng giữa loader Excel/CSV cũ (iterrows, CSVLoader) và loader vector hóa mới.
+
+Chạy:
+    python -m app.scripts.benchmark_tabular_loaders --rows 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, List
+
+import pandas as pd
+from langchain_community.document_loaders.csv_loader import CSVLoader
+
+from app.core.document_loader import load_csv_to_text, load_excel_to_text
+from app.scripts.shipping_data import SHIPPING_HEADER, shipping_rows
+
+
+def legacy_load_csv_to_text(file_path: str) -> List[str]:
+    """Loader CSV trước đây: một Document cho mỗi dòng qua CSVLoader."""
+    loader = CSVLoader(file_path=file_path, csv_args={"delimiter": ",", "quotechar": '"'})
+    return [doc.page_content for doc in loader.load()]
+
+
+def legacy_load_excel_to_text(file_path: str) -> List[str]:
+    """Loader Excel trước đây: chỉ đọc sheet đầu tiên, nối từng dòng bằng iterrows."""
+    df = pd.read_excel(file_path)
+    text_content = [", ".join(str(header) for header in df.columns.tolist())]
+    for _, row in df.iterrows():
+        text_content.append(", ".join(str(value) for value in row.values))
+    return text_content
+
+
+def make_shipping_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Sinh dữ liệu giả lập một bảng xuất container của hãng vận tải."""
+    return pd.DataFrame(list(shipping_rows(rows, seed)), columns=SHIPPING_HEADER)
+
+
+def measure(loader: Callable[[str], List[str]], file_path: str, rows: int) -> dict:
+    started = time.perf_counter()
+    chunks = loader(file_path)
+    elapsed = time.perf_counter() - started
+    return {"seconds": elapsed, "rows_per_sec": rows / elapsed if elapsed else float("inf"), "chunks": len(chunks)}
+
+
+def run(row_counts: List[int]):
+    print(f"{'format':<6} {'rows':>8} {'loader':<8} {'seconds':>9} {'rows/s':>12} {'chunks':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in row_counts:
+            df = make_shipping_frame(rows)
+
+            csv_path = os.path.join(tmp_dir, f"shipping_{rows}.csv")
+            df.to_csv(csv_path, index=False)
+
+            xlsx_path = os.path.join(tmp_dir, f"shipping_{rows}.xlsx")
+            with pd.ExcelWriter(xlsx_path) as writer:
+                df.to_excel(writer, sheet_name="Containers", index=False)
+
+            cases = [
+                ("csv", "legacy", legacy_load_csv_to_text, csv_path),
+                ("csv", "new", load_csv_to_text, csv_path),
+                ("xlsx", "legacy", legacy_load_excel_to_text, xlsx_path),
+                ("xlsx", "new", load_excel_to_text, xlsx_path),
+            ]
+            for file_format, name, loader, path in cases:
+                result = measure(loader, path, rows)
+                print(f"{file_format:<6} {rows:>8} {name:<8} {result['seconds']:>9.3f} "
+                      f"{result['rows_per_sec']:>12,.0f} {result['chunks']:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark legacy vs vectorized tabular loaders")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="Row counts to generate")
+    args = parser.parse_args()
+    run(args.rows)
+
+
+if __name__ == "__main__":
+    main()
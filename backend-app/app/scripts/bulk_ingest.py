@@ -0,0 +1,393 @@
+"""
+Nhập hàng loạt tài liệu từ một thư mục: lưu file, tạo bản ghi File theo lô, trích xuất và
+nhúng với N worker song song. Tiến độ được ghi vào file checkpoint nên khi bị ngắt giữa
+chừng, lần chạy sau sẽ tiếp tục từ chỗ đã dừng.
+
+Chạy:
+    python -m app.scripts.bulk_ingest /data/phong-ke-toan --user admin --workers 8
+    python -m app.scripts.bulk_ingest /data/phong-ke-toan --retry-failed
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.core.config import ChatAgentConfig as config
+from app.core.ingestion import IngestionJob, ingestion_queue, STATUS_FAILED, STATUS_PENDING, STATUS_READY
+from app.core.parser_pool import parser_pool
+from app.database import prisma, connect, disconnect
+from app.routes.file import OBJECT_DIR, SUPPORTED_FILE_TYPES, UPLOAD_CHUNK_SIZE
+
+CHECKPOINT_FILENAME = ".bulk_ingest_checkpoint.json"
+
+# Khoảng thời gian tối thiểu giữa hai lần ghi checkpoint (ghi lại cả file mỗi lần)
+CHECKPOINT_INTERVAL_SECONDS = 2.0
+
+
+def iter_supported_files(directory: str):
+    """Duyệt đệ quy thư mục, trả về đường dẫn tương đối của các file được hỗ trợ (theo thứ tự ổn định)."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name.lower())[1] in SUPPORTED_FILE_TYPES and name != CHECKPOINT_FILENAME:
+                yield os.path.relpath(os.path.join(root, name), directory)
+
+
+def store_object(source_path: str, file_extension: str) -> Tuple[str, int, str]:
+    """Tính SHA-256 và sao chép file vào kho lưu trữ theo nội dung (giống save_upload)."""
+    sha256 = hashlib.sha256()
+    with open(source_path, "rb") as source:
+        while chunk := source.read(UPLOAD_CHUNK_SIZE):
+            sha256.update(chunk)
+    content_hash = sha256.hexdigest()
+
+    object_dir = os.path.join(OBJECT_DIR, content_hash[:2])
+    os.makedirs(object_dir, exist_ok=True)
+    file_path = os.path.join(object_dir, f"{content_hash}{file_extension}")
+    if not os.path.exists(file_path):
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    return file_path, os.path.getsize(file_path), content_hash
+
+
+class Checkpoint:
+    """Trạng thái của lần nhập: đường dẫn tương đối -> {file_id, status}. Ghi nguyên tử ra JSON."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self._saved_at = 0.0
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as source:
+                self.files = json.load(source).get("files", {})
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            json.dump({"updated_at": datetime.now().isoformat(), "files": self.files}, out, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._saved_at = time.monotonic()
+
+    def save_if_due(self):
+        if time.monotonic() - self._saved_at >= CHECKPOINT_INTERVAL_SECONDS:
+            self.save()
+
+
+class Progress:
+    """Đếm số file/byte đã xử lý và in thông lượng định kỳ."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+
+    def report(self, final: bool = False):
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = (self.total - self.done) / rate if rate else float("inf")
+        print(f"{'Finished' if final else 'Progress'}: {self.done}/{self.total} files "
+              f"({self.failed} failed) in {elapsed:.0f}s - {rate:.2f} files/s, "
+              f"{self.bytes / (1024 * 1024) / elapsed if elapsed else 0:.2f} MB/s"
+              + ("" if final else f", ETA {remaining:.0f}s"))
+
+
+def lease_until() -> datetime:
+    """Hạn giữ file mới: server không nhận lại file khi khởi động trước thời điểm này."""
+    return datetime.now(timezone.utc) + timedelta(seconds=config.INGESTION_LEASE_SECONDS)
+
+
+class Leases:
+    """
+    Các file lần nhập này đang xử lý. Hạn giữ (File.leaseUntil) được gia hạn định kỳ để server
+    khởi động giữa chừng không xử lý trùng; nếu script dừng đột ngột, hạn giữ tự hết và các
+    file dở dang lại được server (hoặc lần chạy sau) nhận.
+    """
+
+    def __init__(self):
+        self.file_ids: Set[str] = set()
+
+    async def renew(self):
+        if self.file_ids:
+            await prisma.file.update_many(
+                where={"id": {"in": list(self.file_ids)}}, data={"leaseUntil": lease_until()}
+            )
+
+    async def keep_alive(self):
+        while True:
+            await asyncio.sleep(config.INGESTION_LEASE_SECONDS / 3)
+            try:
+                await self.renew()
+            except Exception as e:
+                print(f"Error renewing leases: {str(e)}")
+
+    async def release(self):
+        """Trả lại các file chưa xử lý xong (ví dụ khi bị ngắt) để server có thể nhận ngay."""
+        if self.file_ids:
+            await prisma.file.update_many(where={"id": {"in": list(self.file_ids)}}, data={"leaseUntil": None})
+            self.file_ids.clear()
+
+
+def make_job(db_id: str, file_path: str, file_type: str, filename: str, size: int,
+             content_hash: str, relative_path: str, user_id: Optional[str]) -> IngestionJob:
+    return IngestionJob(
+        file_id=db_id,
+        file_path=file_path,
+        file_type=file_type,
+        metadata={
+            "filename": filename,
+            "filetype": file_type,
+            "size": size,
+            "uploaded_by": user_id or "",
+            "upload_date": datetime.now().isoformat(),
+            "source_path": relative_path,
+        },
+        content_hash=content_hash,
+    )
+
+
+async def register_batch(
+    directory: str,
+    batch: List[str],
+    checkpoint: Checkpoint,
+    user_id: Optional[str],
+    leases: Leases
+) -> List[Tuple[str, IngestionJob]]:
+    """
+    Lưu các file của một lô và tạo bản ghi File bằng một lệnh create_many. ID của các bản ghi
+    được ghi vào checkpoint trước khi tạo: nếu bị ngắt giữa hai bước, lần chạy sau thấy ID
+    không có trong database và đăng ký lại file thay vì tạo bản ghi trùng.
+    """
+    stored = await asyncio.gather(*(
+        asyncio.to_thread(store_object, os.path.join(directory, relative_path), os.path.splitext(relative_path.lower())[1])
+        for relative_path in batch
+    ), return_exceptions=True)
+
+    # Nội dung đã được nhúng trước đó thì liên kết với collection có sẵn, không xử lý lại
+    hashes = list({result[2] for result in stored if not isinstance(result, Exception)})
+    ready = {}
+    if hashes:
+        for existing in await prisma.file.find_many(where={"contentHash": {"in": hashes}, "status": STATUS_READY}):
+            ready.setdefault(existing.contentHash, existing)
+
+    rows, jobs, linked = [], [], []
+    lease = lease_until()
+    for relative_path, result in zip(batch, stored):
+        if isinstance(result, Exception):
+            print(f"Error storing {relative_path}: {str(result)}")
+            checkpoint.files[relative_path] = {"status": STATUS_FAILED, "error": str(result)}
+            continue
+
+        file_path, size, content_hash = result
+        file_type = SUPPORTED_FILE_TYPES[os.path.splitext(relative_path.lower())[1]]
+        filename = os.path.basename(relative_path)
+        db_id = str(uuid.uuid4())
+        existing = ready.get(content_hash)
+        rows.append({
+            "id": db_id,
+            "filename": filename,
+            "filepath": file_path,
+            "filetype": file_type,
+            "size": size,
+            "metadata": (existing.metadata or "{}") if existing else "{}",
+            "userId": user_id,
+            "contentHash": content_hash,
+            "status": STATUS_READY if existing else STATUS_PENDING,
+            "progress": 100 if existing else 0,
+            "leaseUntil": None if existing else lease,
+        })
+        # Ghi nhận ý định trước khi tạo bản ghi (kể cả file liên kết, đánh dấu ready sau khi tạo)
+        checkpoint.files[relative_path] = {"file_id": db_id, "size": size, "status": STATUS_PENDING}
+        if existing:
+            linked.append(relative_path)
+        else:
+            leases.file_ids.add(db_id)
+            jobs.append((relative_path, make_job(
+                db_id, file_path, file_type, filename, size, content_hash, relative_path, user_id
+            )))
+
+    checkpoint.save()
+    if rows:
+        await prisma.file.create_many(data=rows)
+    for relative_path in linked:
+        checkpoint.files[relative_path]["status"] = STATUS_READY
+    checkpoint.save()
+    return jobs
+
+
+async def resume_job(
+    relative_path: str,
+    entry: Dict[str, Any],
+    user_id: Optional[str],
+    leases: Leases
+) -> Optional[IngestionJob]:
+    """
+    Tạo lại job cho một file đã có bản ghi nhưng chưa xử lý xong (hoặc thất bại khi --retry-failed).
+    Trả về None và cập nhật entry nếu file thực ra đã xử lý xong hoặc bản ghi không còn
+    (bị ngắt trước khi bản ghi được tạo: file sẽ được đăng ký lại).
+    """
+    db_file = await prisma.file.find_unique(where={"id": entry["file_id"]})
+    if not db_file:
+        entry.clear()
+        return None
+    if db_file.status == STATUS_READY:
+        # Đã xử lý xong nhưng checkpoint chưa kịp ghi trước khi bị ngắt
+        entry["status"] = STATUS_READY
+        return None
+    await prisma.file.update(
+        where={"id": db_file.id},
+        data={"status": STATUS_PENDING, "progress": 0, "error": None, "leaseUntil": lease_until()}
+    )
+    leases.file_ids.add(db_file.id)
+    return make_job(
+        db_file.id, db_file.filepath, db_file.filetype, db_file.filename, db_file.size,
+        db_file.contentHash, relative_path, user_id or db_file.userId
+    )
+
+
+async def bulk_ingest(
+    directory: str,
+    username: Optional[str],
+    workers: int,
+    batch_size: int,
+    checkpoint_path: str,
+    retry_failed: bool,
+    report_interval: float
+):
+    print("Connecting to database...")
+    try:
+        await connect()
+    except Exception as e:
+        print(f"Error connecting to database: {str(e)}")
+        return
+
+    try:
+        user_id = None
+        if username:
+            user = await prisma.user.find_unique(where={"username": username})
+            if not user:
+                print(f"User {username} not found")
+                return
+            user_id = user.id
+
+        checkpoint = Checkpoint(checkpoint_path)
+        all_files = list(iter_supported_files(directory))
+        todo, resumed = [], []
+        for relative_path in all_files:
+            entry = checkpoint.files.get(relative_path)
+            if not entry:
+                todo.append(relative_path)
+            elif entry["status"] == STATUS_READY:
+                continue
+            elif entry["status"] == STATUS_FAILED and not retry_failed:
+                continue
+            elif entry.get("file_id"):
+                resumed.append(relative_path)
+            else:
+                # Lỗi khi lưu file: chưa có bản ghi, đăng ký lại từ đầu
+                todo.append(relative_path)
+
+        total = len(todo) + len(resumed)
+        print(f"Found {len(all_files)} supported files, {total} to ingest "
+              f"({len(resumed)} resumed from checkpoint) with {workers} workers")
+        if not total:
+            return
+
+        progress = Progress(total)
+        jobs: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        leases = Leases()
+
+        async def produce():
+            for relative_path in resumed:
+                entry = checkpoint.files[relative_path]
+                job = await resume_job(relative_path, entry, user_id, leases)
+                if job:
+                    await jobs.put((relative_path, job))
+                elif entry.get("status") == STATUS_READY:
+                    progress.done += 1
+                else:
+                    todo.append(relative_path)
+            for start in range(0, len(todo), batch_size):
+                batch = todo[start:start + batch_size]
+                batch_jobs = await register_batch(directory, batch, checkpoint, user_id, leases)
+                # Các file được liên kết với nội dung đã nhúng hoặc lỗi khi lưu được tính là xong
+                for relative_path in batch:
+                    entry = checkpoint.files[relative_path]
+                    if entry["status"] != STATUS_PENDING:
+                        progress.done += 1
+                        progress.failed += entry["status"] == STATUS_FAILED
+                for item in batch_jobs:
+                    await jobs.put(item)
+            for _ in range(workers):
+                await jobs.put(None)
+
+        async def work():
+            while (item := await jobs.get()) is not None:
+                relative_path, job = item
+                status = await ingestion_queue.process(job)
+                leases.file_ids.discard(job.file_id)
+                entry = checkpoint.files[relative_path]
+                entry["status"] = status
+                progress.done += 1
+                progress.failed += status == STATUS_FAILED
+                progress.bytes += entry.get("size", 0)
+                checkpoint.save_if_due()
+
+        async def report():
+            while True:
+                await asyncio.sleep(report_interval)
+                progress.report()
+
+        background = [asyncio.create_task(report()), asyncio.create_task(leases.keep_alive())]
+        try:
+            await asyncio.gather(produce(), *(work() for _ in range(workers)))
+        finally:
+            for task in background:
+                task.cancel()
+            checkpoint.save()
+            try:
+                await leases.release()
+            except Exception as e:
+                print(f"Error releasing leases: {str(e)}")
+        progress.report(final=True)
+    finally:
+        parser_pool.shutdown()
+        await disconnect()
+        print("Disconnected from database")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk ingest a directory of documents")
+    parser.add_argument("directory", help="Directory to walk recursively")
+    parser.add_argument("--user", help="Username that owns the imported files")
+    parser.add_argument("--workers", type=int, default=config.INGESTION_WORKERS, help="Concurrent ingestion workers")
+    parser.add_argument("--batch-size", type=int, default=100, help="File rows created per database batch")
+    parser.add_argument("--checkpoint", help=f"Checkpoint file (default: <directory>/{CHECKPOINT_FILENAME})")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry files that failed in a previous run")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between throughput reports")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+
+    asyncio.run(bulk_ingest(
+        directory=args.directory,
+        username=args.user,
+        workers=max(1, args.workers),
+        batch_size=max(1, args.batch_size),
+        checkpoint_path=args.checkpoint or os.path.join(args.directory, CHECKPOINT_FILENAME),
+        retry_failed=args.retry_failed,
+        report_interval=args.report_interval,
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Dữ liệu vận tải biển giả lập (cảng, tàu, container) dùng chung cho các script benchmark.
+
+Không chạy trực tiếp; được import bởi benchmark_ingestion, benchmark_tabular_loaders và
+benchmark_sql_chat. Mọi hàm nhận một random.Random để kết quả lặp lại được theo seed.
+"""
+import random
+from datetime import date, timedelta
+from typing import Any, Iterator, List
+
+# Cảng (tên, mã quốc gia); các cảng trong nước được dùng cho dữ liệu dạng bảng và văn bản
+PORTS = [
+    ("Hải Phòng", "VN"), ("Cát Lái", "VN"), ("Cái Mép", "VN"), ("Đà Nẵng", "VN"), ("Quy Nhơn", "VN"),
+    ("Singapore", "SG"), ("Hong Kong", "HK"), ("Shanghai", "CN"), ("Busan", "KR"), ("Laem Chabang", "TH"),
+]
+DOMESTIC_PORTS = [name for name, country in PORTS if country == "VN"]
+OPERATORS = ["ASGL", "Vinalines", "Gemadept", "VIMC", "Haivan"]
+CUSTOMERS = [f"Khách hàng {i:03d}" for i in range(200)]
+STATUSES = ["booked", "loaded", "in_transit", "discharged", "delivered"]
+
+SHIPPING_HEADER = ["container_no", "vessel", "port_of_loading", "port_of_discharge", "eta", "teu", "gross_weight_kg"]
+
+START_DATE = date(2024, 1, 1)
+
+
+def container_no(rng: random.Random) -> str:
+    return f"ASGU{rng.randint(1000000, 9999999)}"
+
+
+def vessel_name(index: int) -> str:
+    return f"ASGL {index % 40:03d}"
+
+
+def random_date(rng: random.Random, days: int = 365) -> date:
+    return START_DATE + timedelta(days=rng.randint(0, days))
+
+
+def gross_weight_kg(rng: random.Random) -> float:
+    return round(rng.uniform(2000, 30000), 1)
+
+
+def shipping_row(rng: random.Random, index: int) -> List[Any]:
+    """Một dòng của bảng xuất container (theo SHIPPING_HEADER)."""
+    return [
+        container_no(rng),
+        vessel_name(index),
+        rng.choice(DOMESTIC_PORTS),
+        rng.choice(DOMESTIC_PORTS),
+        random_date(rng).isoformat(),
+        rng.choice([1, 2]),
+        gross_weight_kg(rng),
+    ]
+
+
+def shipping_rows(rows: int, seed: int = 42) -> Iterator[List[Any]]:
+    rng = random.Random(seed)
+    for index in range(rows):
+        yield shipping_row(rng, index)
+
+
+def sentence(rng: random.Random, index: int) -> str:
+    """Một câu mô tả chuyến hàng, dùng làm nội dung văn bản (PDF, DOCX, PPTX)."""
+    return (f"Container {container_no(rng)} on vessel {vessel_name(index)} "
+            f"departs {rng.choice(DOMESTIC_PORTS)} with {rng.randint(1, 30)} tons of cargo")
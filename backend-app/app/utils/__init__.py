@@ -1,2 +1,2 @@
 # This file makes the utils directory a Python package
-from .auth import authenticate_user, create_access_token, get_current_user, hash_password, verify_password
\ No newline at end of file
+from .auth import authenticate_user, create_access_token, get_admin_user, get_current_user, hash_password, verify_password
\ No newline at end of file
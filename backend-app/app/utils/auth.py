@@ -26,6 +26,9 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days in minutes
 # ASGL API configuration
 ASGL_AUTH_API = os.getenv("ASGL_AUTH_API", "https://id.asgl.net.vn/api/auth/login")
 
+# Usernames allowed to call administrative endpoints (comma separated)
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "admin").split(",") if name.strip()}
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 def hash_password(password: str) -> str:
@@ -231,3 +234,12 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     if user is None:
         raise credentials_exception
     return user
+
+async def get_admin_user(current_user = Depends(get_current_user)):
+    """Get the current user and require them to be an administrator (ADMIN_USERNAMES)."""
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator privileges required",
+        )
+    return current_user
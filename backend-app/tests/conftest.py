@@ -0,0 +1,109 @@
+import sqlite3
+
+import pymysql.cursors
+import pytest
+from sqlalchemy import create_engine
+
+
+class FakeMySQLCursor:
+    """
+    Cursor giả lập pymysql: định dạng câu lệnh bằng Cursor.mogrify thật của pymysql (nên lỗi
+    "%" giống hệt MySQL thật), sau đó chạy câu lệnh trên SQLite.
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._mogrify = pymysql.cursors.Cursor(connection)
+        self._cursor = connection.sqlite.cursor()
+        self._rows = None
+        self.description = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def execute(self, query, args=None):
+        query = self._mogrify.mogrify(query, args)
+        self._connection.executed.append(query)
+        self._rows = None
+        self.description = None
+        if query.upper().startswith("SET "):
+            return 0
+        if query.upper().startswith("EXPLAIN "):
+            # Kế hoạch thực thi dạng MySQL: mỗi bảng một dòng với số dòng ước tính
+            self.description = [(name, None, None, None, None, None, None) for name in ("id", "table", "rows")]
+            self._rows = list(self._connection.explain_rows)
+            return len(self._rows)
+        self._cursor.execute(query)
+        self.description = self._cursor.description
+        return 0
+
+    def fetchmany(self, size=1):
+        if self._rows is not None:
+            batch, self._rows = self._rows[:size], self._rows[size:]
+            return batch
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self.fetchmany(len(self._rows)) if self._rows is not None else self._cursor.fetchall()
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def close(self):
+        pass
+
+
+class FakeMySQLConnection:
+    def __init__(self, sqlite_connection):
+        self.sqlite = sqlite_connection
+        self.executed = []
+        self.explain_rows = [(1, "ports", 2)]
+
+    def cursor(self, cursor_class=None):
+        return FakeMySQLCursor(self)
+
+    def escape(self, value, mapping=None):
+        return pymysql.converters.escape_item(value, "utf8mb4", mapping)
+
+    literal = escape
+
+    def character_set_name(self):
+        return "utf8mb4"
+
+    def set_character_set(self, charset, collation=None):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    def rollback(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def mysql_connection():
+    """Kết nối DBAPI giả của pymysql, dữ liệu là bảng ports trên SQLite."""
+    sqlite_connection = sqlite3.connect(":memory:", check_same_thread=False)
+    sqlite_connection.execute("CREATE TABLE ports (name TEXT, country TEXT)")
+    sqlite_connection.executemany(
+        "INSERT INTO ports VALUES (?, ?)",
+        [("Hải Phòng", "VN"), ("Đà Nẵng", "VN"), ("Singapore", "SG")]
+    )
+    yield FakeMySQLConnection(sqlite_connection)
+    sqlite_connection.close()
+
+
+@pytest.fixture
+def mysql_engine(mysql_connection):
+    """Engine dialect mysql+pymysql chạy trên kết nối giả (không cần MySQL server)."""
+    engine = create_engine("mysql+pymysql://", creator=lambda: mysql_connection)
+    # Bỏ qua bước đọc phiên bản/sql_mode của server khi kết nối lần đầu
+    engine.dialect.initialize = lambda connection: None
+    yield engine
+    engine.dispose()
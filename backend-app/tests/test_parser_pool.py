@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.parser_pool import ParserPool
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_tasks_queued_behind_busy_processes_do_not_time_out():
+    pool = ParserPool(processes=1, task_timeout=4, memory_limit_mb=0)
+
+    async def burst():
+        return await asyncio.gather(*(pool._run(time.sleep, 1.5) for _ in range(4)), return_exceptions=True)
+
+    try:
+        results = _run(burst())
+        executor = pool._executor
+    finally:
+        pool.shutdown()
+
+    # Mỗi tác vụ chạy 1.5s < 4s; tổng thời gian xếp hàng (6s) không được tính là treo
+    assert results == [None, None, None, None]
+    assert executor is not None
+    assert not pool._retiring
+
+
+def test_hung_task_times_out_without_failing_its_neighbour():
+    pool = ParserPool(processes=2, task_timeout=1.5, memory_limit_mb=0)
+
+    async def neighbour():
+        await asyncio.sleep(0.5)
+        return await pool._run(time.sleep, 0.5)
+
+    async def scenario():
+        return await asyncio.gather(pool._run(time.sleep, 30), neighbour(), return_exceptions=True)
+
+    try:
+        hung, neighbour_result = _run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert isinstance(hung, TimeoutError)
+    assert neighbour_result is None
+    # Pool cũ đã bị hủy khi tác vụ cuối cùng trên nó kết thúc
+    assert not pool._retiring
+    assert not pool._in_flight
+
+
+@pytest.mark.parametrize("processes", [1, 3])
+def test_results_keep_submission_order(processes):
+    pool = ParserPool(processes=processes, task_timeout=10, memory_limit_mb=0)
+
+    async def burst():
+        return await asyncio.gather(*(pool._run(abs, -value) for value in range(6)))
+
+    try:
+        assert _run(burst()) == list(range(6))
+    finally:
+        pool.shutdown()
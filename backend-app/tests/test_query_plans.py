@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+from app.scripts.audit_query_plans import DEFAULT_SCHEMA, HOT_QUERIES, audit, parse_schema, schema_ddl, seed
+
+
+def _build(schema_text):
+    connection = sqlite3.connect(":memory:")
+    for statement in schema_ddl(parse_schema(schema_text)):
+        connection.execute(statement)
+    seed(connection, users=20, chats_per_user=10, messages_per_chat=20, files=3000)
+    return connection
+
+
+@pytest.fixture(scope="module")
+def schema_text():
+    with open(DEFAULT_SCHEMA, encoding="utf-8") as source:
+        return source.read()
+
+
+@pytest.fixture(scope="module")
+def reports(schema_text):
+    connection = _build(schema_text)
+    try:
+        return {report["name"]: report for report in audit(connection, HOT_QUERIES, repeat=1)}
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize("query", HOT_QUERIES, ids=[query.name for query in HOT_QUERIES])
+def test_hot_query_uses_expected_index(reports, query):
+    assert reports[query.name]["problems"] == []
+
+
+@pytest.mark.parametrize("name, index", [
+    ("message history", "Message_chatId_createdAt_idx"),
+    ("chats of user", "Chat_userId_createdAt_idx"),
+    ("ready file by content hash", "File_contentHash_status_idx"),
+])
+def test_plan_uses_index_before_and_after_analyze(reports, name, index):
+    report = reports[name]
+    for plan in (report["plan"], report["analyzed_plan"]):
+        assert any(index in detail for detail in plan), plan
+
+
+def test_audit_flags_missing_index(schema_text):
+    # Không có index (contentHash, status): truy vấn khử trùng lặp lúc tải lên phải bị báo lỗi
+    connection = _build(schema_text.replace("@@index([contentHash, status])", ""))
+    try:
+        queries = [query for query in HOT_QUERIES if query.name == "ready file by content hash"]
+        (report,) = audit(connection, queries, repeat=1)
+    finally:
+        connection.close()
+
+    assert "expected index File_contentHash_status_idx" in report["problems"]
@@ -0,0 +1,42 @@
+import asyncio
+
+from app.core.result_frames import ResultFrame, ResultFrameCache
+from app.core.sql_result import QueryResult
+
+
+def _frame(source, rows):
+    return ResultFrame.from_result(
+        source, "Tàu nào đến Hải Phòng?", "SELECT vessel FROM voyages",
+        QueryResult(columns=["vessel"], rows=[(f"ASGL {i:03d}",) for i in range(rows)])
+    )
+
+
+def test_multi_source_turn_keeps_one_frame_per_source(tmp_path):
+    cache = ResultFrameCache(max_bytes=10 * 1024 * 1024, ttl=None, spill_dir=str(tmp_path))
+
+    async def scenario():
+        await cache.set_many("chat", [_frame("cmc", 3), _frame("hph", 5)])
+        after_multi = [await cache.get("chat", source) for source in ("cmc", "hph")]
+        # Lượt hỏi một nguồn thay cho toàn bộ lượt trước đó
+        await cache.set("chat", _frame("cmc", 2))
+        return after_multi, await cache.get("chat", "cmc"), await cache.get("chat", "hph")
+
+    (cmc, hph), cmc_after, hph_after = asyncio.run(scenario())
+
+    assert len(cmc.frame) == 3 and len(hph.frame) == 5
+    assert len(cmc_after.frame) == 2
+    assert hph_after is None
+
+
+def test_spilled_multi_source_turn_is_reloaded(tmp_path):
+    cache = ResultFrameCache(max_bytes=1, ttl=None, spill_dir=str(tmp_path))
+
+    async def scenario():
+        await cache.set_many("chat", [_frame("cmc", 3), _frame("hph", 5)])
+        # max_bytes=1: lượt hỏi bị ghi ra đĩa ngay khi lưu
+        await cache.set("other", _frame("cmc", 1))
+        return await cache.get("chat", "hph")
+
+    hph = asyncio.run(scenario())
+
+    assert hph is not None and len(hph.frame) == 5
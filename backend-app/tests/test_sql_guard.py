@@ -0,0 +1,37 @@
+import pytest
+
+from app.core.sql_guard import QueryRejectedError, check_read_only, estimate_rows, guard_query
+
+
+def test_estimate_rows_mysql_query_with_percent_literals(mysql_engine, mysql_connection):
+    query = "SELECT DATE_FORMAT(NOW(), '%Y-%m') AS month, name FROM ports WHERE name LIKE '%Phòng%'"
+
+    assert estimate_rows(mysql_engine, query) == 2
+    assert mysql_connection.executed[-1] == f"EXPLAIN {query}"
+
+
+def test_guard_query_rejects_expensive_mysql_query(mysql_engine, mysql_connection):
+    mysql_connection.explain_rows = [(1, "voyages", 5000), (1, "containers", 4000)]
+
+    with pytest.raises(QueryRejectedError):
+        guard_query(mysql_engine, "SELECT * FROM voyages JOIN containers USING (voyage_id)", max_examined_rows=1000000)
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT REPLACE(name, 'Cảng ', '') AS port FROM ports",
+    "SELECT INSERT(code, 1, 2, 'VN') FROM ports",
+    "SELECT * FROM ports WHERE note = 'DELETE me'",
+])
+def test_check_read_only_accepts_select(query):
+    assert check_read_only(query) == query
+
+
+@pytest.mark.parametrize("query", [
+    "REPLACE INTO ports VALUES ('x', 'VN')",
+    "WITH p AS (SELECT 1) REPLACE INTO ports SELECT * FROM p",
+    "SELECT 1; DROP TABLE ports",
+    "SELECT * FROM ports INTO OUTFILE '/tmp/ports.csv'",
+])
+def test_check_read_only_rejects_writes(query):
+    with pytest.raises(QueryRejectedError):
+        check_read_only(query)
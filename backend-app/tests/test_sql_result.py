@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from app.core.sql_result import QueryResult, fetch_bounded, format_for_prompt
+
+
+def test_fetch_bounded_mysql_query_with_percent_literals(mysql_engine, mysql_connection):
+    query = "SELECT name FROM ports WHERE name LIKE '%Phòng%' OR country LIKE '%G'"
+
+    result = fetch_bounded(mysql_engine, query)
+
+    assert result.columns == ["name"]
+    assert result.rows == [("Hải Phòng",), ("Singapore",)]
+    # Câu lệnh tới driver nguyên vẹn, không bị định dạng bằng "%"
+    assert mysql_connection.executed[-1] == query
+
+
+def test_fetch_bounded_truncates_mysql_result(mysql_engine):
+    result = fetch_bounded(mysql_engine, "SELECT name FROM ports ORDER BY name", max_rows=2, batch_rows=1)
+
+    assert len(result.rows) == 2
+    assert result.truncated
+
+
+def _summary_line(summary, column):
+    return next(line for line in summary.splitlines() if line.startswith((f"- {column} ", f"- {column}:")))
+
+
+def test_format_for_prompt_summarizes_datetime_column_as_range():
+    rows = [(f"V{i:03d}", datetime(2024, 3, 1 + i % 28, 8, 30), timedelta(hours=i)) for i in range(60)]
+    result = QueryResult(columns=["vessel", "eta", "delay"], rows=rows, truncated=True)
+
+    summary = format_for_prompt(result, max_chars=2000, sample_rows=2)
+
+    assert _summary_line(summary, "eta") == "- eta (thời gian): có giá trị 60, từ 2024-03-01 08:30:00 đến 2024-03-28 08:30:00"
+    assert _summary_line(summary, "delay").startswith("- delay (thời gian): có giá trị 60, từ 0 days 00:00:00 đến 2 days 11:00:00")
+    assert "e+" not in summary
+
+
+def test_format_for_prompt_keeps_large_sums_exact():
+    rows = [(1998765 if i == 0 else 0, Decimal("1234567.89") if i == 0 else Decimal("0"), i % 2 == 0) for i in range(60)]
+    result = QueryResult(columns=["gross_weight_kg", "freight", "reefer"], rows=rows, truncated=True)
+
+    summary = format_for_prompt(result, max_chars=2000, sample_rows=2)
+
+    weight = _summary_line(summary, "gross_weight_kg")
+    assert "max 1998765," in weight and "tổng 1998765" in weight
+    assert "tổng 1234567.89" in _summary_line(summary, "freight")
+    # Cột bool được thống kê như giá trị phân loại
+    assert "(số)" not in _summary_line(summary, "reefer")